@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Batch Job Check
+Runs the Chat and Text To Speech batch-job nodes against the local mock Gemini
+server end to end: the first run submits each job and returns while it is
+still running, a fresh job manager (standing in for a ComfyUI restart) resumes
+the job from its manifest without resubmitting, and the last run polls until
+the job finishes and maps every result back to its input. No network access
+or API key is needed. Exits 1 when any check fails.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gemini_server import MockGeminiServer
+
+API_KEY = "offline-benchmark-key"
+
+
+def restart_manager():
+    """Drop the shared job manager, as a ComfyUI restart would"""
+    from nodes import batch_jobs
+    batch_jobs._manager = None
+
+
+def check(condition, message, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def run_chat(args, server, failures):
+    from nodes.gemini_batch_job_node import GeminiChatBatchJob
+
+    node = GeminiChatBatchJob()
+    prompts = "\n".join(f"Prompt number {i}" for i in range(args.items))
+    print(f"Chat batch job, {args.items} prompts")
+
+    start = time.perf_counter()
+    responses, errors, _, status = node.chat_batch_job(API_KEY, "gemini-2.5-pro-preview-05-06", prompts, "lines", 0,
+                                                       use_cache=False)
+    print(f"  submitted in {time.perf_counter() - start:.2f}s: {status}")
+    check("RUNNING" in status and all(errors), "first run returns while the job is running", failures)
+
+    restart_manager()
+    jobs_before = server.stats.snapshot()["batch_jobs"]
+    start = time.perf_counter()
+    responses, errors, results_jsonl, status = node.chat_batch_job(
+        API_KEY, "gemini-2.5-pro-preview-05-06", prompts, "lines", 1, use_cache=False
+    )
+    print(f"  collected in {time.perf_counter() - start:.2f}s: {status}")
+    check(server.stats.snapshot()["batch_jobs"] == jobs_before, "restart resumes the job instead of resubmitting",
+          failures)
+    check(len(responses) == args.items and all(responses) and not any(errors),
+          "every prompt has a response in input order", failures)
+
+
+def run_tts(args, server, failures):
+    from nodes.gemini_batch_job_node import GeminiTextToSpeechBatchJob
+
+    node = GeminiTextToSpeechBatchJob()
+    texts = "\n".join(f"Kore: Line number {i}." for i in range(args.items))
+    print(f"Text To Speech batch job, {args.items} lines")
+
+    restart_manager()
+    start = time.perf_counter()
+    audio, lengths, errors, status = node.generate_speech_batch_job(
+        API_KEY, "gemini-2.5-flash-preview-tts", texts, "lines", "Zephyr", 1
+    )
+    print(f"  collected in {time.perf_counter() - start:.2f}s: {status}")
+    check(tuple(audio["waveform"].shape[:2]) == (args.items, 1) and min(lengths) > 0 and not any(errors),
+          "every line has audio in a [B, 1, T] batch", failures)
+
+    # Collected audio is stored per item, so the next run needs no job at all
+    jobs_before = server.stats.snapshot()["batch_jobs"]
+    _, _, errors, status = node.generate_speech_batch_job(
+        API_KEY, "gemini-2.5-flash-preview-tts", texts, "lines", "Zephyr", 0
+    )
+    print(f"  second run: {status}")
+    check(server.stats.snapshot()["batch_jobs"] == jobs_before and not any(errors),
+          "collected audio is served from the response cache", failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=200, help="requests per job")
+    parser.add_argument("--batch-seconds", type=float, default=2.0, help="how long the mock keeps a job running")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir, MockGeminiServer(
+        latency=0.0, batch_seconds=args.batch_seconds, audio_seconds=0.5
+    ) as server:
+        os.environ["GEMINI_HUB_BASE_URL"] = server.url
+        os.environ["GEMINI_HUB_CACHE_DIR"] = cache_dir
+        os.environ["GEMINI_HUB_PREFETCH"] = "0"
+
+        failures = []
+        run_chat(args, server, failures)
+        run_tts(args, server, failures)
+
+        stats = server.stats.snapshot()
+        print(f"Mock server: {stats['uploads']} upload(s), {stats['batch_jobs']} job(s), "
+              f"{stats['batch_polls']} poll(s), {stats['downloads']} download(s)")
+
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("All batch job checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Embeddings Check
+Runs the Embeddings and Embedding Search nodes against the local mock Gemini
+server: texts are embedded 100 per request into a local index, a second run
+is answered entirely from the embedding cache, and searches over the
+memory-mapped index are timed and compared with a brute-force NumPy search.
+No network access or API key is needed. Exits 1 when any check fails.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gemini_server import MockGeminiServer
+
+API_KEY = "offline-benchmark-key"
+MODEL = "gemini-embedding-001"
+
+SUBJECTS = ["fox", "castle", "robot", "dragon", "lighthouse", "samurai", "astronaut", "forest", "city", "whale"]
+STYLES = ["watercolor", "oil painting", "pixel art", "photograph", "charcoal sketch", "3d render", "anime"]
+SETTINGS = ["at night", "in the snow", "under the sea", "on mars", "at sunrise", "in the rain", "in a desert"]
+DETAILS = ["highly detailed", "minimalist", "cinematic lighting", "soft focus", "vibrant colors", "muted tones"]
+
+
+def make_prompts(count, seed=0):
+    """Distinct synthetic image prompts built from a small vocabulary"""
+    rng = random.Random(seed)
+    prompts = set()
+    while len(prompts) < count:
+        prompts.add(f"{rng.choice(STYLES)} of a {rng.choice(SUBJECTS)} {rng.choice(SETTINGS)}, "
+                    f"{rng.choice(DETAILS)}, variation {rng.randrange(count * 4)}")
+    return sorted(prompts)
+
+
+def check(condition, message, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=20000, help="texts added to the index")
+    parser.add_argument("--queries", type=int, default=100, help="queries per batched search")
+    parser.add_argument("--dim", type=int, default=768, help="output dimensionality")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir, MockGeminiServer(latency=0.0) as server:
+        os.environ["GEMINI_HUB_BASE_URL"] = server.url
+        os.environ["GEMINI_HUB_CACHE_DIR"] = cache_dir
+        os.environ["GEMINI_HUB_PREFETCH"] = "0"
+
+        import numpy as np
+        from nodes import vector_index
+        from nodes.gemini_embeddings_node import GeminiEmbeddings, GeminiEmbeddingSearch
+
+        failures = []
+        prompts = make_prompts(args.texts)
+        texts = "\n".join(prompts)
+        embed_node, search_node = GeminiEmbeddings(), GeminiEmbeddingSearch()
+
+        print(f"Embedding {args.texts} texts at {args.dim} dimensions")
+        start = time.perf_counter()
+        embeddings, index_size, _ = embed_node.embed(API_KEY, MODEL, texts, "RETRIEVAL_DOCUMENT", args.dim, "bench")
+        print(f"  first run: {time.perf_counter() - start:.2f}s, {server.stats.snapshot()['requests']} request(s)")
+        check(server.stats.snapshot()["requests"] == math.ceil(args.texts / 100), "texts are sent 100 per request",
+              failures)
+        check(index_size == args.texts and embeddings["vectors"].shape == (args.texts, args.dim),
+              "every text is in the index", failures)
+
+        requests_before = server.stats.snapshot()["requests"]
+        start = time.perf_counter()
+        _, index_size, _ = embed_node.embed(API_KEY, MODEL, texts, "RETRIEVAL_DOCUMENT", args.dim, "bench")
+        print(f"  second run: {time.perf_counter() - start:.2f}s")
+        check(server.stats.snapshot()["requests"] == requests_before and index_size == args.texts,
+              "a second run is served from the embedding cache without duplicating rows", failures)
+
+        # A fresh store, as after a restart, maps the index from disk
+        vector_index._stores.clear()
+        index = vector_index.get_vector_index("bench")
+        queries = make_prompts(args.queries, seed=1)
+        query_vectors = np.stack([embeddings["vectors"][i] for i in range(args.queries)])
+
+        for count in (1, args.queries):
+            timings = []
+            for _ in range(5):
+                start = time.perf_counter()
+                results = index.search(query_vectors[:count], 5)
+                timings.append(time.perf_counter() - start)
+            print(f"  search, {count} query(s) over {len(index)} rows: {min(timings) * 1000:.2f}ms")
+
+        exact = np.argsort(-(query_vectors @ embeddings["vectors"].T), axis=1)[:, 0]
+        check(all(result[0][0] == row for result, row in zip(results, exact)),
+              "top matches equal a brute-force search", failures)
+        check(all(result[0][0] == i and result[0][1] > 0.999 for i, result in enumerate(results)),
+              "an indexed text finds itself", failures)
+
+        best, scores, _ = search_node.search(API_KEY, "\n".join(queries[:3]), "bench", 5)
+        check(len(best) == 3 and all(best) and all(-1.0 <= score <= 1.0 for score in scores),
+              "the search node returns a match per query", failures)
+
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        sys.exit(1)
+    print("All embedding checks passed")
+
+
+if __name__ == "__main__":
+    main()
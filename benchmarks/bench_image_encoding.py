@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Image Encoding Benchmark
+Reports encode time, payload size and estimated input tokens for a batch of
+video frames sent to the Chat node, compared with converting and encoding
+every frame on its own at full size.
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import torch
+
+from nodes.image_utils import DEFAULT_MAX_SIDE, IMAGE_UPLOAD_FORMATS, encode_images, estimate_batch_tokens
+
+FRAMES = 48
+HEIGHT = 1080
+WIDTH = 1920
+REPEATS = 3
+
+
+def make_frames(frames, height, width):
+    """Build deterministic frames with smooth gradients and a moving block, like simple video"""
+    y = torch.linspace(0.0, 1.0, height).view(1, height, 1, 1)
+    x = torch.linspace(0.0, 1.0, width).view(1, 1, width, 1)
+    t = torch.linspace(0.0, 1.0, frames).view(frames, 1, 1, 1)
+    images = torch.cat([x.expand(frames, height, width, 1), y.expand(frames, height, width, 1),
+                        ((x + y + t) % 1.0).expand(frames, height, width, 1)], dim=-1)
+    for index in range(frames):
+        left = int(index / frames * (width - 200))
+        images[index, 100:300, left:left + 200] = 1.0
+    return images
+
+
+def encode_naive(images, quality):
+    """Per-frame float-to-uint8 conversion and encoding at full size, one frame after another"""
+    from PIL import Image
+
+    encoded = []
+    for image in images:
+        pixels = (image * 255).clamp(0, 255).byte().numpy()
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=quality)
+        encoded.append(buffer.getvalue())
+    return encoded
+
+
+def best_time(fn):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run_benchmark():
+    """Encode the test frames every way and print a comparison table"""
+    print("🖼️ Chat Image Encoding Benchmark")
+    print("================================")
+
+    images = make_frames(FRAMES, HEIGHT, WIDTH)
+    print(f"Input: {FRAMES} frames of {WIDTH}x{HEIGHT}\n")
+
+    print(f"{'method':<22} {'payload':>12} {'tokens':>8} {'encode':>10}")
+    seconds, encoded = best_time(lambda: encode_naive(images, 85))
+    print(f"{'per-frame, full size':<22} {sum(map(len, encoded)):>12,} "
+          f"{estimate_batch_tokens(images, None):>8,} {seconds * 1000:>8.1f}ms")
+
+    for image_format in IMAGE_UPLOAD_FORMATS:
+        seconds, (encoded, _) = best_time(lambda: encode_images(images, DEFAULT_MAX_SIDE, image_format, 85))
+        label = f"{image_format}, {DEFAULT_MAX_SIDE}px"
+        print(f"{label:<22} {sum(map(len, encoded)):>12,} "
+              f"{estimate_batch_tokens(images, DEFAULT_MAX_SIDE):>8,} {seconds * 1000:>8.1f}ms")
+
+    return len(encoded) == FRAMES
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
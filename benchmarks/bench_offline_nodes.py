@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Offline Node Benchmark
+Runs the Chat, Text To Speech and Speech To Text nodes against the local mock
+Gemini server and reports client-side overhead, encode/decode time, bytes
+moved, peak RSS and throughput at several concurrency levels. No network
+access or API key is needed.
+
+Pass --metrics to record per-phase timings while benchmarking (and compare the
+overhead with a run without it), and --max-overhead-ms to fail (exit 1) when the mean per-request client
+overhead of any node exceeds the budget, e.g. in CI.
+
+Before benchmarking, offline checks of the pure helpers run; any failing check
+also fails the run. Pass --checks-only to run just those.
+"""
+
+import argparse
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_gemini_server import AUDIO_MIME_TYPE, MockGeminiServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+API_KEY = "offline-benchmark-key"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_test_audio(seconds, sample_rate=44100):
+    """Stereo ComfyUI audio dict with a tone, as a loader node would produce"""
+    import torch
+    t = torch.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.3 * torch.sin(2 * torch.pi * 180 * t)
+    return {"waveform": tone.repeat(1, 2, 1), "sample_rate": sample_rate}
+
+
+def build_workloads(args):
+    """Map node names to a zero-argument function running one uncached request"""
+    from nodes.gemini_chat_node import CHAT_MODELS, GeminiChat
+    from nodes.gemini_speech_to_text_node import GeminiSpeechToText
+    from nodes.gemini_text_to_speech_node import GeminiTextToSpeech
+
+    chat, tts, stt = GeminiChat(), GeminiTextToSpeech(), GeminiSpeechToText()
+    audio = make_test_audio(args.stt_seconds)
+    # Identical requests in flight are coalesced even without the cache, so every call gets its own text
+    numbers = itertools.count()
+    return {
+        "chat": lambda: chat.chat_with_gemini(
+            API_KEY, CHAT_MODELS[0], f"Benchmark prompt {next(numbers)}", use_cache=False
+        ),
+        "tts": lambda: tts.generate_speech(
+            API_KEY, "gemini-2.5-flash-preview-tts", f"Benchmark speech {next(numbers)}.", "Kore", use_cache=False
+        ),
+        "stt": lambda: stt.transcribe_audio(
+            API_KEY, "gemini-2.5-flash-preview-04-17", audio, audio_format=args.stt_format, use_cache=False
+        ),
+    }
+
+
+def measure_codecs(args, server):
+    """Time the local encode/decode steps in isolation"""
+    import base64
+
+    from nodes.audio_utils import PCMChunkAssembler
+    from nodes.gemini_speech_to_text_node import GeminiSpeechToText
+
+    audio = make_test_audio(args.stt_seconds)
+    stt = GeminiSpeechToText()
+    start = time.perf_counter()
+    audio_bytes, mime_type = stt.encode_audio(audio, args.stt_format)
+    encode_ms = (time.perf_counter() - start) * 1000
+
+    chunks = [base64.b64decode(piece) for piece in server._server.mock_config.audio_pieces]
+    start = time.perf_counter()
+    assembler = PCMChunkAssembler()
+    for chunk in chunks:
+        assembler.add(chunk, AUDIO_MIME_TYPE)
+    assembler.to_waveform()
+    decode_ms = (time.perf_counter() - start) * 1000
+
+    print(f"STT encode: {args.stt_seconds:.0f}s stereo 44.1 kHz -> {len(audio_bytes):,} bytes "
+          f"{mime_type} in {encode_ms:.1f}ms")
+    print(f"TTS decode: {len(chunks)} chunks, {len(assembler):,} PCM bytes in {decode_ms:.1f}ms\n")
+
+
+# Chunk transcripts and the text stitching them must give
+STITCH_CASES = [
+    # A phrase that recurs away from the seam must not be taken for the overlap
+    (["I went to the store and bought some milk", "milk then I saw the store was closed"],
+     "I went to the store and bought some milk milk then I saw the store was closed"),
+    (["I went to the store and the store was closed so", "the store was closed so we went home"],
+     "I went to the store and the store was closed so we went home"),
+    # A word clipped by the cut is taken from the chunk that heard it in full
+    (["we walked down to the riv", "to the river and sat down"], "we walked down to the river and sat down"),
+    (["so we left early. The", "he left early. The rain began"], "so we left early. The rain began"),
+    (["Hello there, friend.", "Something else entirely."], "Hello there, friend. Something else entirely."),
+    # An empty chunk breaks the seam, so the chunk after it is appended whole
+    (["one two three four", "", "three four five"], "one two three four three four five"),
+]
+
+
+def check(condition, message, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def check_stitching(failures):
+    """Long-audio chunk transcripts are joined without losing or repeating words at the seams"""
+    from nodes.long_audio import stitch_transcripts
+
+    for transcripts, expected in STITCH_CASES:
+        stitched = stitch_transcripts(transcripts)
+        check(stitched == expected, f"stitch {transcripts!r} -> {stitched!r}", failures)
+
+
+class FakeClock:
+    """Clock for the scheduler in which nobody really waits; each call is released at arrival plus its wait"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.waited = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.waited += seconds
+
+
+def release_times(scheduler, clock, calls, estimated_tokens=0, model="check-model"):
+    """Send ``calls`` requests arriving at the current fake time; return when each one was let through"""
+    released = []
+    for _ in range(calls):
+        clock.waited = 0.0
+        scheduler.call(API_KEY, model, lambda: None, estimated_tokens=estimated_tokens)
+        released.append(clock.now + clock.waited)
+    return released
+
+
+def check_rate_limits(failures):
+    """The scheduler holds requests back once the RPM/TPM budget is spent and releases them at the configured rate"""
+    from nodes.rate_limiter import RequestScheduler, estimate_text_tokens
+
+    def make_scheduler(rpm=0, tpm=0):
+        clock = FakeClock()
+        scheduler = RequestScheduler(requests_per_minute=rpm, tokens_per_minute=tpm, model_limits={},
+                                     clock=clock, sleep=clock.sleep, rand=lambda: 0.0)
+        return scheduler, clock
+
+    # 60 RPM: a full bucket lets 60 requests through at once, then one per second
+    scheduler, clock = make_scheduler(rpm=60)
+    released = release_times(scheduler, clock, 90)
+    check(released[:60] == [0.0] * 60, "60 RPM: the first 60 requests go out at once", failures)
+    check(all(abs(at - (i + 1)) < 1e-6 for i, at in enumerate(released[60:])),
+          "60 RPM: requests past the budget are queued and released one per second", failures)
+
+    # Idle time refills the bucket at the same rate, never past its capacity
+    clock.now = released[-1] + 20.0
+    released = release_times(scheduler, clock, 21)
+    check(released[:20] == [clock.now] * 20 and abs(released[20] - (clock.now + 1.0)) < 1e-6,
+          "60 RPM: 20 idle seconds refill 20 requests", failures)
+    clock.now += 600.0
+    released = release_times(scheduler, clock, 61)
+    check(released[59] == clock.now and abs(released[60] - (clock.now + 1.0)) < 1e-6,
+          "60 RPM: a long idle period refills the bucket to its capacity only", failures)
+
+    # 6000 TPM with the local estimate: 4000 characters are about 1000 tokens
+    prompt = "x" * 4000
+    tokens = estimate_text_tokens(prompt)
+    check(tokens == 1001, f"a 4000-character prompt is estimated at {tokens} tokens", failures)
+    scheduler, clock = make_scheduler(tpm=6000)
+    released = release_times(scheduler, clock, 9, estimated_tokens=tokens)
+    spacing = [later - earlier for earlier, later in zip(released[5:], released[6:])]
+    check(released[:5] == [0.0] * 5 and released[5] > 0.0,
+          "6000 TPM: five ~1000-token requests go out at once, the sixth waits", failures)
+    check(all(abs(gap - tokens / 100.0) < 1e-6 for gap in spacing),
+          "6000 TPM: queued requests are released as 100 tokens per second refill", failures)
+
+    # Both limits apply; the tighter one decides
+    scheduler, clock = make_scheduler(rpm=600, tpm=6000)
+    released = release_times(scheduler, clock, 8, estimated_tokens=tokens)
+    check(released[5] > 0.0 and abs(released[7] - released[6] - tokens / 100.0) < 1e-6,
+          "RPM and TPM together: the token budget holds back requests the request budget allows", failures)
+
+    # A request larger than a whole minute of budget waits at most for a full bucket
+    scheduler, clock = make_scheduler(tpm=6000)
+    released = release_times(scheduler, clock, 2, estimated_tokens=50000)
+    check(released[0] == 0.0 and abs(released[1] - 60.0) < 1e-6,
+          "6000 TPM: an oversized request is capped at one minute of budget", failures)
+
+    # Limits are kept per API key and model
+    scheduler, clock = make_scheduler(rpm=1)
+    first = release_times(scheduler, clock, 1)
+    other_model = release_times(scheduler, clock, 1, model="other-model")
+    same_model = release_times(scheduler, clock, 1)
+    check(first == other_model == [0.0] and abs(same_model[0] - 60.0) < 1e-6,
+          "1 RPM: another model has its own budget, the same model waits a minute", failures)
+
+
+class StubApiError(Exception):
+    """API error as the SDK raises it: an HTTP status in ``code`` and optional details and response"""
+
+    def __init__(self, code, message="", details=None, headers=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.details = details
+        self.response = type("Response", (), {"headers": headers or {}, "status_code": code})()
+
+
+class AdvancingClock(FakeClock):
+    """Fake clock whose sleeps move time forward, recording each delay"""
+
+    def __init__(self):
+        super().__init__()
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds):
+        self.sleep(seconds)
+
+
+def failing(*errors, result="ok"):
+    """Stub request raising ``errors`` one per attempt, then returning ``result``; counts its attempts"""
+    attempts = []
+
+    def request():
+        attempts.append(len(attempts))
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+
+    return request, attempts
+
+
+def check_retries(failures):
+    """The scheduler retries quota, overload and network errors with jittered backoff and honors retry hints"""
+    import asyncio
+
+    import httpx
+
+    from nodes.rate_limiter import RequestScheduler
+
+    def make_scheduler(max_retries=5, rand=0.5):
+        clock = AdvancingClock()
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, model_limits={},
+                                     max_retries=max_retries, base_delay=1.0, max_delay=60.0, clock=clock,
+                                     sleep=clock.sleep, async_sleep=clock.async_sleep, rand=lambda: rand)
+        return scheduler, clock
+
+    def raises(fn):
+        try:
+            fn()
+        except Exception as e:
+            return e
+        return None
+
+    # Overload and network errors back off exponentially: base * 2^attempt, jittered to 50-100%, capped
+    scheduler, clock = make_scheduler(max_retries=8)
+    network = httpx.ConnectError("connection refused")
+    request, attempts = failing(StubApiError(503), StubApiError(500), network, StubApiError(502),
+                                StubApiError(503), StubApiError(504), StubApiError(503), StubApiError(503))
+    result = scheduler.call(API_KEY, "retry-model", request)
+    expected = [0.75, 1.5, 3.0, 6.0, 12.0, 24.0, 45.0, 45.0]
+    check(result == "ok" and len(attempts) == 9, "503/500/502/504 and network errors are retried until success",
+          failures)
+    check(clock.sleeps == expected, f"backoff delays double from the base delay and cap at max_delay ({clock.sleeps})", failures)
+    low, _ = make_scheduler(rand=0.0)
+    high, _ = make_scheduler(rand=1.0)
+    check(low.retry_delay(StubApiError(503), 3) == 4.0 and high.retry_delay(StubApiError(503), 3) == 8.0,
+          "jitter keeps each backoff between half and all of base * 2^attempt", failures)
+
+    # Retry hints are a lower bound, even beyond max_delay
+    scheduler, clock = make_scheduler()
+    quota = StubApiError(429, "RESOURCE_EXHAUSTED", details={"error": {"details": [{"retryDelay": "90s"}]}})
+    request, attempts = failing(quota)
+    scheduler.call(API_KEY, "retry-model", request)
+    check(clock.sleeps == [90.5] and len(attempts) == 2,
+          f"a 90s retryDelay past the 60s cap is waited in full ({clock.sleeps})", failures)
+    scheduler, clock = make_scheduler()
+    request, _ = failing(StubApiError(503, headers={"retry-after": "7"}))
+    scheduler.call(API_KEY, "retry-model", request)
+    check(clock.sleeps == [7.5], f"a Retry-After header is honored ({clock.sleeps})", failures)
+
+    # A 429 pauses other callers of the same key and model even with no limits configured
+    scheduler, clock = make_scheduler(max_retries=0)
+    request, _ = failing(StubApiError(429, "retry in 30s"))
+    raises(lambda: scheduler.call(API_KEY, "retry-model", request))
+    clock.now += 10.0
+    scheduler.call(API_KEY, "retry-model", lambda: "ok")
+    scheduler.call(API_KEY, "other-model", lambda: "ok")
+    check(clock.sleeps == [20.5], f"after a 429, other callers wait out the cooldown ({clock.sleeps})", failures)
+
+    # Retries stop at max_retries and the last error is raised
+    scheduler, clock = make_scheduler(max_retries=3)
+    request, attempts = failing(*[StubApiError(503)] * 10)
+    error = raises(lambda: scheduler.call(API_KEY, "retry-model", request))
+    check(isinstance(error, StubApiError) and len(attempts) == 4 and len(clock.sleeps) == 3,
+          "retries stop after max_retries and the error is raised", failures)
+
+    # Errors that retrying cannot fix are raised at once
+    for error in (StubApiError(400, "API key not valid"), StubApiError(404), ValueError("bad input")):
+        scheduler, clock = make_scheduler()
+        request, attempts = failing(error)
+        raised = raises(lambda: scheduler.call(API_KEY, "retry-model", request))
+        check(raised is error and len(attempts) == 1 and not clock.sleeps,
+              f"{error!r} is raised without retrying", failures)
+
+    # The async path follows the same schedule
+    scheduler, clock = make_scheduler(max_retries=2)
+    request, attempts = failing(StubApiError(503), network, StubApiError(503))
+
+    async def request_async():
+        return request()
+
+    error = raises(lambda: asyncio.run(scheduler.call_async(API_KEY, "retry-model", request_async)))
+    check(isinstance(error, StubApiError) and len(attempts) == 3 and clock.sleeps == [0.75, 1.5],
+          "call_async backs off the same way and stops at max_retries", failures)
+    scheduler, clock = make_scheduler()
+    request, attempts = failing(StubApiError(429, "retry in 120s"))
+    result = asyncio.run(scheduler.call_async(API_KEY, "retry-model", request_async))
+    check(result == "ok" and clock.sleeps == [120.5], "call_async honors the retry hint", failures)
+
+
+def run_checks():
+    """Run the offline checks and return True when all of them pass"""
+    print("Offline checks:")
+    failures = []
+    check_stitching(failures)
+    check_rate_limits(failures)
+    check_retries(failures)
+    if failures:
+        print(f"❌ {len(failures)} check(s) failed\n")
+    else:
+        print("✅ All offline checks passed\n")
+    return not failures
+
+
+def run_level(fn, concurrency, requests, stats):
+    """Run ``requests`` calls with ``concurrency`` workers and return a result row"""
+    latencies = []
+
+    def timed():
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    stats.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(timed) for _ in range(requests)]:
+            future.result()
+    wall = time.perf_counter() - start
+    # The server books a request just after its last byte; give it a moment to catch up
+    deadline = time.perf_counter() + 1.0
+    while stats.snapshot()["requests"] < requests and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    server = stats.snapshot()
+
+    mean_latency = statistics.mean(latencies)
+    server_time = server["server_seconds"] / max(1, server["requests"])
+    return {
+        "concurrency": concurrency,
+        "mean_ms": mean_latency * 1000,
+        "overhead_ms": max(0.0, mean_latency - server_time) * 1000,
+        "throughput": requests / wall,
+        "bytes_in": server["bytes_in"],
+        "bytes_out": server["bytes_out"],
+        "rss_mb": peak_rss_mb(),
+    }
+
+
+def print_phase_summary():
+    """Print the mean time per phase and node recorded by the metrics registry"""
+    from nodes.metrics import get_metrics_registry
+
+    totals = {}
+    for record in get_metrics_registry().recent_calls():
+        node_totals = totals.setdefault(record["node"], {"calls": 0, "tokens": 0})
+        node_totals["calls"] += 1
+        node_totals["tokens"] += record["tokens"].get("total", 0)
+        if record["first_chunk"] is not None:
+            node_totals["first_chunk"] = node_totals.get("first_chunk", 0.0) + record["first_chunk"]
+        for name, seconds in record["phases"].items():
+            node_totals[name] = node_totals.get(name, 0.0) + seconds
+
+    print("\nMean per call from the metrics registry (last calls only):")
+    for node, node_totals in totals.items():
+        calls = node_totals.pop("calls")
+        tokens = node_totals.pop("tokens")
+        phases = ", ".join(f"{name} {seconds / calls * 1000:.1f}ms" for name, seconds in node_totals.items())
+        print(f"  {node}: {phases}, {tokens / calls:.0f} tokens")
+
+
+def run_benchmark(args):
+    """Benchmark every node at every concurrency level and print a table"""
+    print("⏱️  Offline Node Benchmark")
+    print("=========================")
+
+    checks_passed = run_checks()
+    if args.checks_only:
+        return checks_passed
+
+    server = MockGeminiServer(
+        latency=args.latency, chunk_delay=args.chunk_delay, text_chunks=args.chunks,
+        audio_chunks=args.chunks, audio_seconds=args.tts_seconds, fixture=args.fixture,
+    ).start()
+    os.environ["GEMINI_HUB_BASE_URL"] = server.url
+    os.environ.setdefault("GEMINI_HUB_CACHE_DIR", tempfile.mkdtemp(prefix="gemini-hub-bench-"))
+
+    try:
+        print(f"Mock server: {server.url}, latency {args.latency * 1000:.0f}ms, "
+              f"{args.chunks} chunks, {args.chunk_delay * 1000:.0f}ms apart")
+        print(f"Peak RSS before importing nodes: {peak_rss_mb():.1f} MB\n")
+
+        workloads = build_workloads(args)
+        if args.metrics:
+            from nodes.metrics import set_metrics_enabled
+            set_metrics_enabled(True)
+        measure_codecs(args, server)
+
+        # One untimed call per node warms up imports and the pooled connection
+        for fn in workloads.values():
+            fn()
+
+        print(f"{'node':<6} {'conc':>5} {'mean':>9} {'overhead':>9} {'req/s':>8} "
+              f"{'sent':>12} {'received':>12} {'peak RSS':>9}")
+        worst = {}
+        for name, fn in workloads.items():
+            if args.nodes and name not in args.nodes:
+                continue
+            for concurrency in args.concurrency:
+                row = run_level(fn, concurrency, args.requests, server.stats)
+                worst[name] = max(worst.get(name, 0.0), row["overhead_ms"])
+                print(f"{name:<6} {concurrency:>5} {row['mean_ms']:>7.1f}ms {row['overhead_ms']:>7.1f}ms "
+                      f"{row['throughput']:>8.1f} {row['bytes_in']:>12,} {row['bytes_out']:>12,} "
+                      f"{row['rss_mb']:>6.1f} MB")
+        if args.metrics:
+            print_phase_summary()
+    finally:
+        server.stop()
+
+    if args.max_overhead_ms is None:
+        return checks_passed
+    over = {name: value for name, value in worst.items() if value > args.max_overhead_ms}
+    for name, value in over.items():
+        print(f"❌ {name}: client overhead {value:.1f}ms exceeds {args.max_overhead_ms:.1f}ms")
+    if not over:
+        print(f"\n✅ Client overhead within {args.max_overhead_ms:.1f}ms for every node")
+    return checks_passed and not over
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", nargs="*", choices=["chat", "tts", "stt"], help="limit to these nodes")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock time to first byte in seconds")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="mock delay between streamed chunks")
+    parser.add_argument("--chunks", type=int, default=8, help="streamed chunks per response")
+    parser.add_argument("--tts-seconds", type=float, default=5.0, help="audio returned per TTS request")
+    parser.add_argument("--stt-seconds", type=float, default=30.0, help="audio sent per STT request")
+    parser.add_argument("--stt-format", default="wav", choices=["wav", "flac", "ogg_opus"])
+    parser.add_argument("--fixture", help="JSON file with recorded responses for the mock server")
+    parser.add_argument("--metrics", action="store_true", help="record and summarize per-phase metrics")
+    parser.add_argument("--max-overhead-ms", type=float, help="fail when mean client overhead exceeds this")
+    parser.add_argument("--checks-only", action="store_true", help="run the offline checks without benchmarking")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark(parse_args()) else 1)
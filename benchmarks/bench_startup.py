@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Startup Benchmark
+Measures what registering the nodes costs ComfyUI at startup with
+``python -X importtime``: importing the package and calling every node's
+INPUT_TYPES. Fails when registration pulls in google-genai, torch,
+torchaudio or httpx, which must only be imported on first execution, and
+compares the cost with importing those SDKs eagerly.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["google.genai", "torch", "torchaudio", "httpx"]
+REPEATS = 5
+
+REGISTER_SNIPPET = f"""
+import json, sys
+import nodes
+for node_class in nodes.NODE_CLASS_MAPPINGS.values():
+    node_class.INPUT_TYPES()
+print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))
+"""
+
+
+def import_times(code):
+    """Run ``code`` under -X importtime; return (stdout, {module: (self_us, cumulative_us, top_level)})"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        # Nested imports are indented below the module that triggered them
+        times[fields[2].strip()] = (self_us, cumulative_us, not fields[2][1:].startswith(" "))
+    return result.stdout, times
+
+
+def best_of(code, modules):
+    """Smallest cumulative import time of the ``modules`` imported directly by ``code``, in ms"""
+    best, last = None, None
+    for _ in range(REPEATS):
+        stdout, times = import_times(code)
+        # A module already pulled in by another one is counted inside that one only
+        total = sum(times[name][1] for name in modules if name in times and times[name][2]) / 1000
+        if best is None or total < best:
+            best, last = total, (stdout, times)
+    return best, last
+
+
+def run_benchmark():
+    """Compare node registration with importing the heavy SDKs and report offenders"""
+    print("🚀 Startup Benchmark")
+    print("====================")
+
+    register_ms, (stdout, times) = best_of(REGISTER_SNIPPET, ["nodes"])
+    loaded = json.loads(stdout.strip().splitlines()[-1])
+    print(f"Register nodes (import + INPUT_TYPES): {register_ms:8.1f} ms")
+
+    eager_ms, _ = best_of("import " + ", ".join(HEAVY_MODULES), HEAVY_MODULES)
+    print(f"Import {', '.join(HEAVY_MODULES)}: {eager_ms:8.1f} ms  (saved at startup)")
+
+    slowest = sorted(
+        ((cumulative, name) for name, (_, cumulative, _) in times.items() if name.startswith("nodes.")),
+        reverse=True,
+    )[:5]
+    print("\nSlowest package modules (cumulative):")
+    for cumulative, name in slowest:
+        print(f"  {name:<40} {cumulative / 1000:8.1f} ms")
+
+    if loaded:
+        print(f"\n❌ Registration imported heavy modules: {', '.join(loaded)}")
+        return False
+    print("\n✅ No heavy SDK is imported until a node executes")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_benchmark() else 1)
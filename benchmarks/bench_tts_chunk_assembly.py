@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub TTS Chunk Assembly Benchmark
+Feeds synthetic multi-chunk PCM streams through PCMChunkAssembler and checks
+that assembly time and peak memory grow linearly with the number of chunks.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nodes.audio_utils import PCMChunkAssembler
+
+MIME_TYPE = "audio/L16;codec=pcm;rate=24000"
+CHUNK_BYTES = 4800  # 100 ms of 24 kHz, 16-bit mono audio
+CHUNK_COUNTS = [100, 1000, 5000]
+
+# Allowed growth of the per-chunk cost between the smallest and largest run
+MAX_PER_CHUNK_GROWTH = 3.0
+# Allowed peak traced memory relative to the assembled PCM size
+MAX_PEAK_RATIO = 2.5
+
+
+def assemble(num_chunks, chunk):
+    """Assemble ``num_chunks`` copies of ``chunk`` and return (seconds, peak bytes, total bytes)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    assembler = PCMChunkAssembler()
+    for _ in range(num_chunks):
+        assembler.add(chunk, MIME_TYPE)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if assembler.num_chunks != num_chunks or len(assembler) != num_chunks * len(chunk):
+        raise AssertionError("Assembled stream has the wrong size")
+    wav = assembler.to_wav()
+    if wav.count(b"RIFF") != 1:
+        raise AssertionError("Assembled WAV must contain exactly one header")
+
+    return elapsed, peak, len(assembler)
+
+
+def run_benchmark():
+    """Run the assembly benchmark and report whether growth stays linear"""
+    print("🎵 TTS Chunk Assembly Benchmark")
+    print("===============================")
+
+    chunk = bytes(range(256)) * (CHUNK_BYTES // 256) + bytes(CHUNK_BYTES % 256)
+    results = []
+    for num_chunks in CHUNK_COUNTS:
+        elapsed, peak, total = assemble(num_chunks, chunk)
+        per_chunk_us = elapsed / num_chunks * 1e6
+        peak_ratio = peak / total
+        results.append((num_chunks, per_chunk_us, peak_ratio))
+        print(f"   {num_chunks:>6} chunks: {elapsed * 1000:8.2f} ms total, "
+              f"{per_chunk_us:6.2f} µs/chunk, peak memory {peak_ratio:4.2f}x payload")
+
+    growth = results[-1][1] / results[0][1]
+    worst_peak = max(ratio for _, _, ratio in results)
+    print(f"\n📈 Per-chunk cost growth: {growth:.2f}x (limit {MAX_PER_CHUNK_GROWTH}x)")
+    print(f"📦 Worst peak memory: {worst_peak:.2f}x payload (limit {MAX_PEAK_RATIO}x)")
+
+    return growth <= MAX_PER_CHUNK_GROWTH and worst_peak <= MAX_PEAK_RATIO
+
+
+if __name__ == "__main__":
+    if run_benchmark():
+        print("\n✅ Chunk assembly scales linearly")
+        sys.exit(0)
+    else:
+        print("\n❌ Chunk assembly grew faster than linear")
+        sys.exit(1)
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+ComfyUI-Gemini-Hub Mock Gemini Server
+A local HTTP stand-in for the Gemini ``generateContent`` and
+``streamGenerateContent`` endpoints. It replays synthetic (or recorded)
+streaming text and PCM audio with configurable latency and chunking, so the
+nodes can be benchmarked without network access.
+
+Embedding requests (``batchEmbedContents``) get bag-of-words vectors, so
+texts that share words come out similar.
+
+It also serves enough of the Files API (resumable upload, download, delete)
+and the Batch API (``batchGenerateContent`` and ``batches/{id}``) to run
+batch jobs: a job stays running for ``batch_seconds`` and then succeeds with
+a results file holding one keyed response per request line.
+
+Point the nodes at it with ``GEMINI_HUB_BASE_URL=http://127.0.0.1:<port>``.
+Run this file directly to serve until interrupted.
+"""
+
+import argparse
+import base64
+import json
+import math
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = (
+    "Gemini Hub offline benchmark response. This sentence stands in for a streamed model answer "
+    "and is long enough to be split across several server-sent events."
+)
+DEFAULT_TRANSCRIPT = "This is a synthetic transcript returned by the mock Gemini server."
+AUDIO_SAMPLE_RATE = 24000
+AUDIO_MIME_TYPE = f"audio/L16;codec=pcm;rate={AUDIO_SAMPLE_RATE}"
+
+
+def make_pcm(seconds, sample_rate=AUDIO_SAMPLE_RATE, frequency=220.0):
+    """Build 16-bit little-endian mono PCM for a quiet sine tone"""
+    count = int(seconds * sample_rate)
+    samples = (int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate)) for i in range(count))
+    return struct.pack(f"<{count}h", *samples)
+
+
+def split_evenly(data, parts):
+    """Split a string or bytes object into ``parts`` nearly equal pieces"""
+    parts = max(1, min(parts, len(data) or 1))
+    size = math.ceil(len(data) / parts)
+    return [data[i:i + size] for i in range(0, len(data), size)] or [data]
+
+
+class MockConfig:
+    """Latency, chunking and payload settings shared by every request handler"""
+
+    def __init__(self, latency=0.05, chunk_delay=0.01, text_chunks=8, audio_chunks=8,
+                 audio_seconds=2.0, fixture=None, batch_seconds=1.0):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.batch_seconds = batch_seconds
+        self.text = DEFAULT_TEXT
+        self.transcript = DEFAULT_TRANSCRIPT
+        self.text_pieces = None
+        if fixture:
+            # Recorded responses: {"text": "...", "text_chunks": ["...", ...], "transcript": "..."}
+            with open(fixture, "r", encoding="utf-8") as f:
+                recorded = json.load(f)
+            self.text_pieces = recorded.get("text_chunks")
+            self.text = recorded.get("text", "".join(self.text_pieces or []) or self.text)
+            self.transcript = recorded.get("transcript", self.transcript)
+        if not self.text_pieces:
+            self.text_pieces = split_evenly(self.text, text_chunks)
+        pcm = make_pcm(audio_seconds)
+        self.audio = base64.b64encode(pcm).decode("ascii")
+        # Keep chunk boundaries on whole samples
+        samples_per_chunk = math.ceil(len(pcm) / 2 / max(1, audio_chunks))
+        self.audio_pieces = [
+            base64.b64encode(pcm[i:i + samples_per_chunk * 2]).decode("ascii")
+            for i in range(0, len(pcm), samples_per_chunk * 2)
+        ]
+
+
+class MockStats:
+    """Thread-safe counters of what the server received and sent"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = {
+                "requests": 0, "bytes_in": 0, "bytes_out": 0, "server_seconds": 0.0,
+                "uploads": 0, "batch_jobs": 0, "batch_polls": 0, "downloads": 0,
+            }
+
+    def add(self, **values):
+        with self._lock:
+            for name, value in values.items():
+                self._values[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+def _usage(prompt_tokens, candidate_tokens):
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": candidate_tokens,
+        "totalTokenCount": prompt_tokens + candidate_tokens,
+    }
+
+
+def _text_candidate(text):
+    return {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+
+
+def _audio_candidate(data):
+    part = {"inlineData": {"mimeType": AUDIO_MIME_TYPE, "data": data}}
+    return {"content": {"role": "model", "parts": [part]}, "index": 0}
+
+
+def _embedding(request, default_dim=768):
+    """Hash the words of one embed request into a vector, so texts sharing words score as similar"""
+    dim = int(request.get("outputDimensionality") or default_dim)
+    text = " ".join(part.get("text", "") for part in (request.get("content") or {}).get("parts") or [])
+    values = [0.0] * dim
+    for word in text.lower().split():
+        digest = zlib.crc32(word.encode("utf-8"))
+        values[digest % dim] += 1.0 if digest & 0x80000000 else -1.0
+    return values
+
+
+class MockStore:
+    """Uploaded files and batch jobs held in memory by the mock server"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.uploads = {}
+        self.jobs = {}
+        self.next_id = 0
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def add_file(self, data, mime_type="application/octet-stream", display_name=None):
+        name = f"files/mock-{self.new_id()}"
+        with self.lock:
+            self.files[name] = {"data": data, "mimeType": mime_type, "displayName": display_name}
+        return name
+
+
+def _file_resource(base_url, name, entry):
+    resource = {
+        "name": name,
+        "mimeType": entry["mimeType"],
+        "sizeBytes": str(len(entry["data"])),
+        "state": "ACTIVE",
+        "uri": f"{base_url}/v1beta/{name}",
+        "downloadUri": f"{base_url}/v1beta/{name}:download?alt=media",
+    }
+    if entry.get("displayName"):
+        resource["displayName"] = entry["displayName"]
+    return resource
+
+
+def _batch_response(config, request):
+    """Answer one batch request line the way generateContent would"""
+    generation_config = request.get("generationConfig") or {}
+    wants_audio = "speechConfig" in generation_config or any(
+        str(modality).lower() == "audio" for modality in generation_config.get("responseModalities") or []
+    )
+    prompt_tokens = max(1, len(json.dumps(request)) // 4)
+    if wants_audio:
+        candidate = _audio_candidate(config.audio)
+        candidate_tokens = len(config.audio_pieces) * 25
+    else:
+        text = config.transcript if _has_media(request) else config.text
+        candidate = _text_candidate(text)
+        candidate_tokens = max(1, len(text) // 4)
+    return {
+        "candidates": [dict(candidate, finishReason="STOP")],
+        "usageMetadata": _usage(prompt_tokens, candidate_tokens),
+    }
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    """Answers Gemini model requests from the server's ``MockConfig``"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def do_POST(self):
+        started = time.perf_counter()
+        config = self.server.mock_config
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if self.path.startswith("/upload/"):
+            sent = self._upload(body)
+            self.server.mock_stats.add(bytes_in=length, bytes_out=sent)
+            return
+        if ":batchGenerateContent" in self.path:
+            sent = self._create_batch(body)
+            self.server.mock_stats.add(batch_jobs=1, bytes_in=length, bytes_out=sent)
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            request = {}
+        generation_config = request.get("generationConfig") or {}
+        wants_audio = "speechConfig" in generation_config or any(
+            str(modality).lower() == "audio" for modality in generation_config.get("responseModalities") or []
+        )
+        prompt_tokens = max(1, length // 4)
+
+        time.sleep(config.latency)
+        if ":batchEmbedContents" in self.path:
+            sent = self._send_json(200, {"embeddings": [
+                {"values": _embedding(item)} for item in request.get("requests") or []
+            ]})
+        elif ":streamGenerateContent" in self.path:
+            sent = self._stream(config, wants_audio, prompt_tokens)
+        elif ":generateContent" in self.path:
+            text = config.transcript if _has_media(request) else config.text
+            sent = self._send_json(200, {
+                "candidates": [dict(_text_candidate(text), finishReason="STOP")],
+                "usageMetadata": _usage(prompt_tokens, max(1, len(text) // 4)),
+            })
+        else:
+            sent = self._send_json(404, {"error": {
+                "code": 404, "status": "NOT_FOUND", "message": f"Mock server does not implement {self.path}",
+            }})
+
+        self.server.mock_stats.add(
+            requests=1, bytes_in=length, bytes_out=sent, server_seconds=time.perf_counter() - started
+        )
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        name = path.split("/v1beta/", 1)[-1]
+        store = self.server.mock_store
+        if name.startswith("batches/"):
+            with store.lock:
+                job = store.jobs.get(name)
+            if job is None:
+                self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"{name} not found"}})
+                return
+            self.server.mock_stats.add(batch_polls=1)
+            self._send_json(200, self._batch_resource(name, job))
+        elif name.endswith(":download"):
+            with store.lock:
+                entry = store.files.get(name[:-len(":download")])
+            if entry is None:
+                self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"{name} not found"}})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", entry["mimeType"])
+            self.send_header("Content-Length", str(len(entry["data"])))
+            self.end_headers()
+            self.wfile.write(entry["data"])
+            self.server.mock_stats.add(downloads=1, bytes_out=len(entry["data"]))
+        elif name.startswith("files/"):
+            with store.lock:
+                entry = store.files.get(name)
+            if entry is None:
+                self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": f"{name} not found"}})
+                return
+            self._send_json(200, _file_resource(self._base_url(), name, entry))
+        else:
+            self._send_json(404, {"error": {
+                "code": 404, "status": "NOT_FOUND", "message": f"Mock server does not implement GET {self.path}",
+            }})
+
+    def do_DELETE(self):
+        name = self.path.split("?", 1)[0].split("/v1beta/", 1)[-1]
+        store = self.server.mock_store
+        with store.lock:
+            store.files.pop(name, None)
+        self._send_json(200, {})
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _upload(self, body):
+        """Resumable Files API upload: a start request, then the bytes with an "upload, finalize" command"""
+        store = self.server.mock_store
+        command = (self.headers.get("X-Goog-Upload-Command") or "").lower()
+        if command == "start":
+            try:
+                metadata = json.loads(body or b"{}").get("file") or {}
+            except ValueError:
+                metadata = {}
+            upload_id = str(store.new_id())
+            with store.lock:
+                store.uploads[upload_id] = {"metadata": metadata, "data": bytearray()}
+            payload = b"{}"
+            self.send_response(200)
+            self.send_header("X-Goog-Upload-URL", f"{self._base_url()}/upload/v1beta/files?upload_id={upload_id}")
+            self.send_header("X-Goog-Upload-Status", "active")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return len(payload)
+
+        upload_id = self.path.rsplit("upload_id=", 1)[-1]
+        with store.lock:
+            upload = store.uploads.get(upload_id)
+            if upload is not None:
+                upload["data"] += body
+        if upload is None:
+            return self._send_json(404, {"error": {"code": 404, "status": "NOT_FOUND", "message": "Unknown upload"}})
+        if "finalize" not in command:
+            payload = b"{}"
+            status = "active"
+        else:
+            with store.lock:
+                store.uploads.pop(upload_id, None)
+            metadata = upload["metadata"]
+            name = store.add_file(bytes(upload["data"]), metadata.get("mimeType") or "application/octet-stream",
+                                  metadata.get("displayName"))
+            with store.lock:
+                entry = store.files[name]
+            payload = json.dumps({"file": _file_resource(self._base_url(), name, entry)}).encode("utf-8")
+            status = "final"
+            self.server.mock_stats.add(uploads=1)
+        self.send_response(200)
+        self.send_header("X-Goog-Upload-Status", status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        return len(payload)
+
+    def _create_batch(self, body):
+        """Start a batch job over an uploaded JSONL file; it succeeds after ``batch_seconds``"""
+        store = self.server.mock_store
+        try:
+            batch = json.loads(body or b"{}").get("batch") or {}
+        except ValueError:
+            batch = {}
+        file_name = (batch.get("inputConfig") or {}).get("fileName")
+        with store.lock:
+            entry = store.files.get(file_name)
+        if entry is None:
+            return self._send_json(400, {"error": {
+                "code": 400, "status": "INVALID_ARGUMENT", "message": f"Input file {file_name} not found",
+            }})
+        model = self.path.split("/v1beta/", 1)[-1].split(":", 1)[0]
+        name = f"batches/mock-{store.new_id()}"
+        with store.lock:
+            store.jobs[name] = {
+                "model": model,
+                "displayName": batch.get("displayName") or name,
+                "input": entry["data"],
+                "created": time.monotonic(),
+                "output": None,
+            }
+            job = store.jobs[name]
+        return self._send_json(200, self._batch_resource(name, job))
+
+    def _batch_resource(self, name, job):
+        """Describe a job, writing its results file once it has run for ``batch_seconds``"""
+        config = self.server.mock_config
+        store = self.server.mock_store
+        finished = time.monotonic() - job["created"] >= config.batch_seconds
+        if finished and job["output"] is None:
+            lines = []
+            for line in job["input"].decode("utf-8").splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                lines.append(json.dumps({"key": item.get("key"), "response": _batch_response(config, item["request"])}))
+            output = store.add_file(("\n".join(lines) + "\n").encode("utf-8"), "application/jsonl")
+            with store.lock:
+                job["output"] = output
+        metadata = {
+            "@type": "type.googleapis.com/google.ai.generativelanguage.v1main.GenerateContentBatch",
+            "name": name,
+            "model": job["model"],
+            "displayName": job["displayName"],
+            "state": "BATCH_STATE_SUCCEEDED" if finished else "BATCH_STATE_RUNNING",
+        }
+        if finished:
+            metadata["output"] = {"responsesFile": job["output"]}
+        return {"name": name, "metadata": metadata}
+
+    def _stream(self, config, wants_audio, prompt_tokens):
+        """Send the response as server-sent events, pausing between chunks"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        pieces = config.audio_pieces if wants_audio else config.text_pieces
+        sent = 0
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(config.chunk_delay)
+            event = {"candidates": [_audio_candidate(piece) if wants_audio else _text_candidate(piece)]}
+            if index == len(pieces) - 1:
+                event["candidates"][0]["finishReason"] = "STOP"
+                event["usageMetadata"] = _usage(prompt_tokens, len(pieces) * 25)
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            sent += len(data)
+        self.wfile.write(b"0\r\n\r\n")
+        return sent
+
+
+def _has_media(request):
+    """True when the request carries inline or uploaded media (a transcription)"""
+    for content in request.get("contents") or []:
+        for part in content.get("parts") or []:
+            if "inlineData" in part or "fileData" in part:
+                return True
+    return False
+
+
+class MockGeminiServer:
+    """Runs the mock API on a background thread"""
+
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self._server = ThreadingHTTPServer((host, port), MockGeminiHandler)
+        self._server.daemon_threads = True
+        self._server.mock_config = MockConfig(**config)
+        self._server.mock_stats = MockStats()
+        self._server.mock_store = MockStore()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        return self._server.mock_stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-gemini", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument("--text-chunks", type=int, default=8)
+    parser.add_argument("--audio-chunks", type=int, default=8)
+    parser.add_argument("--audio-seconds", type=float, default=2.0)
+    parser.add_argument("--fixture", help="JSON file with recorded text_chunks/transcript to replay")
+    parser.add_argument("--batch-seconds", type=float, default=1.0, help="seconds a batch job runs before succeeding")
+    args = parser.parse_args()
+
+    server = MockGeminiServer(
+        port=args.port, latency=args.latency, chunk_delay=args.chunk_delay, text_chunks=args.text_chunks,
+        audio_chunks=args.audio_chunks, audio_seconds=args.audio_seconds, fixture=args.fixture,
+        batch_seconds=args.batch_seconds,
+    )
+    print(f"Mock Gemini API listening on {server.url}")
+    print(f"Use it with: GEMINI_HUB_BASE_URL={server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,23 +2,43 @@
 ComfyUI-Gemini-Hub Nodes Package
 
 This package contains all the Gemini AI nodes for ComfyUI integration.
+
+Registering the nodes must stay cheap: modules in this package import
+google-genai, torch, torchaudio and httpx inside the functions that use
+them, so the SDKs load on first execution rather than at ComfyUI startup.
 """
 
 from .gemini_text_to_speech_node import NODE_CLASS_MAPPINGS as TTS_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as TTS_NODE_DISPLAY_NAME_MAPPINGS
 from .gemini_speech_to_text_node import NODE_CLASS_MAPPINGS as STT_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as STT_NODE_DISPLAY_NAME_MAPPINGS
 from .gemini_chat_node import NODE_CLASS_MAPPINGS as CHAT_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as CHAT_NODE_DISPLAY_NAME_MAPPINGS
+from .gemini_chat_batch_node import NODE_CLASS_MAPPINGS as CHAT_BATCH_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as CHAT_BATCH_NODE_DISPLAY_NAME_MAPPINGS
+from .gemini_text_to_speech_batch_node import NODE_CLASS_MAPPINGS as TTS_BATCH_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as TTS_BATCH_NODE_DISPLAY_NAME_MAPPINGS
+from .gemini_batch_job_node import NODE_CLASS_MAPPINGS as BATCH_JOB_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as BATCH_JOB_NODE_DISPLAY_NAME_MAPPINGS
+from .gemini_embeddings_node import NODE_CLASS_MAPPINGS as EMBEDDINGS_NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS as EMBEDDINGS_NODE_DISPLAY_NAME_MAPPINGS
+from .metrics import register_metrics_route
 
 # Combine all node mappings
 NODE_CLASS_MAPPINGS = {
     **TTS_NODE_CLASS_MAPPINGS,
     **STT_NODE_CLASS_MAPPINGS,
-    **CHAT_NODE_CLASS_MAPPINGS
+    **CHAT_NODE_CLASS_MAPPINGS,
+    **CHAT_BATCH_NODE_CLASS_MAPPINGS,
+    **TTS_BATCH_NODE_CLASS_MAPPINGS,
+    **BATCH_JOB_NODE_CLASS_MAPPINGS,
+    **EMBEDDINGS_NODE_CLASS_MAPPINGS
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     **TTS_NODE_DISPLAY_NAME_MAPPINGS,
     **STT_NODE_DISPLAY_NAME_MAPPINGS,
-    **CHAT_NODE_DISPLAY_NAME_MAPPINGS
+    **CHAT_NODE_DISPLAY_NAME_MAPPINGS,
+    **CHAT_BATCH_NODE_DISPLAY_NAME_MAPPINGS,
+    **TTS_BATCH_NODE_DISPLAY_NAME_MAPPINGS,
+    **BATCH_JOB_NODE_DISPLAY_NAME_MAPPINGS,
+    **EMBEDDINGS_NODE_DISPLAY_NAME_MAPPINGS
 }
 
+# Serve /gemini_hub/metrics when metrics are enabled and ComfyUI's server is running
+register_metrics_route()
+
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,76 @@
+"""
+Background event loop for the Gemini async client
+
+``client.aio`` keeps connection pools that belong to the event loop they were
+first used on, and ComfyUI may call node functions from a thread that already
+runs a loop. Running every coroutine on one long-lived loop thread avoids both
+problems: pooled async connections stay valid between executions and node
+code can block on the result from any thread.
+"""
+
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """A single daemon thread running an asyncio event loop forever."""
+
+    def __init__(self, name="gemini-hub-async"):
+        self._name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def _start(self):
+        """Start the loop thread on first use. Caller holds the lock."""
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name=self._name, daemon=True)
+        self._thread.start()
+        ready.wait()
+        self._loop = loop
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                self._start()
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop and return a ``concurrent.futures.Future``."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block until it finishes."""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Cannot block on the Gemini Hub event loop from inside itself")
+        return self.submit(coro).result(timeout)
+
+
+# Loop shared by all nodes in this package
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop():
+    """Return the shared background loop."""
+    return _background_loop
+
+
+def run_coroutine(coro, timeout=None):
+    """Run ``coro`` on the shared background loop and return its result."""
+    return _background_loop.run(coro, timeout)
+
+
+async def await_on_background_loop(coro):
+    """Await ``coro`` from another event loop while it runs on the shared background loop."""
+    if asyncio.get_running_loop() is _background_loop.loop:
+        return await coro
+    return await asyncio.wrap_future(_background_loop.submit(coro))
@@ -0,0 +1,418 @@
+"""
+Audio helpers shared by the Gemini audio nodes
+
+Gemini returns speech as raw little-endian PCM (``audio/L16;rate=24000``) and
+accepts compact speech uploads for transcription. These helpers convert
+between that wire format and ComfyUI waveforms without touching the disk.
+
+torch and torchaudio are imported inside the functions that use them, so
+importing this module (and registering the nodes) stays cheap.
+"""
+
+import functools
+import importlib.metadata
+import importlib.util
+import io
+import struct
+import warnings
+
+
+# Name of the torch sample container type for each supported PCM bit depth
+PCM_DTYPES = {
+    8: "uint8",
+    16: "int16",
+    32: "int32",
+}
+
+# WAV AudioFormat codes for integer PCM and 32-bit float samples
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+
+# Size of the header written by ``build_wav_header``
+WAV_HEADER_BYTES = 44
+
+# Sample rate used for speech uploads; Gemini downsamples audio to 16 kHz anyway
+SPEECH_SAMPLE_RATE = 16000
+
+# Upload formats of the Speech To Text node and their MIME types; WAV needs no codec
+SPEECH_UPLOAD_FORMATS = {
+    "wav": "audio/wav",
+    "flac": "audio/flac",
+    "ogg_opus": "audio/ogg",
+}
+
+# Bit rate used for Opus uploads, plenty for intelligible speech
+OPUS_BIT_RATE = 32000
+
+
+def parse_audio_mime_type(mime_type):
+    """Parses bits per sample and rate from an audio MIME type string."""
+    bits_per_sample = 16
+    rate = 24000
+
+    # Extract rate from parameters
+    parts = (mime_type or "").split(";")
+    for param in parts:
+        param = param.strip()
+        if param.lower().startswith("rate="):
+            try:
+                rate_str = param.split("=", 1)[1]
+                rate = int(rate_str)
+            except (ValueError, IndexError):
+                pass  # Keep rate as default
+        elif param.startswith("audio/L"):
+            try:
+                bits_per_sample = int(param.split("L", 1)[1])
+            except (ValueError, IndexError):
+                pass  # Keep bits_per_sample as default
+
+    return {"bits_per_sample": bits_per_sample, "rate": rate}
+
+
+def build_wav_header(data_size, sample_rate, bits_per_sample=16, num_channels=1, audio_format=WAVE_FORMAT_PCM):
+    """Generates a WAV file header for PCM data of the given size and parameters."""
+    bytes_per_sample = bits_per_sample // 8
+    block_align = num_channels * bytes_per_sample
+    byte_rate = sample_rate * block_align
+    chunk_size = 36 + data_size  # 36 bytes for header fields before data chunk size
+
+    # http://soundfile.sapp.org/doc/WaveFormat/
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",          # ChunkID
+        chunk_size,       # ChunkSize (total file size - 8 bytes)
+        b"WAVE",          # Format
+        b"fmt ",          # Subchunk1ID
+        16,               # Subchunk1Size (16 for PCM)
+        audio_format,     # AudioFormat (1 for PCM, 3 for IEEE float)
+        num_channels,     # NumChannels
+        sample_rate,      # SampleRate
+        byte_rate,        # ByteRate
+        block_align,      # BlockAlign
+        bits_per_sample,  # BitsPerSample
+        b"data",          # Subchunk2ID
+        data_size         # Subchunk2Size (size of audio data)
+    )
+
+
+def split_wav_chunk(data):
+    """
+    Split a PCM WAV payload into its format parameters and sample data.
+
+    Returns ``(sample_rate, bits_per_sample, num_channels, pcm)`` where ``pcm``
+    is a memoryview over the ``data`` sub-chunk, so no bytes are copied.
+    """
+    view = memoryview(data)
+    if len(view) < 12 or bytes(view[0:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Audio chunk is not a RIFF/WAVE payload")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+        body_start = offset + 8
+        if chunk_id == b"fmt ":
+            audio_format, num_channels, sample_rate = struct.unpack_from("<HHI", view, body_start)
+            bits_per_sample = struct.unpack_from("<H", view, body_start + 14)[0]
+            if audio_format != 1:
+                raise ValueError(f"Unsupported WAV encoding (format tag {audio_format}); only PCM is supported")
+            fmt = (sample_rate, bits_per_sample, num_channels)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise ValueError("WAV data chunk appears before its fmt chunk")
+            return fmt + (view[body_start:body_start + chunk_size],)
+        # Sub-chunks are padded to an even size
+        offset = body_start + chunk_size + (chunk_size & 1)
+
+    raise ValueError("WAV payload has no data chunk")
+
+
+def is_raw_pcm_mime_type(mime_type):
+    """Return True when the MIME type describes headerless PCM samples."""
+    base_type = (mime_type or "").split(";", 1)[0].strip().lower()
+    return base_type.startswith("audio/l") or base_type == "audio/pcm"
+
+
+def pcm_to_waveform(pcm_data, bits_per_sample=16, num_channels=1):
+    """
+    Convert interleaved little-endian PCM bytes into a float32 waveform.
+
+    The buffer is viewed in place with ``torch.frombuffer`` and converted in a
+    single vectorized pass, so the only new allocation is the float tensor
+    itself. Returns a tensor of shape ``[channels, samples]`` scaled to [-1, 1].
+    """
+    import torch
+
+    dtype_name = PCM_DTYPES.get(bits_per_sample)
+    if dtype_name is None:
+        raise ValueError(f"Unsupported PCM bit depth: {bits_per_sample}")
+    dtype = getattr(torch, dtype_name)
+
+    frame_size = (bits_per_sample // 8) * num_channels
+    usable_size = len(pcm_data) - len(pcm_data) % frame_size
+    if usable_size == 0:
+        raise ValueError("PCM buffer does not contain a complete audio frame")
+
+    # Drop a trailing partial frame without copying the buffer
+    buffer = memoryview(pcm_data)[:usable_size]
+
+    with warnings.catch_warnings():
+        # frombuffer warns about read-only buffers such as ``bytes``;
+        # the view is only ever read here.
+        warnings.simplefilter("ignore", UserWarning)
+        samples = torch.frombuffer(buffer, dtype=dtype)
+
+    if bits_per_sample == 8:
+        # 8-bit PCM is unsigned with a midpoint of 128
+        waveform = samples.to(torch.float32).sub_(128.0).div_(128.0)
+    else:
+        waveform = samples.to(torch.float32).div_(float(2 ** (bits_per_sample - 1)))
+
+    return waveform.view(-1, num_channels).t().contiguous()
+
+
+def prepare_speech_waveform(waveform, sample_rate, target_rate=SPEECH_SAMPLE_RATE):
+    """
+    Downmix a ``[channels, samples]`` waveform to mono and resample it for speech.
+
+    Returns a ``[1, samples]`` float32 CPU tensor at ``target_rate``.
+    """
+    import torch
+    import torchaudio
+
+    if waveform.dim() == 1:
+        waveform = waveform.unsqueeze(0)
+
+    waveform = waveform.detach().to("cpu", torch.float32)
+    if waveform.shape[0] > 1:
+        waveform = waveform.mean(dim=0, keepdim=True)
+
+    if target_rate and sample_rate != target_rate:
+        waveform = torchaudio.functional.resample(waveform, sample_rate, target_rate)
+
+    return waveform
+
+
+def waveform_to_pcm16(waveform):
+    """Quantize a float waveform in [-1, 1] to interleaved 16-bit PCM samples."""
+    import torch
+
+    return waveform.clamp(-1.0, 1.0).mul(32767.0).round_().to(torch.int16)
+
+
+@functools.lru_cache(maxsize=None)
+def compressed_encoding_available():
+    """
+    True when FLAC and Opus uploads can be encoded.
+
+    torchaudio 2.9 and later encode through TorchCodec, which is an optional
+    install; earlier releases encode with their own FFmpeg/libsndfile
+    backends. Checked from package metadata, without importing either.
+    """
+    if importlib.util.find_spec("torchcodec") is not None:
+        return True
+    try:
+        major, minor = (int(part) for part in importlib.metadata.version("torchaudio").split(".")[:2])
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return False
+    return (major, minor) < (2, 9)
+
+
+def available_speech_formats():
+    """Upload formats that can be encoded in this environment, WAV first"""
+    if compressed_encoding_available():
+        return list(SPEECH_UPLOAD_FORMATS)
+    return ["wav"]
+
+
+# Formats whose fallback to WAV was already reported
+_reported_fallbacks = set()
+
+
+def _encode_compressed(waveform, sample_rate, container, bit_rate=None):
+    """Encode a mono waveform with FFmpeg/libsndfile into an in-memory buffer."""
+    import torchaudio
+
+    try:
+        # torchaudio >= 2.9 delegates encoding to TorchCodec
+        from torchcodec.encoders import AudioEncoder
+    except ImportError:
+        AudioEncoder = None
+
+    if AudioEncoder is not None:
+        encoder = AudioEncoder(waveform, sample_rate=sample_rate)
+        codec_format = "opus" if container == "ogg_opus" else container
+        encoded = encoder.to_tensor(format=codec_format, bit_rate=bit_rate)
+        return encoded.numpy().tobytes()
+
+    buffer = io.BytesIO()
+    if container == "ogg_opus":
+        torchaudio.save(buffer, waveform, sample_rate, format="ogg", encoding="opus",
+                        compression=bit_rate)
+    else:
+        torchaudio.save(buffer, waveform, sample_rate, format=container, bits_per_sample=16)
+    return buffer.getvalue()
+
+
+def encode_speech_audio(waveform, sample_rate, audio_format="wav", target_rate=SPEECH_SAMPLE_RATE):
+    """
+    Encode a waveform into a compact, in-memory speech upload.
+
+    The audio is downmixed to mono and resampled to ``target_rate`` before
+    encoding. Falls back to 16-bit WAV when no encoder backend is available
+    for the requested format. Returns ``(audio_bytes, mime_type)``.
+    """
+    mime_type = SPEECH_UPLOAD_FORMATS.get(audio_format)
+    if mime_type is None:
+        raise ValueError(
+            f"Unsupported upload format '{audio_format}'. "
+            f"Choose one of: {', '.join(SPEECH_UPLOAD_FORMATS)}"
+        )
+
+    speech = prepare_speech_waveform(waveform, sample_rate, target_rate)
+    rate = target_rate or sample_rate
+
+    if audio_format != "wav":
+        bit_rate = OPUS_BIT_RATE if audio_format == "ogg_opus" else None
+        try:
+            return _encode_compressed(speech, rate, audio_format, bit_rate), mime_type
+        except (ImportError, RuntimeError) as e:
+            # No usable encoder backend; 16 kHz mono WAV is still far smaller than the source
+            if audio_format not in _reported_fallbacks:
+                _reported_fallbacks.add(audio_format)
+                print(f"Gemini Hub: {audio_format} encoding unavailable ({e}), uploading WAV instead")
+
+    pcm = waveform_to_pcm16(speech).numpy()
+    buffer = io.BytesIO()
+    buffer.write(build_wav_header(pcm.nbytes, rate, 16, 1))
+    buffer.write(pcm.data)
+    return buffer.getvalue(), SPEECH_UPLOAD_FORMATS["wav"]
+
+
+def join_waveforms(waveforms, sample_rate, gap_seconds=0.0, crossfade_seconds=0.0):
+    """
+    Concatenate ``[channels, samples]`` waveforms in order into one waveform.
+
+    Neighbours are either separated by ``gap_seconds`` of silence or blended
+    with a linear crossfade of ``crossfade_seconds``; a crossfade takes
+    precedence over a gap. The output is allocated once and filled in place.
+    """
+    import torch
+
+    if not waveforms:
+        raise ValueError("No waveforms to join")
+    if len(waveforms) == 1:
+        return waveforms[0]
+
+    fade = max(0, int(round(crossfade_seconds * sample_rate)))
+    gap = 0 if fade else max(0, int(round(gap_seconds * sample_rate)))
+
+    # Work out where each waveform starts in the output
+    offsets = [0]
+    for previous, current in zip(waveforms[:-1], waveforms[1:]):
+        overlap = min(fade, previous.shape[-1], current.shape[-1])
+        offsets.append(offsets[-1] + previous.shape[-1] + gap - overlap)
+    total = offsets[-1] + waveforms[-1].shape[-1]
+
+    first = waveforms[0]
+    output = first.new_zeros(first.shape[0], total)
+    output_end = 0
+    for offset, waveform in zip(offsets, waveforms):
+        length = waveform.shape[-1]
+        overlap = max(0, output_end - offset)
+        if overlap:
+            # Fade out the tail already written while fading in the new head
+            ramp = torch.linspace(0.0, 1.0, overlap + 2, dtype=output.dtype, device=output.device)[1:-1]
+            output[:, offset:offset + overlap].mul_(1.0 - ramp).add_(waveform[:, :overlap] * ramp)
+        output[:, offset + overlap:offset + length] = waveform[:, overlap:]
+        output_end = offset + length
+
+    return output
+
+
+def pad_waveforms(waveforms):
+    """
+    Stack ``[channels, samples]`` clips into a zero-padded ``[batch, 1, samples]`` tensor.
+
+    Multi-channel clips are downmixed to mono. Returns the batch and each
+    clip's length in samples, so consumers can ignore the padding.
+    """
+    import torch
+
+    lengths = [waveform.shape[-1] for waveform in waveforms]
+    batch = torch.zeros((len(waveforms), 1, max(lengths, default=0)), dtype=torch.float32)
+    for index, waveform in enumerate(waveforms):
+        if waveform.shape[-1]:
+            batch[index, 0, :lengths[index]] = waveform.reshape(-1, waveform.shape[-1]).mean(dim=0)
+    return batch, lengths
+
+
+class PCMChunkAssembler:
+    """
+    Collects a streamed Gemini audio response into one contiguous PCM buffer.
+
+    Chunks are appended to a single ``bytearray``, which grows with amortized
+    constant cost, so assembling N chunks is linear in the total size. WAV
+    chunks have their headers stripped on the way in; every chunk must share
+    the same sample rate and bit depth. The buffer is emitted either as one
+    WAV file (a single header) or decoded straight into a waveform.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.sample_rate = None
+        self.bits_per_sample = None
+        self.num_channels = None
+        self.num_chunks = 0
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def _check_format(self, sample_rate, bits_per_sample, num_channels):
+        """Lock the stream format on the first chunk and reject changes afterwards."""
+        if self.sample_rate is None:
+            if bits_per_sample not in PCM_DTYPES:
+                raise ValueError(f"Unsupported PCM bit depth: {bits_per_sample}")
+            self.sample_rate = sample_rate
+            self.bits_per_sample = bits_per_sample
+            self.num_channels = num_channels
+        elif (sample_rate, bits_per_sample, num_channels) != (
+            self.sample_rate, self.bits_per_sample, self.num_channels
+        ):
+            raise ValueError(
+                "Audio chunks have inconsistent formats: expected "
+                f"{self.sample_rate} Hz/{self.bits_per_sample}-bit/{self.num_channels}ch, "
+                f"got {sample_rate} Hz/{bits_per_sample}-bit/{num_channels}ch"
+            )
+
+    def add(self, data, mime_type):
+        """Append one streamed chunk given its bytes and MIME type."""
+        if not data:
+            return
+
+        if is_raw_pcm_mime_type(mime_type):
+            parameters = parse_audio_mime_type(mime_type)
+            self._check_format(parameters["rate"], parameters["bits_per_sample"], 1)
+            pcm = data
+        elif bytes(data[:4]) == b"RIFF":
+            sample_rate, bits_per_sample, num_channels, pcm = split_wav_chunk(data)
+            self._check_format(sample_rate, bits_per_sample, num_channels)
+        else:
+            raise ValueError(f"Unsupported streamed audio format: {mime_type}")
+
+        self._buffer += pcm
+        self.num_chunks += 1
+
+    def to_wav(self):
+        """Return the assembled audio as a single WAV file."""
+        header = build_wav_header(
+            len(self._buffer), self.sample_rate, self.bits_per_sample, self.num_channels
+        )
+        return header + self._buffer
+
+    def to_waveform(self):
+        """Decode the assembled audio into a ``[channels, samples]`` float32 waveform."""
+        if not self._buffer:
+            raise ValueError("No audio data received from Gemini API")
+        return pcm_to_waveform(self._buffer, self.bits_per_sample, self.num_channels)
@@ -0,0 +1,351 @@
+"""
+Gemini Batch API jobs for large offline runs
+
+Thousands of chat prompts or speech lines are cheaper and kinder to the
+interactive quota when sent as one Batch API job instead of one request
+each. Requests are written as JSON lines (``{"key": ..., "request": ...}``),
+uploaded through the Files API and submitted with ``client.batches.create``.
+Jobs are polled with exponential backoff; once a job finishes, its results
+file is streamed to disk and read back line by line, and every result is
+mapped to its input through the line key.
+
+Every submitted job is recorded in a small JSON manifest named after a hash
+of the model and requests. Submitting the same requests again, for instance
+after ComfyUI restarts, finds the manifest and resumes the existing job
+instead of paying for a second one.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .audio_utils import PCMChunkAssembler
+from .rate_limiter import is_retryable_error
+from .response_cache import default_cache_dir
+
+
+# Job states, as reported by the SDK
+SUCCEEDED_STATES = ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED")
+FAILED_STATES = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
+TERMINAL_STATES = SUCCEEDED_STATES + FAILED_STATES
+
+# Polling starts at this interval and backs off up to the maximum (seconds)
+DEFAULT_POLL_INTERVAL = 5.0
+MAX_POLL_INTERVAL = 120.0
+POLL_BACKOFF = 1.5
+
+# MIME type of uploaded request files
+JSONL_MIME_TYPE = "application/jsonl"
+
+
+def default_jobs_dir():
+    """Keep job manifests and results next to the response cache."""
+    return os.path.join(default_cache_dir(), "batch_jobs")
+
+
+def chat_request(prompt, system_prompt="", reference_document=""):
+    """One chat prompt as a REST ``GenerateContentRequest``, laid out like ``build_chat_request``"""
+    parts = []
+    if reference_document and reference_document.strip():
+        parts.append({"text": reference_document})
+    parts.append({"text": prompt})
+    request = {
+        "contents": [{"role": "user", "parts": parts}],
+        "generationConfig": {"responseMimeType": "text/plain"},
+    }
+    if system_prompt and system_prompt.strip():
+        request["systemInstruction"] = {"parts": [{"text": system_prompt.strip()}]}
+    return request
+
+
+def speech_request(text, voice_name, speaker_voices=None):
+    """One text-to-speech item as a REST ``GenerateContentRequest``"""
+    from .gemini_text_to_speech_node import build_speech_config
+
+    speech_config = build_speech_config(voice_name, speaker_voices)
+    return {
+        "contents": [{"role": "user", "parts": [{"text": text}]}],
+        "generationConfig": {
+            "responseModalities": ["AUDIO"],
+            "speechConfig": speech_config.model_dump(mode="json", by_alias=True, exclude_none=True),
+        },
+    }
+
+
+def make_job_id(kind, model, keyed_requests):
+    """Stable id of a job: the same kind, model and requests always map to the same manifest"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([kind, model], sort_keys=True).encode("utf-8"))
+    for key, request in keyed_requests:
+        digest.update(b"\0")
+        digest.update(json.dumps([key, request], sort_keys=True).encode("utf-8"))
+    return f"{kind}-{digest.hexdigest()[:24]}"
+
+
+def response_text(response):
+    """Concatenated text parts of the first candidate of a REST response dict"""
+    candidates = (response or {}).get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts if not part.get("thought"))
+
+
+def response_waveform(response):
+    """Decode the inline audio of a REST response dict into ``(waveform, sample_rate)``"""
+    assembler = PCMChunkAssembler()
+    for candidate in (response or {}).get("candidates") or []:
+        for part in (candidate.get("content") or {}).get("parts") or []:
+            inline_data = part.get("inlineData")
+            if inline_data and inline_data.get("data"):
+                assembler.add(base64.b64decode(inline_data["data"]), inline_data.get("mimeType"))
+    return assembler.to_waveform(), assembler.sample_rate
+
+
+def _error_message(line):
+    """Error message of a failed result line, or an empty string"""
+    error = line.get("error") or line.get("status")
+    if not error:
+        return ""
+    if isinstance(error, dict):
+        return error.get("message") or json.dumps(error)
+    return str(error)
+
+
+def _state_name(job):
+    """Return the job state name whether the SDK hands back an enum or a string."""
+    state = getattr(job, "state", None)
+    return getattr(state, "name", state) or "JOB_STATE_UNSPECIFIED"
+
+
+class BatchJobManager:
+    """
+    Submits, resumes, polls and collects Batch API jobs, tracked by on-disk manifests.
+
+    A manifest ``<job id>.json`` holds the job name, state, model and the map
+    from line keys to input indices. Request and result files sit next to
+    it as ``<job id>.requests.jsonl`` and ``<job id>.results.jsonl``.
+    """
+
+    def __init__(self, directory=None, clock=time.monotonic, sleep=time.sleep):
+        self.directory = directory or default_jobs_dir()
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "resumed": 0, "polls": 0, "collected": 0}
+
+    def _path(self, job_id, suffix=".json"):
+        return os.path.join(self.directory, job_id + suffix)
+
+    def load(self, job_id):
+        """Return the manifest of a job, or None when it was never submitted from here."""
+        try:
+            with open(self._path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, manifest):
+        """Write a manifest atomically, so a crash never leaves half of one behind."""
+        os.makedirs(self.directory, exist_ok=True)
+        manifest["updated"] = time.time()
+        path = self._path(manifest["id"])
+        with self._lock:
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(temp_path, path)
+
+    def manifests(self):
+        """Every manifest in the jobs directory, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                manifest = self.load(name[:-5])
+                if manifest is not None:
+                    found.append(manifest)
+        return sorted(found, key=lambda manifest: manifest.get("created", 0))
+
+    def submit(self, client, kind, model, keyed_requests, display_name=None):
+        """
+        Submit ``(key, request)`` pairs as one batch job, or resume the job already submitted for them.
+
+        Returns the job manifest. Jobs that failed, were cancelled or expired
+        are submitted again.
+        """
+        job_id = make_job_id(kind, model, keyed_requests)
+        manifest = self.load(job_id)
+        if manifest is not None and manifest.get("job_name") and manifest.get("state") not in FAILED_STATES:
+            with self._lock:
+                self._stats["resumed"] += 1
+            print(f"Resuming Gemini batch job {manifest['job_name']} ({manifest['state']})")
+            return manifest
+
+        from google.genai import types
+
+        # One JSON line per request, keyed so results can be matched back in any order
+        os.makedirs(self.directory, exist_ok=True)
+        requests_path = self._path(job_id, ".requests.jsonl")
+        with open(requests_path, "w", encoding="utf-8") as f:
+            for key, request in keyed_requests:
+                f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False))
+                f.write("\n")
+
+        uploaded = client.files.upload(
+            file=requests_path,
+            config=types.UploadFileConfig(mime_type=JSONL_MIME_TYPE, display_name=job_id),
+        )
+        job = client.batches.create(
+            model=model,
+            src=uploaded.name,
+            config=types.CreateBatchJobConfig(display_name=display_name or job_id),
+        )
+
+        manifest = {
+            "id": job_id,
+            "kind": kind,
+            "model": model,
+            "job_name": job.name,
+            "state": _state_name(job),
+            "input_file": uploaded.name,
+            "keys": [key for key, _ in keyed_requests],
+            "created": time.time(),
+            "results_file": None,
+            "error": "",
+        }
+        self.save(manifest)
+        with self._lock:
+            self._stats["submitted"] += 1
+        print(f"Submitted Gemini batch job {job.name} with {len(keyed_requests)} request(s)")
+        return manifest
+
+    def refresh(self, client, manifest):
+        """Fetch the job's current state into its manifest and return the job."""
+        job = client.batches.get(name=manifest["job_name"])
+        with self._lock:
+            self._stats["polls"] += 1
+        state = _state_name(job)
+        dest = getattr(job, "dest", None)
+        if state != manifest["state"] or (dest is not None and dest.file_name != manifest.get("results_file")):
+            manifest["state"] = state
+            manifest["results_file"] = dest.file_name if dest is not None else None
+            if getattr(job, "error", None) is not None:
+                manifest["error"] = job.error.message or str(job.error)
+            self.save(manifest)
+        return job
+
+    def wait(self, client, manifest, timeout, poll_interval=DEFAULT_POLL_INTERVAL,
+             max_interval=MAX_POLL_INTERVAL):
+        """
+        Poll until the job reaches a final state or ``timeout`` seconds pass.
+
+        The interval grows by ``POLL_BACKOFF`` per poll up to ``max_interval``.
+        Transient API errors count as a poll with no news. Returns the job,
+        or None when it could not be fetched at all.
+        """
+        deadline = self._clock() + max(0.0, timeout)
+        interval = poll_interval
+        job = None
+        while True:
+            try:
+                job = self.refresh(client, manifest)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                print(f"Polling Gemini batch job {manifest['job_name']} failed, retrying: {str(e)}")
+            if manifest["state"] in TERMINAL_STATES:
+                return job
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return job
+            self._sleep(min(interval, remaining))
+            interval = min(interval * POLL_BACKOFF, max_interval)
+
+    def results(self, client, manifest, job=None):
+        """
+        Yield ``(index, response, error)`` for every result of a finished job.
+
+        The results file is streamed to disk once and then read one line at a
+        time; ``response`` is a REST ``GenerateContentResponse`` dict. Inputs
+        with no result line are reported as errors.
+        """
+        indices = {key: index for index, key in enumerate(manifest["keys"])}
+        seen = set()
+        for key, response, error in self._result_lines(client, manifest, job):
+            index = indices.get(key)
+            if index is None or index in seen:
+                continue
+            seen.add(index)
+            yield index, response, error
+        for key, index in indices.items():
+            if index not in seen:
+                yield index, None, f"No result for {key} in batch job {manifest['job_name']}"
+        with self._lock:
+            self._stats["collected"] += 1
+
+    def _result_lines(self, client, manifest, job):
+        """Yield ``(key, response, error)`` from the results file or the job's inlined responses."""
+        if not manifest.get("results_file"):
+            # Inlined responses come back in request order, without keys
+            dest = getattr(job or self.refresh(client, manifest), "dest", None)
+            for key, inlined in zip(manifest["keys"], getattr(dest, "inlined_responses", None) or []):
+                error = inlined.error.message if inlined.error is not None else ""
+                response = (
+                    inlined.response.model_dump(mode="json", by_alias=True, exclude_none=True)
+                    if inlined.response is not None else None
+                )
+                yield key, response, error
+            return
+
+        local_path = self._path(manifest["id"], ".results.jsonl")
+        if not os.path.exists(local_path):
+            temp_path = local_path + ".part"
+            client.files.download(file=manifest["results_file"], destination=temp_path)
+            os.replace(temp_path, local_path)
+
+        with open(local_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    continue
+                yield result.get("key"), result.get("response"), _error_message(result)
+
+    def cleanup(self, client, manifest):
+        """Best-effort removal of the uploaded request file once a job is final."""
+        input_file = manifest.get("input_file")
+        if not input_file:
+            return
+        try:
+            client.files.delete(name=input_file)
+        except Exception as e:
+            print(f"Could not delete uploaded file {input_file}: {str(e)}")
+        manifest["input_file"] = None
+        self.save(manifest)
+
+    def stats(self):
+        """Return how many jobs were submitted, resumed, polled and collected."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# Manager shared by all nodes in this package
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_batch_job_manager():
+    """Return the shared batch job manager, created on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BatchJobManager()
+        return _manager
@@ -0,0 +1,220 @@
+"""
+Explicit Gemini context caching for repeated system prompts
+
+A long system prompt or reference document is uploaded once as a Gemini
+cached-content entry and then referenced by name, so later requests are
+billed for the cached tokens at the reduced rate and start faster. Live
+caches are tracked locally (in a small JSON file next to the response cache)
+so they are reused across executions and restarts until they expire.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .response_cache import default_cache_dir
+
+
+# Refresh a cache's TTL when it has less than this many seconds left
+REFRESH_MARGIN_SECONDS = 120
+
+# Default lifetime of a new cache entry
+DEFAULT_TTL_SECONDS = 3600
+
+# After a failed create, requests for the same content skip caching for this long
+FAILURE_RETRY_SECONDS = 60
+
+
+def _expire_timestamp(cached_content, fallback_ttl):
+    """Return the cache's expiry as a POSIX timestamp."""
+    expire_time = getattr(cached_content, "expire_time", None)
+    if isinstance(expire_time, datetime.datetime):
+        if expire_time.tzinfo is None:
+            expire_time = expire_time.replace(tzinfo=datetime.timezone.utc)
+        return expire_time.timestamp()
+    return time.time() + fallback_ttl
+
+
+class ContextCacheManager:
+    """
+    Creates, refreshes and remembers Gemini cached-content entries.
+
+    Entries are keyed by a fingerprint of the API key, model, system prompt
+    and reference document, and persisted to ``state_path``.
+    """
+
+    def __init__(self, state_path=None, clock=time.time):
+        self.state_path = state_path or os.path.join(default_cache_dir(), "context_caches.json")
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = None
+        # fingerprint -> Future of the create or refresh in progress
+        self._pending = {}
+        # fingerprint -> (time to try again, error) after a failed create
+        self._failures = {}
+
+    def _load(self):
+        """Read the bookkeeping file once. Caller holds the lock."""
+        if self._entries is not None:
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        """Persist live entries, dropping expired ones. Caller holds the lock."""
+        now = self._clock()
+        self._entries = {
+            fingerprint: entry for fingerprint, entry in self._entries.items()
+            if entry["expire_time"] > now
+        }
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, indent=2)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            print(f"Could not save Gemini context cache bookkeeping: {str(e)}")
+
+    def fingerprint(self, api_key, model, system_prompt, reference_document):
+        """Identify the cached content without storing the API key."""
+        digest = hashlib.sha256()
+        for value in (api_key, model, system_prompt or "", reference_document or ""):
+            digest.update(value.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get_or_create(self, client, api_key, model, system_prompt="", reference_document="",
+                      ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Return the name of a live cache for this content, creating or refreshing it as needed.
+
+        The API calls run outside the manager's lock. Concurrent callers for
+        the same content share one create or refresh, and a failed create is
+        remembered for ``FAILURE_RETRY_SECONDS`` so it is not retried by
+        every request in the meantime.
+        """
+        fingerprint = self.fingerprint(api_key, model, system_prompt, reference_document)
+
+        with self._lock:
+            self._load()
+            entry = self._entries.get(fingerprint)
+            now = self._clock()
+
+            if entry is not None and entry["expire_time"] - now > REFRESH_MARGIN_SECONDS:
+                return entry["name"]
+
+            failure = self._failures.get(fingerprint)
+            if failure is not None:
+                retry_at, error = failure
+                if retry_at > now:
+                    raise error
+                del self._failures[fingerprint]
+
+            future = self._pending.get(fingerprint)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._pending[fingerprint] = future
+                # Still alive but about to expire: extend it rather than re-upload
+                refresh_name = entry["name"] if entry is not None and entry["expire_time"] > now else None
+
+        if not leader:
+            return future.result()
+
+        try:
+            name, expire_time = self._create_or_refresh(
+                client, model, system_prompt, reference_document, ttl_seconds, fingerprint, refresh_name
+            )
+        except Exception as e:
+            with self._lock:
+                self._failures[fingerprint] = (self._clock() + FAILURE_RETRY_SECONDS, e)
+                self._pending.pop(fingerprint, None)
+            future.set_exception(e)
+            raise
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(fingerprint, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[fingerprint] = {"name": name, "model": model, "expire_time": expire_time}
+            self._save()
+            self._pending.pop(fingerprint, None)
+        future.set_result(name)
+        return name
+
+    def _create_or_refresh(self, client, model, system_prompt, reference_document, ttl_seconds, fingerprint,
+                           refresh_name=None):
+        """Extend ``refresh_name``, or upload the content as a new cache; return its name and expiry."""
+        from google.genai import types
+
+        ttl = f"{int(ttl_seconds)}s"
+        if refresh_name is not None:
+            try:
+                updated = client.caches.update(
+                    name=refresh_name,
+                    config=types.UpdateCachedContentConfig(ttl=ttl),
+                )
+                return refresh_name, _expire_timestamp(updated, ttl_seconds)
+            except Exception as e:
+                print(f"Could not refresh context cache {refresh_name}, recreating it: {str(e)}")
+
+        contents = None
+        if reference_document and reference_document.strip():
+            contents = [
+                types.Content(
+                    role="user",
+                    parts=[types.Part.from_text(text=reference_document)],
+                )
+            ]
+
+        cached_content = client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_prompt.strip() if system_prompt and system_prompt.strip() else None,
+                contents=contents,
+                ttl=ttl,
+                display_name=f"gemini-hub-{fingerprint[:16]}",
+            ),
+        )
+        return cached_content.name, _expire_timestamp(cached_content, ttl_seconds)
+
+    def invalidate(self, name):
+        """Forget a cache that the API no longer recognizes."""
+        with self._lock:
+            self._load()
+            self._entries = {
+                fingerprint: entry for fingerprint, entry in self._entries.items()
+                if entry["name"] != name
+            }
+            self._save()
+
+    def live_caches(self):
+        """Return a snapshot of the caches believed to be alive."""
+        with self._lock:
+            self._load()
+            now = self._clock()
+            return [dict(entry) for entry in self._entries.values() if entry["expire_time"] > now]
+
+
+# Manager shared by all nodes in this package
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_context_cache_manager():
+    """Return the process-wide context cache manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ContextCacheManager()
+        return _manager
@@ -0,0 +1,346 @@
+import json
+from .batch_jobs import (
+    FAILED_STATES, SUCCEEDED_STATES, chat_request, get_batch_job_manager, response_text, response_waveform,
+    speech_request
+)
+from .gemini_chat_batch_node import GeminiChatBatch
+from .gemini_chat_node import CHAT_MODELS, GeminiChat
+from .gemini_client import get_client
+from .gemini_text_to_speech_batch_node import GeminiTextToSpeechBatch, parse_speaker_voices
+from .gemini_text_to_speech_node import VOICE_NAMES, GeminiTextToSpeech
+from .metrics import record_cache_hit
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .response_cache import get_response_cache
+
+
+def wait_minutes_input():
+    return ("INT", {
+        "default": 0,
+        "min": 0,
+        "max": 1440,
+        "tooltip": "How long this run waits for the job to finish. 0 submits (or checks) the job and returns; queue the workflow again later to collect the results"
+    })
+
+
+def run_batch_job(client, kind, model, keyed_requests, wait_minutes):
+    """
+    Submit or resume the job for these requests and wait for it up to ``wait_minutes``.
+
+    Returns the manifest, the last fetched job and a one-line status.
+    """
+    manager = get_batch_job_manager()
+    manifest = manager.submit(client, kind, model, keyed_requests)
+    job = manager.wait(client, manifest, wait_minutes * 60)
+    status = f"{manifest['job_name']}: {manifest['state']}, {len(keyed_requests)} request(s)"
+    if manifest["state"] in FAILED_STATES and manifest.get("error"):
+        status += f", {manifest['error']}"
+    return manifest, job, status
+
+
+def unfinished_error(manifest):
+    """Per-item error for requests whose job has not produced results"""
+    if manifest["state"] in FAILED_STATES:
+        return f"Batch job {manifest['job_name']} ended in {manifest['state']}: {manifest.get('error') or 'no details'}"
+    return f"Batch job {manifest['job_name']} is {manifest['state']}; queue the workflow again to collect the results"
+
+
+class GeminiChatBatchJob(GeminiNodeExecution):
+    """
+    A ComfyUI node for running many prompts as one Gemini Batch API job
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key"
+                }),
+                "model": (CHAT_MODELS, {
+                    "default": CHAT_MODELS[0],
+                    "tooltip": "Gemini model to use for chat"
+                }),
+                "prompts": ("STRING", {
+                    "multiline": True,
+                    "default": "Hello, how are you?\nWhat can you do?",
+                    "tooltip": "Prompts to send, one per line or one JSON value per line"
+                }),
+                "input_format": (["lines", "jsonl"], {
+                    "default": "lines",
+                    "tooltip": "lines: every non-empty line is a prompt. jsonl: every line is a JSON string or an object with a \"prompt\" field"
+                }),
+                "wait_minutes": wait_minutes_input()
+            },
+            "optional": {
+                "system_prompt": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Optional system prompt applied to every prompt"
+                }),
+                "reference_document": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Optional long reference material sent ahead of every prompt"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Skip prompts with stored responses and store the collected ones; shared with the Gemini Chat node"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
+    RETURN_NAMES = ("responses", "errors", "results_jsonl", "job_status")
+    OUTPUT_IS_LIST = (True, True, False, False)
+    EXECUTE = "chat_batch_job"
+    # Submitting and waiting for a job happens only when ComfyUI runs the node
+    PREFETCH = False
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "text"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # The job progresses outside ComfyUI, so its state is checked on every run
+        return float("nan")
+
+    def chat_batch_job(self, api_key, model, prompts, input_format, wait_minutes, system_prompt="",
+                       reference_document="", use_cache=True):
+        """Submit or resume a batch job for the prompts and return the responses once it has finished"""
+        prompt_list = GeminiChatBatch().parse_prompts(prompts, input_format)
+        if not prompt_list:
+            raise ValueError("No prompts provided")
+
+        responses = [""] * len(prompt_list)
+        errors = [""] * len(prompt_list)
+
+        # Only prompts without a stored response go into the job
+        cache = get_response_cache() if use_cache else None
+        cache_keys = [
+            GeminiChat.cache_key(model, prompt, system_prompt, reference_document) for prompt in prompt_list
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached_text = cache.get_text(cache_key) if cache is not None else None
+            if cached_text is not None:
+                record_cache_hit("GeminiChatBatchJob", model)
+                responses[index] = cached_text
+            else:
+                pending.append(index)
+
+        status = f"All {len(prompt_list)} prompt(s) served from cache"
+        if pending:
+            client = get_client(api_key)
+
+            # Prompts that cannot fit a request fail on their own instead of failing the job
+            preflight = get_preflight()
+            fitting = []
+            for index in pending:
+                try:
+                    preflight.check_text(model, [system_prompt, reference_document, prompt_list[index]], client)
+                    fitting.append(index)
+                except ValueError as e:
+                    errors[index] = str(e)
+
+            status = "Nothing submitted: every uncached prompt failed the pre-flight check"
+            if fitting:
+                keyed_requests = [
+                    (f"item-{index}", chat_request(prompt_list[index], system_prompt, reference_document))
+                    for index in fitting
+                ]
+                manifest, job, status = run_batch_job(client, "chat", model, keyed_requests, wait_minutes)
+
+                if manifest["state"] in SUCCEEDED_STATES:
+                    manager = get_batch_job_manager()
+                    for position, response, error in manager.results(client, manifest, job):
+                        index = fitting[position]
+                        text = response_text(response).strip()
+                        if not error and not text:
+                            error = "Received empty response from Gemini API"
+                        responses[index] = "" if error else text
+                        errors[index] = error
+                        if cache is not None and not error:
+                            cache.put_text(cache_keys[index], text)
+                    manager.cleanup(client, manifest)
+                else:
+                    for index in fitting:
+                        errors[index] = unfinished_error(manifest)
+
+        failed = sum(1 for error in errors if error)
+        if failed:
+            print(f"Gemini Chat Batch Job: {failed} of {len(prompt_list)} prompts have no response")
+
+        results_jsonl = "\n".join(
+            json.dumps({"index": index, "response": text, "error": error}, ensure_ascii=False)
+            for index, (text, error) in enumerate(zip(responses, errors))
+        )
+        return (responses, errors, results_jsonl, status)
+
+
+class GeminiTextToSpeechBatchJob(GeminiNodeExecution):
+    """
+    A ComfyUI node for synthesizing many lines of speech as one Gemini Batch API job
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key"
+                }),
+                "model": (["gemini-2.5-pro-preview-tts", "gemini-2.5-flash-preview-tts"], {
+                    "default": "gemini-2.5-flash-preview-tts",
+                    "tooltip": "Select the Gemini model to use for text-to-speech"
+                }),
+                "texts": ("STRING", {
+                    "multiline": True,
+                    "default": "Kore: Hello, this is the first line.\nPuck: And this is the second one.",
+                    "tooltip": "Texts to synthesize; every item becomes one clip of the batch"
+                }),
+                "input_format": (["lines", "paragraphs", "jsonl"], {
+                    "default": "lines",
+                    "tooltip": "Same as the Gemini Text To Speech Batch node"
+                }),
+                "voice_name": (VOICE_NAMES, {
+                    "default": "Zephyr",
+                    "tooltip": "Voice for items that do not name their own"
+                }),
+                "wait_minutes": wait_minutes_input()
+            },
+            "optional": {
+                "speaker_voices": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Multi-speaker dialogue: Speaker=Voice pairs, one per line"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Skip items with stored audio and store the collected ones; shared with the Gemini Text To Speech nodes"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("AUDIO", "INT", "STRING", "STRING")
+    RETURN_NAMES = ("audio", "lengths", "errors", "job_status")
+    OUTPUT_IS_LIST = (False, True, True, False)
+    EXECUTE = "generate_speech_batch_job"
+    # Submitting and waiting for a job happens only when ComfyUI runs the node
+    PREFETCH = False
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "audio"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # The job progresses outside ComfyUI, so its state is checked on every run
+        return float("nan")
+
+    def generate_speech_batch_job(self, api_key, model, texts, input_format, voice_name, wait_minutes,
+                                  speaker_voices="", use_cache=True):
+        """Submit or resume a batch job for the items and return them as one [B, 1, T] batch once it has finished"""
+        import torch
+
+        from .audio_utils import pad_waveforms
+
+        items = GeminiTextToSpeechBatch().parse_items(
+            texts, input_format, voice_name, parse_speaker_voices(speaker_voices)
+        )
+        if not items:
+            raise ValueError("No text to synthesize")
+
+        results = [None] * len(items)
+        errors = [""] * len(items)
+
+        # Only items without stored audio go into the job
+        cache = get_response_cache() if use_cache else None
+        cache_keys = [
+            GeminiTextToSpeech.cache_key(model, item["text"], item["voice"], speaker_voices=item["speakers"])
+            for item in items
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached = cache.get_audio(cache_key) if cache is not None else None
+            if cached is not None:
+                record_cache_hit("GeminiTextToSpeechBatchJob", model)
+                results[index] = cached[:2]
+            else:
+                pending.append(index)
+
+        status = f"All {len(items)} item(s) served from cache"
+        if pending:
+            client = get_client(api_key)
+
+            # Items that cannot fit a request fail on their own instead of failing the job
+            preflight = get_preflight()
+            fitting = []
+            for index in pending:
+                try:
+                    preflight.check_text(model, [items[index]["text"]], client, "text")
+                    fitting.append(index)
+                except ValueError as e:
+                    errors[index] = str(e)
+
+            status = "Nothing submitted: every uncached item failed the pre-flight check"
+            if fitting:
+                keyed_requests = [
+                    (f"item-{index}", speech_request(items[index]["text"], items[index]["voice"],
+                                                     items[index]["speakers"]))
+                    for index in fitting
+                ]
+                manifest, job, status = run_batch_job(client, "tts", model, keyed_requests, wait_minutes)
+
+                if manifest["state"] in SUCCEEDED_STATES:
+                    manager = get_batch_job_manager()
+                    for position, response, error in manager.results(client, manifest, job):
+                        index = fitting[position]
+                        if not error:
+                            try:
+                                waveform, sample_rate = response_waveform(response)
+                            except ValueError as e:
+                                error = str(e)
+                        errors[index] = error
+                        if error:
+                            continue
+                        results[index] = (waveform, sample_rate)
+                        if cache is not None:
+                            cache.put_audio(cache_keys[index], waveform, sample_rate,
+                                            extra={"report": f"Collected from batch job {manifest['job_name']}"})
+                    manager.cleanup(client, manifest)
+                else:
+                    for index in fitting:
+                        errors[index] = unfinished_error(manifest)
+
+        succeeded = [result for result in results if result is not None]
+        sample_rates = {sample_rate for _, sample_rate in succeeded}
+        if len(sample_rates) > 1:
+            raise ValueError(f"Items came back at different sample rates: {sorted(sample_rates)}")
+        # Gemini speech is 24 kHz; an unfinished job still returns a batch of empty clips
+        sample_rate = succeeded[0][1] if succeeded else 24000
+
+        failed = sum(1 for error in errors if error)
+        if failed:
+            print(f"Gemini Text To Speech Batch Job: {failed} of {len(items)} items have no audio")
+
+        # Items without audio stay in the batch as empty clips so indices line up with the input
+        waveform, lengths = pad_waveforms([
+            result[0] if result is not None else torch.zeros(1, 0) for result in results
+        ])
+        audio_dict = {"waveform": waveform, "sample_rate": sample_rate}
+        return (audio_dict, lengths, errors, status)
+
+
+# Node class mappings for ComfyUI
+NODE_CLASS_MAPPINGS = {
+    "GeminiChatBatchJob": GeminiChatBatchJob,
+    "GeminiTextToSpeechBatchJob": GeminiTextToSpeechBatchJob
+}
+
+# Display name mappings
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "GeminiChatBatchJob": "Gemini Chat Batch Job",
+    "GeminiTextToSpeechBatchJob": "Gemini Text To Speech Batch Job"
+}
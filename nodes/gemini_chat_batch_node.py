@@ -0,0 +1,257 @@
+import asyncio
+import json
+from .async_utils import run_coroutine
+from .context_cache import DEFAULT_TTL_SECONDS, get_context_cache_manager
+from .gemini_chat_node import (
+    CHAT_MODELS, GeminiChat, build_chat_request, chat_error_message, is_cached_content_error, resolve_context_cache
+)
+from .gemini_client import get_client
+from .metrics import add_bytes, metrics_enabled, phase, record_cache_hit, record_usage, track_call
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .rate_limiter import estimate_text_tokens, get_scheduler
+from .response_cache import get_response_cache, make_cache_key
+
+
+# Marker for items that failed only because the context cache disappeared
+CACHE_EXPIRED = object()
+
+
+class GeminiChatBatch(GeminiNodeExecution):
+    """
+    A ComfyUI node for running many prompts through Google's Gemini API concurrently
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key"
+                }),
+                "model": (CHAT_MODELS, {
+                    "default": CHAT_MODELS[0],
+                    "tooltip": "Gemini model to use for chat"
+                }),
+                "prompts": ("STRING", {
+                    "multiline": True,
+                    "default": "Hello, how are you?\nWhat can you do?",
+                    "tooltip": "Prompts to send, one per line or one JSON value per line"
+                }),
+                "input_format": (["lines", "jsonl"], {
+                    "default": "lines",
+                    "tooltip": "lines: every non-empty line is a prompt. jsonl: every line is a JSON string or an object with a \"prompt\" field"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 8,
+                    "min": 1,
+                    "max": 64,
+                    "tooltip": "Maximum number of requests in flight at the same time"
+                })
+            },
+            "optional": {
+                "system_prompt": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Optional system prompt applied to every prompt"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored responses; shared with the Gemini Chat node"
+                }),
+                "reference_document": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Optional long reference material sent ahead of every prompt"
+                }),
+                "context_cache": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Upload the system prompt and reference document once as a Gemini context cache shared by every prompt"
+                }),
+                "cache_ttl_minutes": ("INT", {
+                    "default": DEFAULT_TTL_SECONDS // 60,
+                    "min": 5,
+                    "max": 1440,
+                    "tooltip": "How long the Gemini context cache stays alive; it is extended when reused close to expiry"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("responses", "errors", "results_jsonl")
+    OUTPUT_IS_LIST = (True, True, False)
+    EXECUTE = "chat_batch"
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "text"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node
+        cls.prefetch(kwargs)
+
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return make_cache_key("GeminiChatBatch", kwargs.get("model"), {
+            "prompts": kwargs.get("prompts", ""),
+            "input_format": kwargs.get("input_format", "lines"),
+            "system_prompt": (kwargs.get("system_prompt") or "").strip(),
+            "reference_document": kwargs.get("reference_document") or "",
+        })
+
+    def parse_prompts(self, prompts, input_format):
+        """Split the prompts input into a list of prompt strings"""
+        lines = [line.strip() for line in prompts.splitlines() if line.strip()]
+        if input_format != "jsonl":
+            return lines
+
+        parsed = []
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                value = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {line_number} is not valid JSON: {str(e)}")
+            if isinstance(value, dict):
+                value = value.get("prompt")
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"Line {line_number} must be a JSON string or an object with a \"prompt\" field")
+            parsed.append(value)
+        return parsed
+
+    async def run_prompts(self, client, model, prompts, system_prompt, max_concurrency,
+                          reference_document="", cached_content=None, api_key=""):
+        """Send prompts through the async client with bounded concurrency, keeping input order"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        scheduler = get_scheduler()
+        prefix_tokens = 0 if cached_content else estimate_text_tokens(system_prompt, reference_document)
+
+        async def run_one(prompt):
+            async with semaphore:
+                try:
+                    # Each prompt is recorded as its own call when metrics are enabled
+                    with track_call("GeminiChatBatch", model):
+                        contents, config = build_chat_request(prompt, system_prompt, reference_document, cached_content)
+
+                        async def generate():
+                            with phase("request"):
+                                return await client.aio.models.generate_content(
+                                    model=model,
+                                    contents=contents,
+                                    config=config,
+                                )
+
+                        # The shared scheduler paces requests and retries quota errors
+                        response = await scheduler.call_async(
+                            api_key, model, generate,
+                            estimated_tokens=prefix_tokens + estimate_text_tokens(prompt),
+                        )
+                        record_usage(response.usage_metadata)
+                        if not response.text:
+                            raise ValueError("Received empty response from Gemini API")
+                        if metrics_enabled():
+                            add_bytes(sent=len(prompt.encode("utf-8")), received=len(response.text.encode("utf-8")))
+                        return response.text.strip(), ""
+                except Exception as e:
+                    # One failed item must not abort the rest of the batch
+                    if cached_content and is_cached_content_error(str(e)):
+                        return "", CACHE_EXPIRED
+                    return "", chat_error_message(str(e), model)
+
+        return await asyncio.gather(*(run_one(prompt) for prompt in prompts))
+
+    def chat_batch(self, api_key, model, prompts, input_format, max_concurrency, system_prompt="", use_cache=True,
+                   reference_document="", context_cache=False, cache_ttl_minutes=DEFAULT_TTL_SECONDS // 60):
+        """Run every prompt concurrently and return the responses in input order"""
+        prompt_list = self.parse_prompts(prompts, input_format)
+        if not prompt_list:
+            raise ValueError("No prompts provided")
+
+        responses = [""] * len(prompt_list)
+        errors = [""] * len(prompt_list)
+
+        # Answer what we can from the response cache shared with Gemini Chat
+        cache = get_response_cache() if use_cache else None
+        cache_keys = [
+            GeminiChat.cache_key(model, prompt, system_prompt, reference_document) for prompt in prompt_list
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached_text = cache.get_text(cache_key) if cache is not None else None
+            if cached_text is not None:
+                record_cache_hit("GeminiChatBatch", model)
+                responses[index] = cached_text
+            else:
+                pending.append(index)
+
+        if pending:
+            try:
+                client = get_client(api_key)
+            except Exception as e:
+                raise ValueError(chat_error_message(str(e), model))
+
+            # Fail fast on a prefix that cannot fit; prompts that push a request over the limit fail on their own
+            preflight = get_preflight()
+            preflight.check_text(
+                model, [system_prompt, reference_document], client, "system prompt and reference document"
+            )
+            fitting = []
+            for index in pending:
+                try:
+                    preflight.check_text(model, [system_prompt, reference_document, prompt_list[index]], client)
+                    fitting.append(index)
+                except ValueError as e:
+                    errors[index] = str(e)
+            pending = fitting
+
+        if pending:
+            # One context cache entry serves every prompt in the batch
+            cached_content = None
+            if context_cache:
+                cached_content = resolve_context_cache(
+                    client, api_key, model, system_prompt, reference_document, cache_ttl_minutes
+                )
+
+            results = run_coroutine(self.run_prompts(
+                client, model, [prompt_list[i] for i in pending], system_prompt, max_concurrency,
+                reference_document, cached_content, api_key
+            ))
+
+            # The context cache expired server-side; retry the affected prompts inline
+            expired = [i for i, (_, error) in enumerate(results) if error is CACHE_EXPIRED]
+            if expired:
+                get_context_cache_manager().invalidate(cached_content)
+                retried = run_coroutine(self.run_prompts(
+                    client, model, [prompt_list[pending[i]] for i in expired], system_prompt, max_concurrency,
+                    reference_document, api_key=api_key
+                ))
+                for i, result in zip(expired, retried):
+                    results[i] = result
+
+            for index, (response_text, error) in zip(pending, results):
+                responses[index] = response_text
+                errors[index] = error
+                if cache is not None and response_text:
+                    cache.put_text(cache_keys[index], response_text)
+
+        failed = sum(1 for error in errors if error)
+        if failed:
+            print(f"Gemini Chat Batch: {failed} of {len(prompt_list)} prompts failed")
+
+        results_jsonl = "\n".join(
+            json.dumps({"index": index, "response": response_text, "error": error}, ensure_ascii=False)
+            for index, (response_text, error) in enumerate(zip(responses, errors))
+        )
+        return (responses, errors, results_jsonl)
+
+
+# Node class mappings for ComfyUI
+NODE_CLASS_MAPPINGS = {
+    "GeminiChatBatch": GeminiChatBatch
+}
+
+# Display name mappings
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "GeminiChatBatch": "Gemini Chat Batch"
+}
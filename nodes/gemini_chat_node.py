@@ -1,9 +1,183 @@
+import asyncio
 import os
-from google import genai
-from google.genai import types
+import time
+from .async_utils import await_on_background_loop
+from .context_cache import DEFAULT_TTL_SECONDS, get_context_cache_manager
+from .gemini_client import get_client, make_media_parts
+from .image_utils import (
+    DEFAULT_IMAGE_QUALITY, DEFAULT_MAX_SIDE, IMAGE_UPLOAD_FORMATS, encode_images, estimate_batch_tokens
+)
+from .metrics import add_bytes, mark_first_chunk, metrics_enabled, phase, record_cache_hit, record_usage, track_call
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .rate_limiter import estimate_text_tokens, get_scheduler
+from .response_cache import get_response_cache, make_cache_key
+from .single_flight import get_single_flight, uncached_key
 
 
-class GeminiChat:
+# Models offered by the chat nodes
+CHAT_MODELS = ["gemini-2.5-pro-preview-05-06"]
+
+
+def build_chat_request(prompt, system_prompt="", reference_document="", cached_content=None, media_parts=None):
+    """Build the contents list and generation config for one chat prompt"""
+    from google.genai import types
+    
+    # Reference material goes ahead of the prompt unless it already lives in a context cache
+    parts = []
+    if not cached_content and reference_document and reference_document.strip():
+        parts.append(types.Part.from_text(text=reference_document))
+    
+    # Images come right before the prompt that asks about them
+    parts.extend(media_parts or [])
+    parts.append(types.Part.from_text(text=prompt))
+    
+    # Prepare the contents list
+    contents = [
+        types.Content(
+            role="user",
+            parts=parts,
+        )
+    ]
+    
+    # The system prompt is sent as a real system instruction, unless it is
+    # already part of the cached content
+    system_instruction = None
+    if not cached_content and system_prompt and system_prompt.strip():
+        system_instruction = system_prompt.strip()
+    
+    # Configure the generation settings
+    generate_content_config = types.GenerateContentConfig(
+        response_mime_type="text/plain",
+        system_instruction=system_instruction,
+        cached_content=cached_content,
+    )
+    
+    return contents, generate_content_config
+
+
+def prepare_image_parts(client, api_key, images, max_image_side=DEFAULT_MAX_SIDE, image_format="jpeg",
+                        image_quality=DEFAULT_IMAGE_QUALITY):
+    """Encode a ComfyUI image batch and return its content parts, one per frame, and the bytes sent"""
+    if images is None:
+        return [], 0
+    with phase("encode"):
+        encoded, mime_type = encode_images(images, max_image_side, image_format, image_quality)
+    with phase("upload"):
+        return make_media_parts(client, api_key, encoded, mime_type)
+
+
+def resolve_context_cache(client, api_key, model, system_prompt, reference_document, ttl_minutes):
+    """Return the name of a live context cache for the shared prefix, or None to send it inline"""
+    if not ((system_prompt and system_prompt.strip()) or (reference_document and reference_document.strip())):
+        return None
+    try:
+        return get_context_cache_manager().get_or_create(
+            client, api_key, model, system_prompt, reference_document, ttl_minutes * 60
+        )
+    except Exception as e:
+        # e.g. the prefix is below the model's minimum cacheable size
+        print(f"Context caching unavailable, sending the system prompt inline: {str(e)}")
+        return None
+
+
+def is_cached_content_error(error_msg):
+    """True when a request failed because its cached content no longer exists"""
+    error_msg = error_msg.lower()
+    return "cachedcontent" in error_msg.replace(" ", "") or "cached content" in error_msg
+
+
+def chat_error_message(error_msg, model):
+    """Turn a Gemini API error into an actionable message"""
+    # Handle specific error cases
+    if "API key not valid" in error_msg:
+        return "Invalid API Key. Please check your API key."
+    elif "model not found" in error_msg.lower():
+        return f"The model '{model}' may not be available. Please check the model name."
+    elif "RESOURCE_EXHAUSTED" in error_msg:
+        return f"Gemini API quota exceeded for '{model}' after retrying. Lower the request rate or try again later."
+    else:
+        return f"Gemini API chat request failed: {error_msg}"
+
+
+class ChatRequest:
+    """
+    One chat request, checked and ready to send; shared by the sync and async code paths.
+    
+    Building it runs the pre-flight check, encodes and uploads the images and
+    resolves the context cache, all of which block. ``payload`` is the
+    contents and generation config to send.
+    """
+    
+    def __init__(self, api_key, model, prompt, system_prompt="", reference_document="", context_cache=False,
+                 cache_ttl_minutes=DEFAULT_TTL_SECONDS // 60, images=None, max_image_side=DEFAULT_MAX_SIDE,
+                 image_format="jpeg", image_quality=DEFAULT_IMAGE_QUALITY):
+        self.prompt = prompt
+        self.system_prompt = system_prompt
+        self.reference_document = reference_document
+        
+        # Get the shared Gemini client for this API key
+        self.client = get_client(api_key)
+        
+        # Fail fast when the request cannot fit the model's input
+        self.image_tokens = estimate_batch_tokens(images, max_image_side)
+        get_preflight().check_text(
+            model, [system_prompt, reference_document, prompt], self.client, "chat request", self.image_tokens
+        )
+        
+        # Encode the images; media uploaded before is not sent again
+        self.media_parts, media_bytes = prepare_image_parts(
+            self.client, api_key, images, max_image_side, image_format, image_quality
+        )
+        
+        # Reuse a Gemini context cache for the system prompt and reference document
+        self.cached_content = None
+        if context_cache:
+            with phase("context_cache"):
+                self.cached_content = resolve_context_cache(
+                    self.client, api_key, model, system_prompt, reference_document, cache_ttl_minutes
+                )
+        
+        # Build the request contents and generation settings
+        self.payload = build_chat_request(
+            prompt, system_prompt, reference_document, self.cached_content, self.media_parts
+        )
+        if metrics_enabled():
+            request_texts = (prompt, system_prompt, reference_document)
+            add_bytes(sent=sum(len(text.encode("utf-8")) for text in request_texts if text) + media_bytes)
+    
+    @property
+    def estimated_tokens(self):
+        """Input tokens charged against the rate limits; a cached prefix is not sent again"""
+        if self.cached_content:
+            return estimate_text_tokens(self.prompt) + self.image_tokens
+        return estimate_text_tokens(self.prompt, self.system_prompt, self.reference_document) + self.image_tokens
+    
+    def fall_back_inline(self, error):
+        """
+        Switch to sending the prefix inline when ``error`` says the context cache expired server-side.
+        
+        Returns True when the request should be sent again.
+        """
+        if not self.cached_content or not is_cached_content_error(str(error)):
+            return False
+        get_context_cache_manager().invalidate(self.cached_content)
+        self.cached_content = None
+        self.payload = build_chat_request(
+            self.prompt, self.system_prompt, self.reference_document, media_parts=self.media_parts
+        )
+        return True
+    
+    def finish(self, response_text):
+        """Check the streamed response and return it as the node's output"""
+        if not response_text:
+            raise ValueError("Received empty response from Gemini API")
+        if metrics_enabled():
+            add_bytes(received=len(response_text.encode("utf-8")))
+        return (response_text.strip(),)
+
+
+class GeminiChat(GeminiNodeExecution):
     """
     A ComfyUI node for chatting with Google's Gemini API
     """
@@ -17,7 +191,7 @@ class GeminiChat:
                     "default": "",
                     "tooltip": "Your Gemini API key"
                 }),
-                "model": (["gemini-2.5-pro-preview-05-06"], {
+                "model": (CHAT_MODELS, {
                     "default": "gemini-2.5-pro-preview-05-06",
                     "tooltip": "Gemini model to use for chat"
                 }),
@@ -32,67 +206,273 @@ class GeminiChat:
                     "multiline": True,
                     "default": "",
                     "tooltip": "Optional system prompt for fine-tuning the AI's behavior"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored responses for identical model/prompt/system prompt combinations"
+                }),
+                "reference_document": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Optional long reference material sent ahead of the prompt"
+                }),
+                "context_cache": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Upload the system prompt and reference document once as a Gemini context cache and reuse it across runs"
+                }),
+                "cache_ttl_minutes": ("INT", {
+                    "default": DEFAULT_TTL_SECONDS // 60,
+                    "min": 5,
+                    "max": 1440,
+                    "tooltip": "How long the Gemini context cache stays alive; it is extended when reused close to expiry"
+                }),
+                "images": ("IMAGE", {
+                    "tooltip": "Optional image, or a batch of video frames, sent with the prompt in batch order"
+                }),
+                "max_image_side": ("INT", {
+                    "default": DEFAULT_MAX_SIDE,
+                    "min": 64,
+                    "max": 4096,
+                    "step": 64,
+                    "tooltip": "Images are downscaled so their longest side fits; Gemini bills images per 768px tile"
+                }),
+                "image_format": (list(IMAGE_UPLOAD_FORMATS), {
+                    "default": "jpeg",
+                    "tooltip": "Encoding used to send the images"
+                }),
+                "image_quality": ("INT", {
+                    "default": DEFAULT_IMAGE_QUALITY,
+                    "min": 1,
+                    "max": 100,
+                    "tooltip": "JPEG/WebP encoder quality"
                 })
             }
         }
     
     RETURN_TYPES = ("STRING",)
     RETURN_NAMES = ("response",)
-    FUNCTION = "chat_with_gemini"
+    EXECUTE = "chat_with_gemini"
+    FUNCTION = NODE_FUNCTION
     CATEGORY = "text"
     
-    def chat_with_gemini(self, api_key, model, prompt, system_prompt=""):
-        """Chat with Gemini API and get text response"""
-        try:
-            # Initialize the Gemini client
-            client = genai.Client(api_key=api_key)
-            
-            # Prepare the user message, incorporating system prompt if provided
-            user_message = prompt
-            if system_prompt and system_prompt.strip():
-                user_message = f"{system_prompt.strip()}\n\nUser: {prompt}"
-            
-            # Prepare the contents list
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_text(text=user_message),
-                    ],
-                )
-            ]
-            
-            # Configure the generation settings
-            generate_content_config = types.GenerateContentConfig(
-                response_mime_type="text/plain",
-            )
-            
-            # Generate the response
-            response_text = ""
+    @classmethod
+    def cache_key(cls, model=None, prompt="", system_prompt="", reference_document="", images=None,
+                  max_image_side=DEFAULT_MAX_SIDE, image_format="jpeg", image_quality=DEFAULT_IMAGE_QUALITY, **kwargs):
+        """Hash of everything that determines the response"""
+        inputs = {
+            "prompt": prompt,
+            "system_prompt": (system_prompt or "").strip(),
+        }
+        if reference_document and reference_document.strip():
+            inputs["reference_document"] = reference_document
+        
+        # Images linked from a node that has not run yet are None in IS_CHANGED
+        tensors = {}
+        if images is not None:
+            inputs.update({"max_image_side": max_image_side, "image_format": image_format,
+                           "image_quality": image_quality})
+            tensors["images"] = images
+        return make_cache_key("GeminiChat", model, inputs, tensors)
+    
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node
+        cls.prefetch(kwargs)
+    
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return cls.cache_key(**kwargs)
+    
+    def stream_response(self, client, model, contents, generate_content_config):
+        """Stream one response and return the full text"""
+        response_text = ""
+        usage_metadata = None
+        started = time.perf_counter()
+        with phase("request"):
             for chunk in client.models.generate_content_stream(
                 model=model,
                 contents=contents,
                 config=generate_content_config,
             ):
                 if chunk.text:
+                    mark_first_chunk(started)
+                    response_text += chunk.text
+                # Token counts arrive with the stream; the last report covers the whole response
+                usage_metadata = chunk.usage_metadata or usage_metadata
+        record_usage(usage_metadata)
+        return response_text
+    
+    async def stream_response_async(self, client, model, contents, generate_content_config):
+        """Stream one response through the async client and return the full text"""
+        response_text = ""
+        usage_metadata = None
+        started = time.perf_counter()
+        with phase("request"):
+            async for chunk in await client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if chunk.text:
+                    mark_first_chunk(started)
                     response_text += chunk.text
+                usage_metadata = chunk.usage_metadata or usage_metadata
+        record_usage(usage_metadata)
+        return response_text
+    
+    async def run_async(self, **kwargs):
+        """Chat through client.aio on the shared event loop, so other nodes run meanwhile"""
+        return await await_on_background_loop(self.chat_with_gemini_async(**kwargs))
+    
+    def cached_response(self, model, prompt, system_prompt, reference_document, images, max_image_side,
+                        image_format, image_quality):
+        """Return the response cache, this request's key and its stored response, if any"""
+        cache = get_response_cache()
+        cache_key = self.cache_key(
+            model, prompt, system_prompt, reference_document, images, max_image_side, image_format, image_quality
+        )
+        cached_text = cache.get_text(cache_key)
+        if cached_text is not None:
+            record_cache_hit("GeminiChat", model)
+        return cache, cache_key, cached_text
+    
+    async def chat_with_gemini_async(self, api_key, model, prompt, system_prompt="", use_cache=True,
+                                     reference_document="", context_cache=False,
+                                     cache_ttl_minutes=DEFAULT_TTL_SECONDS // 60, images=None,
+                                     max_image_side=DEFAULT_MAX_SIDE, image_format="jpeg",
+                                     image_quality=DEFAULT_IMAGE_QUALITY):
+        """Async counterpart of chat_with_gemini built on client.aio"""
+        if use_cache:
+            # Serve identical requests from the response cache
+            cache, cache_key, cached_text = self.cached_response(
+                model, prompt, system_prompt, reference_document, images, max_image_side, image_format, image_quality
+            )
+            if cached_text is not None:
+                return (cached_text,)
             
-            if not response_text:
-                raise ValueError("Received empty response from Gemini API")
+            # Identical requests with the same API key already in flight share one API call;
+            # the caller that sends it stores the response
+            async def request():
+                result = await self.send_chat_async(
+                    api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                    images, max_image_side, image_format, image_quality
+                )
+                cache.put_text(cache_key, result[0])
+                return result
             
-            return (response_text.strip(),)
+            return await get_single_flight().run_async("GeminiChat", model, api_key, cache_key, request)
+        
+        # Without the cache, identical requests in flight are still shared, but their response is not stored
+        cache_key = self.cache_key(
+            model, prompt, system_prompt, reference_document, images, max_image_side, image_format, image_quality
+        )
+        return await get_single_flight().run_async(
+            "GeminiChat", model, api_key, uncached_key(cache_key), lambda: self.send_chat_async(
+                api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                images, max_image_side, image_format, image_quality
+            )
+        )
+    
+    async def send_chat_async(self, api_key, model, prompt, system_prompt, reference_document, context_cache,
+                              cache_ttl_minutes, images, max_image_side, image_format, image_quality):
+        """Send one chat request through client.aio, bypassing the response cache"""
+        try:
+            # Time each phase of the request when metrics are enabled
+            with track_call("GeminiChat", model):
+                # Checks, image encoding and context caching block, so they run off the event loop
+                request = await asyncio.to_thread(
+                    ChatRequest, api_key, model, prompt, system_prompt, reference_document, context_cache,
+                    cache_ttl_minutes, images, max_image_side, image_format, image_quality
+                )
+                
+                # Generate the response within the shared rate limits, retrying quota errors
+                scheduler = get_scheduler()
+                try:
+                    response_text = await scheduler.call_async(
+                        api_key, model, lambda: self.stream_response_async(request.client, model, *request.payload),
+                        estimated_tokens=request.estimated_tokens,
+                    )
+                except Exception as e:
+                    if not request.fall_back_inline(e):
+                        raise
+                    response_text = await scheduler.call_async(
+                        api_key, model, lambda: self.stream_response_async(request.client, model, *request.payload),
+                        estimated_tokens=request.estimated_tokens,
+                    )
+                return request.finish(response_text)
             
         except Exception as e:
             error_msg = str(e)
             print(f"Error chatting with Gemini: {error_msg}")
+            raise ValueError(chat_error_message(error_msg, model))
+    
+    def chat_with_gemini(self, api_key, model, prompt, system_prompt="", use_cache=True, reference_document="",
+                         context_cache=False, cache_ttl_minutes=DEFAULT_TTL_SECONDS // 60, images=None,
+                         max_image_side=DEFAULT_MAX_SIDE, image_format="jpeg", image_quality=DEFAULT_IMAGE_QUALITY):
+        """Chat with Gemini API and get text response"""
+        if use_cache:
+            # Serve identical requests from the response cache
+            cache, cache_key, cached_text = self.cached_response(
+                model, prompt, system_prompt, reference_document, images, max_image_side, image_format, image_quality
+            )
+            if cached_text is not None:
+                return (cached_text,)
             
-            # Handle specific error cases
-            if "API key not valid" in error_msg:
-                raise ValueError("Invalid API Key. Please check your API key.")
-            elif "model not found" in error_msg.lower():
-                raise ValueError(f"The model '{model}' may not be available. Please check the model name.")
-            else:
-                raise ValueError(f"Gemini API chat request failed: {error_msg}")
+            # Identical requests with the same API key already in flight share one API call;
+            # the caller that sends it stores the response
+            def request():
+                result = self.send_chat(
+                    api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                    images, max_image_side, image_format, image_quality
+                )
+                cache.put_text(cache_key, result[0])
+                return result
+            
+            return get_single_flight().run("GeminiChat", model, api_key, cache_key, request)
+        
+        # Without the cache, identical requests in flight are still shared, but their response is not stored
+        cache_key = self.cache_key(
+            model, prompt, system_prompt, reference_document, images, max_image_side, image_format, image_quality
+        )
+        return get_single_flight().run(
+            "GeminiChat", model, api_key, uncached_key(cache_key), lambda: self.send_chat(
+                api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                images, max_image_side, image_format, image_quality
+            )
+        )
+    
+    def send_chat(self, api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                  images, max_image_side, image_format, image_quality):
+        """Send one chat request, bypassing the response cache"""
+        try:
+            # Time each phase of the request when metrics are enabled
+            with track_call("GeminiChat", model):
+                request = ChatRequest(
+                    api_key, model, prompt, system_prompt, reference_document, context_cache, cache_ttl_minutes,
+                    images, max_image_side, image_format, image_quality
+                )
+                
+                # Generate the response within the shared rate limits, retrying quota errors
+                scheduler = get_scheduler()
+                try:
+                    response_text = scheduler.call(
+                        api_key, model, lambda: self.stream_response(request.client, model, *request.payload),
+                        estimated_tokens=request.estimated_tokens,
+                    )
+                except Exception as e:
+                    if not request.fall_back_inline(e):
+                        raise
+                    response_text = scheduler.call(
+                        api_key, model, lambda: self.stream_response(request.client, model, *request.payload),
+                        estimated_tokens=request.estimated_tokens,
+                    )
+                return request.finish(response_text)
+            
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Error chatting with Gemini: {error_msg}")
+            raise ValueError(chat_error_message(error_msg, model))
 
 
 # Node class mappings for ComfyUI
@@ -0,0 +1,360 @@
+"""
+Shared Gemini client registry
+
+Creating a ``genai.Client`` sets up a fresh HTTP connection pool, so building
+one per queue item pays a new TLS handshake every time. This module keeps one
+client per (API key, HTTP options) pair for the whole process and hands the
+same instance to every node. It also holds the helpers that send large media
+through the Files API instead of inline, and remembers uploads by content hash
+so the same media is not uploaded twice.
+
+The SDK is imported on first use, not when the nodes are registered.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+# Keep-alive pool settings passed to the underlying sync httpx client
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY = 120.0
+
+# Clients not used for this many seconds are dropped from the registry
+DEFAULT_IDLE_TIMEOUT = 900.0
+
+# Inline media above this size goes through the Files API instead. Gemini caps
+# inline requests at 20 MB, and base64 grows the payload by a third.
+INLINE_UPLOAD_THRESHOLD = 14 * 1024 * 1024
+
+# How long to wait for an uploaded file to finish server-side processing
+FILE_PROCESSING_TIMEOUT = 300.0
+
+# The Files API keeps uploads for 48 hours; reuse them for a little less than that
+UPLOAD_REUSE_SECONDS = 46 * 3600
+
+# Media at least this large is uploaded once and reused rather than sent inline every time
+REUSABLE_UPLOAD_MIN_BYTES = 1024 * 1024
+
+# Smaller media is uploaded for reuse once it has been sent a second time; below
+# this size an upload round trip costs more than sending the bytes again
+REPEATED_UPLOAD_MIN_BYTES = 64 * 1024
+
+# How many hashes of media sent inline are remembered to spot repeats
+MAX_SEEN_MEDIA = 4096
+
+# Point every client at another endpoint, e.g. the local stand-in used by the benchmarks
+BASE_URL_ENV = "GEMINI_HUB_BASE_URL"
+
+
+class GeminiClientRegistry:
+    """
+    Process-wide, thread-safe registry of pooled Gemini clients.
+
+    Clients are keyed by API key and HTTP options. Entries that stay unused for
+    longer than ``idle_timeout`` seconds are evicted on the next lookup.
+    Evicted clients are only dropped from the registry, never closed here, so a
+    request still streaming on an evicted client is not cut off; its
+    connection pool is released once the last reference goes away.
+    """
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def _make_key(self, api_key, http_options):
+        """Build a stable registry key without keeping the raw API key around."""
+        options_json = json.dumps(http_options or {}, sort_keys=True, default=str)
+        digest = hashlib.sha256()
+        digest.update(api_key.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(options_json.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _build_http_options(self, http_options):
+        """Merge caller options with the keep-alive pool defaults."""
+        import httpx
+        from google.genai import types
+
+        options = dict(http_options or {})
+        limits = httpx.Limits(
+            max_connections=DEFAULT_MAX_CONNECTIONS,
+            max_keepalive_connections=DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+        )
+        options.setdefault("client_args", {"limits": limits})
+        return types.HttpOptions(**options)
+
+    def _evict_idle(self, now):
+        """Drop clients that have been idle for longer than the timeout. Caller holds the lock."""
+        expired = [
+            key for key, (_, last_used) in self._clients.items()
+            if now - last_used > self.idle_timeout
+        ]
+        for key in expired:
+            del self._clients[key]
+        self._stats["evicted"] += len(expired)
+
+    def get_client(self, api_key, http_options=None):
+        """Return a shared client for the given API key, creating it on first use."""
+        if not api_key or not api_key.strip():
+            raise ValueError("API key is required. Please provide your Gemini API key.")
+
+        base_url = os.environ.get(BASE_URL_ENV)
+        if base_url and not (http_options or {}).get("base_url"):
+            http_options = dict(http_options or {}, base_url=base_url)
+
+        key = self._make_key(api_key, http_options)
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now)
+
+            entry = self._clients.get(key)
+            if entry is not None:
+                client = entry[0]
+                self._stats["reused"] += 1
+            else:
+                from google import genai
+                client = genai.Client(
+                    api_key=api_key,
+                    http_options=self._build_http_options(http_options),
+                )
+                self._stats["created"] += 1
+
+            self._clients[key] = (client, now)
+            return client
+
+    def stats(self):
+        """Return a snapshot of the created/reused/evicted counters."""
+        with self._lock:
+            return dict(self._stats, active=len(self._clients))
+
+    def clear(self):
+        """Forget every pooled client."""
+        with self._lock:
+            self._clients.clear()
+
+
+# Default registry shared by all nodes in this package
+_registry = GeminiClientRegistry()
+
+
+def get_client(api_key, http_options=None):
+    """Return the shared Gemini client for ``api_key``."""
+    return _registry.get_client(api_key, http_options)
+
+
+def get_client_stats():
+    """Return how many clients were created versus reused."""
+    return _registry.stats()
+
+
+def upload_media(client, data, mime_type, poll_interval=1.0, timeout=FILE_PROCESSING_TIMEOUT):
+    """Upload in-memory media through the Files API and wait until it is ready to use."""
+    from google.genai import types
+
+    uploaded = client.files.upload(
+        file=io.BytesIO(data),
+        config=types.UploadFileConfig(mime_type=mime_type),
+    )
+
+    deadline = time.monotonic() + timeout
+    while _file_state(uploaded) == "PROCESSING":
+        if time.monotonic() > deadline:
+            raise ValueError(f"Timed out waiting for uploaded file {uploaded.name} to be processed")
+        time.sleep(poll_interval)
+        uploaded = client.files.get(name=uploaded.name)
+
+    if _file_state(uploaded) == "FAILED":
+        raise ValueError(f"Gemini could not process uploaded file {uploaded.name}")
+    return uploaded
+
+
+def delete_uploaded_file(client, uploaded):
+    """Best-effort removal of a file uploaded with ``upload_media``."""
+    if uploaded is None:
+        return
+    try:
+        client.files.delete(name=uploaded.name)
+    except Exception as e:
+        print(f"Could not delete uploaded file {uploaded.name}: {str(e)}")
+
+
+def make_media_part(client, data, mime_type, inline_threshold=INLINE_UPLOAD_THRESHOLD):
+    """
+    Build a content part for binary media, inline or via the Files API.
+
+    Returns ``(part, uploaded_file)``; ``uploaded_file`` is None for inline
+    parts and should be passed to ``delete_uploaded_file`` once the request
+    has completed.
+    """
+    from google.genai import types
+
+    if len(data) <= inline_threshold:
+        part = types.Part(inline_data=types.Blob(mime_type=mime_type, data=data))
+        return part, None
+
+    uploaded = upload_media(client, data, mime_type)
+    part = types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type)
+    return part, uploaded
+
+
+class UploadedMediaRegistry:
+    """
+    Remembers media uploaded through the Files API by content hash; thread-safe.
+
+    Uploads are keyed by API key and a SHA-256 of the bytes, so sending the
+    same reference image again, in this execution or a later one, points at
+    the file already uploaded instead of sending it twice. Concurrent
+    callers with the same bytes share one upload. Entries are forgotten
+    shortly before the Files API deletes the file. The hashes of media sent
+    inline are remembered too, so a blob that comes back can be uploaded
+    for reuse.
+    """
+
+    def __init__(self, max_age=UPLOAD_REUSE_SECONDS, clock=time.monotonic, max_seen=MAX_SEEN_MEDIA):
+        self.max_age = max_age
+        self.max_seen = max_seen
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._uploads = {}
+        self._pending = {}
+        self._seen = OrderedDict()
+        self._stats = {"uploaded": 0, "reused": 0, "expired": 0}
+
+    def _make_key(self, api_key, data):
+        digest = hashlib.sha256()
+        digest.update(hashlib.sha256(api_key.encode("utf-8")).digest())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _find(self, key):
+        """Return the live upload for ``key``, or None. Caller holds the lock."""
+        entry = self._uploads.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry[1] > self.max_age:
+            del self._uploads[key]
+            self._stats["expired"] += 1
+            return None
+        return entry[0]
+
+    def find(self, api_key, data):
+        """Return the live upload with the same bytes, or None."""
+        key = self._make_key(api_key, data)
+        with self._lock:
+            uploaded = self._find(key)
+            if uploaded is not None:
+                self._stats["reused"] += 1
+            return uploaded
+
+    def seen(self, api_key, data):
+        """Record that ``data`` was sent inline; return True if it had been sent before."""
+        key = self._make_key(api_key, data)
+        with self._lock:
+            if key in self._seen:
+                self._seen.move_to_end(key)
+                return True
+            self._seen[key] = None
+            while len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+            return False
+
+    def get_or_upload(self, client, api_key, data, mime_type):
+        """Return ``(uploaded, reused)``, uploading ``data`` only when no live or in-flight upload has the same bytes."""
+        key = self._make_key(api_key, data)
+        with self._lock:
+            uploaded = self._find(key)
+            if uploaded is not None:
+                self._stats["reused"] += 1
+                return uploaded, True
+            future = self._pending.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._pending[key] = future
+
+        if not leader:
+            uploaded = future.result()
+            with self._lock:
+                self._stats["reused"] += 1
+            return uploaded, True
+
+        try:
+            uploaded = upload_media(client, data, mime_type)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._uploads[key] = (uploaded, self._clock())
+            self._seen.pop(key, None)
+            self._pending.pop(key, None)
+            self._stats["uploaded"] += 1
+        future.set_result(uploaded)
+        return uploaded, False
+
+    def stats(self):
+        """Return how many uploads were made, reused and expired."""
+        with self._lock:
+            return dict(self._stats, live=len(self._uploads))
+
+
+# Uploads shared by all nodes in this package
+_uploads = UploadedMediaRegistry()
+
+
+def get_upload_stats():
+    """Return how many media uploads were made versus reused."""
+    return _uploads.stats()
+
+
+def make_media_parts(client, api_key, blobs, mime_type, inline_threshold=INLINE_UPLOAD_THRESHOLD):
+    """
+    Build content parts for several pieces of media sent in one request.
+
+    Media uploaded before is referenced by its file. Other blobs go inline,
+    in order, while the request stays under ``inline_threshold``. Blobs past
+    that, of at least ``REUSABLE_UPLOAD_MIN_BYTES``, or of at least
+    ``REPEATED_UPLOAD_MIN_BYTES`` that were already sent inline once, are
+    uploaded through the Files API once per distinct content. Uploaded files
+    are kept for reuse, not deleted. Returns ``(parts, sent_bytes)``, where
+    ``sent_bytes`` leaves out reused uploads.
+    """
+    from google.genai import types
+
+    parts = []
+    inline_bytes = 0
+    sent_bytes = 0
+    for data in blobs:
+        uploaded = _uploads.find(api_key, data)
+        if uploaded is not None:
+            parts.append(types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type))
+            continue
+        fits_inline = len(data) < REUSABLE_UPLOAD_MIN_BYTES and inline_bytes + len(data) <= inline_threshold
+        if fits_inline and (len(data) < REPEATED_UPLOAD_MIN_BYTES or not _uploads.seen(api_key, data)):
+            parts.append(types.Part(inline_data=types.Blob(mime_type=mime_type, data=data)))
+            inline_bytes += len(data)
+            sent_bytes += len(data)
+            continue
+        uploaded, reused = _uploads.get_or_upload(client, api_key, data, mime_type)
+        parts.append(types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type))
+        if not reused:
+            sent_bytes += len(data)
+    return parts, sent_bytes
+
+
+def _file_state(uploaded):
+    """Return the file state name whether the SDK hands back an enum or a string."""
+    state = getattr(uploaded, "state", None)
+    return getattr(state, "name", state)
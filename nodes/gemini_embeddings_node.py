@@ -0,0 +1,356 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .gemini_client import get_client
+from .metrics import add_bytes, bind_context, metrics_enabled, phase, record_cache_hit, track_call
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .rate_limiter import estimate_text_tokens, get_scheduler
+from .response_cache import make_cache_key
+from .vector_index import get_embedding_cache, get_vector_index, normalize_rows, text_key, top_k_cosine
+
+
+# Models offered by the embedding nodes
+EMBEDDING_MODELS = ["gemini-embedding-001"]
+
+# Task types the embedding model is tuned for
+EMBEDDING_TASK_TYPES = [
+    "RETRIEVAL_DOCUMENT",
+    "RETRIEVAL_QUERY",
+    "SEMANTIC_SIMILARITY",
+    "CLASSIFICATION",
+    "CLUSTERING",
+    "QUESTION_ANSWERING",
+    "FACT_VERIFICATION",
+    "CODE_RETRIEVAL_QUERY",
+]
+
+# Vector size requested by default; gemini-embedding-001 accepts 128 to 3072
+DEFAULT_DIMENSIONALITY = 768
+
+# Texts sent in one embed_content request
+MAX_TEXTS_PER_REQUEST = 100
+
+
+def parse_texts(texts):
+    """Every non-empty line is one text"""
+    return [line.strip() for line in (texts or "").splitlines() if line.strip()]
+
+
+def embed_texts(api_key, model, texts, task_type, dimensionality, use_cache=True, max_concurrency=4,
+                node="GeminiEmbeddings"):
+    """
+    Embed texts as unit-length vectors, answering from the embedding cache where possible.
+
+    Texts missing from the cache are sent ``MAX_TEXTS_PER_REQUEST`` at a time,
+    each distinct text once. Returns the ``[N, D]`` float32 vectors in input
+    order and the number of embed_content requests sent.
+    """
+    import numpy as np
+
+    cache = get_embedding_cache(model, dimensionality) if use_cache else None
+    keys = [text_key(task_type, text) for text in texts]
+    vectors = cache.get(keys) if cache is not None else [None] * len(texts)
+
+    # Each distinct text missing from the cache is embedded once
+    missing = {}
+    for index, (key, vector) in enumerate(zip(keys, vectors)):
+        if vector is None:
+            missing.setdefault(key, index)
+        else:
+            record_cache_hit(node, model)
+    missing = list(missing.values())
+    if not missing:
+        return np.stack(vectors), 0
+
+    from google.genai import types
+
+    client = get_client(api_key)
+    config = types.EmbedContentConfig(task_type=task_type, output_dimensionality=dimensionality)
+    scheduler = get_scheduler()
+
+    def embed_batch(batch):
+        batch_texts = [texts[index] for index in batch]
+        # Each request is recorded as its own call when metrics are enabled
+        with track_call(node, model):
+            def request():
+                with phase("request"):
+                    return client.models.embed_content(model=model, contents=batch_texts, config=config)
+
+            response = scheduler.call(api_key, model, request, estimated_tokens=estimate_text_tokens(*batch_texts))
+            embeddings = response.embeddings or []
+            if len(embeddings) != len(batch_texts):
+                raise ValueError(f"Expected {len(batch_texts)} embeddings, received {len(embeddings)}")
+            values = np.asarray([embedding.values for embedding in embeddings], dtype=np.float32)
+            if metrics_enabled():
+                add_bytes(sent=sum(len(text.encode("utf-8")) for text in batch_texts), received=values.nbytes)
+        return values
+
+    batches = [missing[start:start + MAX_TEXTS_PER_REQUEST]
+               for start in range(0, len(missing), MAX_TEXTS_PER_REQUEST)]
+    if len(batches) == 1 or max_concurrency <= 1:
+        results = [embed_batch(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches))) as executor:
+            results = list(executor.map(bind_context(embed_batch), batches))
+    embedded = normalize_rows(np.concatenate(results))
+
+    if cache is not None:
+        cache.add([keys[index] for index in missing], [texts[index] for index in missing], embedded)
+    by_key = {keys[index]: vector for index, vector in zip(missing, embedded)}
+    vectors = [vector if vector is not None else by_key[key] for key, vector in zip(keys, vectors)]
+    return np.stack(vectors), len(batches)
+
+
+class GeminiEmbeddings(GeminiNodeExecution):
+    """
+    A ComfyUI node for embedding texts with Google's Gemini API and indexing them locally
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key"
+                }),
+                "model": (EMBEDDING_MODELS, {
+                    "default": EMBEDDING_MODELS[0],
+                    "tooltip": "Gemini embedding model"
+                }),
+                "texts": ("STRING", {
+                    "multiline": True,
+                    "default": "A watercolor fox in a snowy forest\nA neon city street at night",
+                    "tooltip": "Texts to embed, one per line"
+                }),
+                "task_type": (EMBEDDING_TASK_TYPES, {
+                    "default": "RETRIEVAL_DOCUMENT",
+                    "tooltip": "What the vectors are for; use RETRIEVAL_DOCUMENT for texts you will search"
+                }),
+                "output_dimensionality": ("INT", {
+                    "default": DEFAULT_DIMENSIONALITY,
+                    "min": 128,
+                    "max": 3072,
+                    "tooltip": "Vector size; smaller vectors are cheaper to store and search"
+                })
+            },
+            "optional": {
+                "index_name": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Add the texts to this local vector index for Gemini Embedding Search; leave empty to skip"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored vectors for texts embedded before with the same model and settings"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 16,
+                    "tooltip": "Maximum number of embed_content requests in flight at the same time"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("GEMINI_EMBEDDINGS", "INT", "STRING")
+    RETURN_NAMES = ("embeddings", "index_size", "report")
+    EXECUTE = "embed"
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "text"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node
+        cls.prefetch(kwargs)
+
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return make_cache_key("GeminiEmbeddings", kwargs.get("model"), {
+            "texts": kwargs.get("texts", ""),
+            "task_type": kwargs.get("task_type", "RETRIEVAL_DOCUMENT"),
+            "output_dimensionality": kwargs.get("output_dimensionality", DEFAULT_DIMENSIONALITY),
+            "index_name": (kwargs.get("index_name") or "").strip(),
+        })
+
+    def embed(self, api_key, model, texts, task_type, output_dimensionality, index_name="", use_cache=True,
+              max_concurrency=4):
+        """Embed every line of text and optionally add the texts to a local vector index"""
+        text_list = parse_texts(texts)
+        if not text_list:
+            raise ValueError("No texts provided")
+
+        index_name = (index_name or "").strip()
+        index = get_vector_index(index_name) if index_name else None
+        if index is not None:
+            # Vectors from another model or of another size cannot be compared with the ones in the index
+            index_model, index_dim, _ = index.describe()
+            if (index_model and index_model != model) or (index_dim and index_dim != output_dimensionality):
+                raise ValueError(
+                    f"Index '{index_name}' holds {index_dim}-dimensional {index_model} vectors; "
+                    f"embed with the same model and output_dimensionality, or use another index name"
+                )
+
+        started = time.perf_counter()
+        try:
+            vectors, requests = embed_texts(
+                api_key, model, text_list, task_type, output_dimensionality, use_cache, max_concurrency
+            )
+        except Exception as e:
+            print(f"Error embedding texts with Gemini: {str(e)}")
+            raise ValueError(f"Gemini embedding request failed: {str(e)}")
+        report = (
+            f"Embedded {len(text_list)} text(s) with {model} in {time.perf_counter() - started:.2f}s "
+            f"using {requests} request(s)"
+        )
+
+        index_size = 0
+        if index is not None:
+            added = index.add([text_key(text) for text in text_list], text_list, vectors, model)
+            index_size = len(index)
+            report += f"\nAdded {added} new text(s) to index '{index_name}', which now holds {index_size}"
+
+        embeddings = {
+            "model": model,
+            "task_type": task_type,
+            "texts": text_list,
+            "vectors": vectors,
+        }
+        return (embeddings, index_size, report)
+
+
+class GeminiEmbeddingSearch(GeminiNodeExecution):
+    """
+    A ComfyUI node for finding the most similar indexed texts with local cosine search
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key, used to embed the queries"
+                }),
+                "queries": ("STRING", {
+                    "multiline": True,
+                    "default": "a fox in winter",
+                    "tooltip": "Texts to search for, one per line"
+                }),
+                "index_name": ("STRING", {
+                    "multiline": False,
+                    "default": "prompts",
+                    "tooltip": "Local vector index filled by Gemini Embeddings"
+                }),
+                "top_k": ("INT", {
+                    "default": 5,
+                    "min": 1,
+                    "max": 100,
+                    "tooltip": "Number of matches returned per query"
+                })
+            },
+            "optional": {
+                "query_task_type": (EMBEDDING_TASK_TYPES, {
+                    "default": "RETRIEVAL_QUERY",
+                    "tooltip": "Task type the queries are embedded with; SEMANTIC_SIMILARITY suits duplicate detection"
+                }),
+                "embeddings": ("GEMINI_EMBEDDINGS", {
+                    "tooltip": "Search these embeddings instead of the index"
+                }),
+                "min_score": ("FLOAT", {
+                    "default": 0.0,
+                    "min": -1.0,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "tooltip": "Matches below this cosine similarity are left out"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored vectors for queries embedded before"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "FLOAT", "STRING")
+    RETURN_NAMES = ("best_matches", "best_scores", "results_jsonl")
+    OUTPUT_IS_LIST = (True, True, False)
+    EXECUTE = "search"
+    # Runs every time, so a prefetched search would only be a second one
+    PREFETCH = False
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "text"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # The index may have grown since the last run
+        return float("nan")
+
+    def search(self, api_key, queries, index_name, top_k, query_task_type="RETRIEVAL_QUERY", embeddings=None,
+               min_score=0.0, use_cache=True):
+        """Embed every query and return the most similar texts from the index"""
+        query_list = parse_texts(queries)
+        if not query_list:
+            raise ValueError("No queries provided")
+
+        # Queries are embedded with the model and size of the vectors they are compared with
+        if embeddings is not None:
+            model = embeddings["model"]
+            vectors = embeddings["vectors"]
+            texts = embeddings["texts"]
+            dim = vectors.shape[1]
+            source = "the connected embeddings"
+        else:
+            index = get_vector_index((index_name or "").strip())
+            model, dim, count = index.describe()
+            model = model or EMBEDDING_MODELS[0]
+            if not count:
+                raise ValueError(f"Index '{index_name}' is empty. Add texts to it with Gemini Embeddings first")
+            source = f"index '{index_name}'"
+
+        try:
+            query_vectors, _ = embed_texts(
+                api_key, model, query_list, query_task_type, dim, use_cache, node="GeminiEmbeddingSearch"
+            )
+        except Exception as e:
+            print(f"Error embedding queries with Gemini: {str(e)}")
+            raise ValueError(f"Gemini embedding request failed: {str(e)}")
+
+        started = time.perf_counter()
+        if embeddings is not None:
+            rows, scores = top_k_cosine(query_vectors, vectors, top_k)
+            results = [
+                [(int(row), float(score), texts[row]) for row, score in zip(query_rows, query_scores)]
+                for query_rows, query_scores in zip(rows, scores)
+            ]
+        else:
+            results = index.search(query_vectors, top_k)
+        print(f"Searched {source} for {len(query_list)} query(s) in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        best_matches = []
+        best_scores = []
+        lines = []
+        for query, matches in zip(query_list, results):
+            matches = [match for match in matches if match[1] >= min_score]
+            best_matches.append(matches[0][2] if matches else "")
+            best_scores.append(matches[0][1] if matches else 0.0)
+            lines.append(json.dumps({
+                "query": query,
+                "matches": [{"text": text, "score": round(score, 6), "row": row} for row, score, text in matches],
+            }, ensure_ascii=False))
+        return (best_matches, best_scores, "\n".join(lines))
+
+
+# Node class mappings for ComfyUI
+NODE_CLASS_MAPPINGS = {
+    "GeminiEmbeddings": GeminiEmbeddings,
+    "GeminiEmbeddingSearch": GeminiEmbeddingSearch
+}
+
+# Display name mappings
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "GeminiEmbeddings": "Gemini Embeddings",
+    "GeminiEmbeddingSearch": "Gemini Embedding Search"
+}
@@ -1,14 +1,35 @@
 import base64
-import tempfile
-import os
-from google import genai
-from google.genai import types
-import folder_paths
-import torch
-import torchaudio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .audio_utils import SPEECH_SAMPLE_RATE, available_speech_formats, encode_speech_audio, prepare_speech_waveform
+from .gemini_client import delete_uploaded_file, get_client, make_media_part
+from .long_audio import split_waveform, stitch_transcripts, transcribe_windows
+from .metrics import (
+    add_bytes, bind_context, metrics_enabled, phase, record_cache_hit, record_usage, track_call
+)
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .rate_limiter import estimate_audio_tokens, estimate_text_tokens, get_scheduler
+from .response_cache import get_response_cache, make_cache_key
+from .silence_gate import DEFAULT_MIN_SILENCE_SECONDS, DEFAULT_THRESHOLD_DB, gate_silence
 
 
-class GeminiSpeechToText:
+# Instruction sent with a whole clip
+TRANSCRIBE_INSTRUCTION = (
+    "Transcribe the following audio. Provide only the transcribed text output, without any "
+    "additional commentary or conversational filler. If the audio is unclear or contains no "
+    "speech, indicate that appropriately."
+)
+
+# Instruction sent with each window in long-audio mode; silent windows must not add filler text
+CHUNK_TRANSCRIBE_INSTRUCTION = (
+    "Transcribe the following audio excerpt verbatim. It is one part of a longer recording and "
+    "may start or end mid-sentence. Provide only the transcribed text output, without any "
+    "additional commentary. If the excerpt contains no speech, return an empty response."
+)
+
+
+class GeminiSpeechToText(GeminiNodeExecution):
     """
     A ComfyUI node for converting speech to text using Google's Gemini API
     """
@@ -29,101 +50,344 @@ class GeminiSpeechToText:
                 "audio": ("AUDIO", {
                     "tooltip": "Audio input to be transcribed to text"
                 })
+            },
+            "optional": {
+                "audio_format": (available_speech_formats(), {
+                    "default": "wav",
+                    "tooltip": "Upload encoding. WAV needs no codec; FLAC is lossless and Opus the smallest, "
+                               "offered when an encoder (torchcodec) is installed"
+                }),
+                "sample_rate": ("INT", {
+                    "default": SPEECH_SAMPLE_RATE,
+                    "min": 8000,
+                    "max": 48000,
+                    "step": 1000,
+                    "tooltip": "Audio is downmixed to mono and resampled to this rate before upload"
+                }),
+                "long_audio_mode": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Split long recordings into overlapping chunks and transcribe them in parallel"
+                }),
+                "chunk_seconds": ("INT", {
+                    "default": 300,
+                    "min": 30,
+                    "max": 3600,
+                    "step": 10,
+                    "tooltip": "Target chunk length in long-audio mode; cuts are moved to nearby silence"
+                }),
+                "overlap_seconds": ("FLOAT", {
+                    "default": 2.0,
+                    "min": 0.0,
+                    "max": 30.0,
+                    "step": 0.5,
+                    "tooltip": "Audio shared by neighbouring chunks; repeated words are removed when stitching"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "tooltip": "Maximum number of batch items and chunks transcribed at the same time"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored transcripts for identical audio and settings"
+                }),
+                "trim_silence": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Remove long silent stretches before upload; clips that are entirely silent are not sent"
+                }),
+                "silence_threshold_db": ("FLOAT", {
+                    "default": DEFAULT_THRESHOLD_DB,
+                    "min": -90.0,
+                    "max": -10.0,
+                    "step": 1.0,
+                    "tooltip": "Frames quieter than this level (dBFS) count as silence"
+                }),
+                "min_silence_seconds": ("FLOAT", {
+                    "default": DEFAULT_MIN_SILENCE_SECONDS,
+                    "min": 0.1,
+                    "max": 10.0,
+                    "step": 0.1,
+                    "tooltip": "Silent stretches longer than this are shortened to it; shorter pauses are kept"
+                })
             }
         }
     
-    RETURN_TYPES = ("STRING",)
-    RETURN_NAMES = ("transcribed_text",)
-    FUNCTION = "transcribe_audio"
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("transcribed_text", "transcripts", "silence_report")
+    OUTPUT_IS_LIST = (False, True, False)
+    EXECUTE = "transcribe_audio"
+    FUNCTION = NODE_FUNCTION
     CATEGORY = "audio"
     
-    def audio_to_base64(self, audio_dict, format="wav"):
-        """Convert ComfyUI audio format to base64 string"""
+    @classmethod
+    def cache_key(cls, model=None, audio=None, audio_format="wav", sample_rate=SPEECH_SAMPLE_RATE,
+                  long_audio_mode=False, chunk_seconds=300, overlap_seconds=2.0, trim_silence=False,
+                  silence_threshold_db=DEFAULT_THRESHOLD_DB, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS,
+                  **kwargs):
+        """Hash of the model, settings and waveform bytes that determine the transcript"""
+        inputs = {
+            "audio_format": audio_format,
+            "sample_rate": sample_rate,
+            "long_audio_mode": bool(long_audio_mode),
+        }
+        if long_audio_mode:
+            inputs.update({"chunk_seconds": chunk_seconds, "overlap_seconds": overlap_seconds})
+        if trim_silence:
+            inputs.update({"silence_threshold_db": silence_threshold_db, "min_silence_seconds": min_silence_seconds})
+        
+        # Audio linked from a node that has not run yet is None in IS_CHANGED
+        tensors = {}
+        if isinstance(audio, dict) and audio.get("waveform") is not None:
+            inputs["source_rate"] = audio.get("sample_rate", 44100)
+            tensors["waveform"] = audio["waveform"]
+        return make_cache_key("GeminiSpeechToText", model, inputs, tensors)
+    
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node
+        cls.prefetch(kwargs)
+    
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return cls.cache_key(**kwargs)
+    
+    def batch_size(self, audio_dict):
+        """Return the number of clips in a ComfyUI audio batch"""
+        waveform = audio_dict.get("waveform") if isinstance(audio_dict, dict) else audio_dict
+        return waveform.shape[0] if waveform.dim() > 2 else 1
+    
+    def audio_item(self, audio_dict, index):
+        """Return one batch item as a ``[1, channels, samples]`` ComfyUI audio dict that views the batch"""
+        if isinstance(audio_dict, dict):
+            waveform = audio_dict.get("waveform")
+            sample_rate = audio_dict.get("sample_rate", 44100)
+        else:
+            waveform = audio_dict
+            sample_rate = 44100
+        
+        if waveform.dim() > 2:
+            # Slicing keeps the batch dimension without copying the batch
+            waveform = waveform[index:index + 1]
+        return {"waveform": waveform, "sample_rate": sample_rate}
+    
+    def unpack_audio(self, audio_dict, index=0):
+        """Return the ``[channels, samples]`` waveform of one batch item and the sample rate"""
+        # Extract waveform and sample rate from audio dict
+        if isinstance(audio_dict, dict):
+            waveform = audio_dict.get("waveform")
+            sample_rate = audio_dict.get("sample_rate", 44100)
+        else:
+            # Fallback if audio is passed as tensor directly
+            waveform = audio_dict
+            sample_rate = 44100
+        
+        # Select one item of the batch dimension as a view
+        if waveform.dim() > 2:
+            waveform = waveform[index]
+        
+        return waveform, sample_rate
+    
+    def encode_audio(self, audio_dict, audio_format="wav", sample_rate=SPEECH_SAMPLE_RATE):
+        """Encode ComfyUI audio into compact in-memory upload bytes"""
         try:
-            # Extract waveform and sample rate from audio dict
-            if isinstance(audio_dict, dict):
-                waveform = audio_dict.get("waveform")
-                sample_rate = audio_dict.get("sample_rate", 44100)
-            else:
-                # Fallback if audio is passed as tensor directly
-                waveform = audio_dict
-                sample_rate = 44100
-            
-            # Remove batch dimension if present
-            if waveform.dim() > 2:
-                waveform = waveform.squeeze(0)
-            
-            # Create temporary file
-            temp_dir = folder_paths.get_temp_directory()
-            temp_file = tempfile.NamedTemporaryFile(
-                suffix=f".{format}", 
-                dir=temp_dir, 
-                delete=False
-            )
-            
-            # Save audio to temporary file
-            torchaudio.save(temp_file.name, waveform, sample_rate, format=format.upper())
-            temp_file.close()
-            
-            # Read file and convert to base64
-            with open(temp_file.name, 'rb') as f:
-                audio_bytes = f.read()
-            
-            # Clean up temporary file
-            os.unlink(temp_file.name)
-            
-            # Convert to base64
-            base64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-            mime_type = f"audio/{format}"
-            
-            return base64_audio, mime_type
-            
+            waveform, source_rate = self.unpack_audio(audio_dict)
+            return encode_speech_audio(waveform, source_rate, audio_format, sample_rate)
         except Exception as e:
-            raise ValueError(f"Error converting audio to base64: {str(e)}")
+            raise ValueError(f"Error encoding audio: {str(e)}")
+    
+    def audio_to_base64(self, audio_dict, format="wav"):
+        """Convert ComfyUI audio format to base64 string"""
+        audio_bytes, mime_type = self.encode_audio(audio_dict, format)
+        base64_audio = base64.b64encode(audio_bytes).decode('utf-8')
+        return base64_audio, mime_type
     
-    def transcribe_audio(self, api_key, model, audio):
-        """Transcribe audio to text using Gemini API"""
+    def transcribe_bytes(self, client, model, audio_bytes, mime_type, instruction=TRANSCRIBE_INSTRUCTION,
+                         api_key="", audio_seconds=0.0):
+        """Send encoded audio to Gemini and return the transcript text"""
+        from google.genai import types
+        
+        # Small clips go inline; large ones are uploaded through the Files API
+        add_bytes(sent=len(audio_bytes))
+        with phase("upload"):
+            audio_part, uploaded_file = make_media_part(client, audio_bytes, mime_type)
+        
         try:
-            # Initialize the Gemini client
-            client = genai.Client(api_key=api_key)
-            
-            # Convert audio to base64
-            base64_audio, mime_type = self.audio_to_base64(audio)
-            
-            # Prepare the audio part for the API using inline_data
-            audio_part = types.Part(
-                inline_data=types.Blob(
-                    mime_type=mime_type,
-                    data=base64_audio
-                )
-            )
-            
-            # Prepare the text instruction part
-            text_part = types.Part.from_text(
-                text="Transcribe the following audio. Provide only the transcribed text output, without any additional commentary or conversational filler. If the audio is unclear or contains no speech, indicate that appropriately."
-            )
-            
             # Prepare the content for the API
             contents = [
                 types.Content(
                     role="user",
-                    parts=[audio_part, text_part],
+                    parts=[audio_part, types.Part.from_text(text=instruction)],
                 ),
             ]
             
-            # Generate the transcription
-            response = client.models.generate_content(
-                model=model,
-                contents=contents,
+            def generate():
+                with phase("request"):
+                    return client.models.generate_content(
+                        model=model,
+                        contents=contents,
+                    )
+            
+            # Generate the transcription within the shared rate limits; the upload is reused on retry
+            response = get_scheduler().call(
+                api_key, model, generate,
+                estimated_tokens=estimate_audio_tokens(audio_seconds) + estimate_text_tokens(instruction),
+            )
+        finally:
+            delete_uploaded_file(client, uploaded_file)
+        
+        record_usage(response.usage_metadata)
+        transcript = (response.text or "").strip()
+        if metrics_enabled():
+            add_bytes(received=len(transcript.encode("utf-8")))
+        return transcript
+    
+    def transcribe_long_audio(self, client, model, audio, audio_format, sample_rate,
+                              chunk_seconds, overlap_seconds, max_concurrency, api_key=""):
+        """Transcribe overlapping chunks concurrently and stitch them back together"""
+        waveform, source_rate = self.unpack_audio(audio)
+        
+        # Downmix and resample once, then cut the speech-rate waveform into windows
+        with phase("prepare"):
+            speech = prepare_speech_waveform(waveform, source_rate, sample_rate)
+            rate = sample_rate or source_rate
+            windows = split_waveform(speech, rate, chunk_seconds, overlap_seconds)
+        print(f"Transcribing {speech.shape[-1] / rate:.1f}s of audio in {len(windows)} chunks")
+        
+        def transcribe_window(window):
+            with phase("encode"):
+                audio_bytes, mime_type = encode_speech_audio(window.waveform, rate, audio_format, rate)
+            return self.transcribe_bytes(
+                client, model, audio_bytes, mime_type, instruction=CHUNK_TRANSCRIBE_INSTRUCTION,
+                api_key=api_key, audio_seconds=window.waveform.shape[-1] / rate
+            )
+        
+        transcripts = transcribe_windows(windows, bind_context(transcribe_window), max_concurrency)
+        with phase("stitch"):
+            return stitch_transcripts(transcripts)
+    
+    def trim_item_silence(self, audio, sample_rate, silence_threshold_db, min_silence_seconds):
+        """Gate silence out of one clip at the upload rate; return the trimmed audio dict and the gate result"""
+        waveform, source_rate = self.unpack_audio(audio)
+        with phase("prepare"):
+            speech = prepare_speech_waveform(waveform, source_rate, sample_rate)
+            rate = sample_rate or source_rate
+            gated = gate_silence(speech, rate, silence_threshold_db, min_silence_seconds)
+        print(
+            f"Silence gate kept {gated.kept_seconds:.1f}s of {gated.original_seconds:.1f}s "
+            f"({gated.removed_seconds:.1f}s removed in {max(0, len(gated.segments) - 1)} gaps)"
+        )
+        return {"waveform": gated.waveform, "sample_rate": rate}, gated
+    
+    def transcribe_item(self, client, model, audio, audio_format, sample_rate, long_audio_mode,
+                        chunk_seconds, overlap_seconds, max_concurrency, api_key="", trim_silence=False,
+                        silence_threshold_db=DEFAULT_THRESHOLD_DB, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS):
+        """Transcribe a single clip, in overlapping chunks when long-audio mode is on; return the text and gate report"""
+        report = None
+        if trim_silence:
+            audio, gated = self.trim_item_silence(audio, sample_rate, silence_threshold_db, min_silence_seconds)
+            report = gated.report()
+            # Nothing above the threshold: there is no speech to pay for
+            if gated.is_silent:
+                return "", report
+        
+        # Route clips too large for one request to chunks before encoding anything
+        waveform, source_rate = self.unpack_audio(audio)
+        long_audio_mode, chunk_seconds = get_preflight().plan_audio_upload(
+            model, waveform.shape[-1] / source_rate, sample_rate or source_rate, audio_format,
+            long_audio_mode, chunk_seconds, overlap_seconds, TRANSCRIBE_INSTRUCTION, client
+        )
+        
+        if long_audio_mode:
+            transcribed_text = self.transcribe_long_audio(
+                client, model, audio, audio_format, sample_rate,
+                chunk_seconds, overlap_seconds, max_concurrency, api_key
+            )
+        else:
+            # Encode audio in memory; the SDK base64-encodes it for transport
+            with phase("encode"):
+                audio_bytes, mime_type = self.encode_audio(audio, audio_format, sample_rate)
+            transcribed_text = self.transcribe_bytes(
+                client, model, audio_bytes, mime_type,
+                api_key=api_key, audio_seconds=waveform.shape[-1] / source_rate
             )
+        
+        # Check the transcribed text
+        if not transcribed_text:
+            raise ValueError("Received no valid text in the transcript from Gemini API")
+        return transcribed_text, report
+    
+    def transcribe_audio(self, api_key, model, audio, audio_format="wav", sample_rate=SPEECH_SAMPLE_RATE,
+                         long_audio_mode=False, chunk_seconds=300, overlap_seconds=2.0, max_concurrency=4,
+                         use_cache=True, trim_silence=False, silence_threshold_db=DEFAULT_THRESHOLD_DB,
+                         min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS):
+        """Transcribe every clip of an audio batch to text using Gemini API"""
+        try:
+            count = self.batch_size(audio)
+            items = [self.audio_item(audio, index) for index in range(count)]
+            
+            # Serve identical clips from the response cache, item by item
+            cache = get_response_cache() if use_cache else None
+            cache_keys = [
+                self.cache_key(
+                    model, item, audio_format, sample_rate, long_audio_mode, chunk_seconds, overlap_seconds,
+                    trim_silence, silence_threshold_db, min_silence_seconds
+                )
+                for item in items
+            ]
+            transcripts = [None] * count
+            reports = [{"item": index} for index in range(count)]
+            if cache is not None:
+                for index, cache_key in enumerate(cache_keys):
+                    transcripts[index] = cache.get_text(cache_key)
+                    if transcripts[index] is not None:
+                        record_cache_hit("GeminiSpeechToText", model)
+                        reports[index]["cached"] = True
+            pending = [index for index, text in enumerate(transcripts) if text is None]
             
-            # Extract transcribed text
-            if response.text is None or response.text == "":
-                raise ValueError("Received no valid text in the transcript from Gemini API")
+            if pending:
+                # Time each phase of the request when metrics are enabled
+                with track_call("GeminiSpeechToText", model):
+                    # Get the shared Gemini client for this API key
+                    client = get_client(api_key)
+                    
+                    # Split the concurrency budget between batch items and the chunks inside each item
+                    item_workers = max(1, min(max_concurrency, len(pending)))
+                    chunk_workers = max(1, max_concurrency // item_workers)
+                    
+                    def transcribe(index):
+                        try:
+                            text, report = self.transcribe_item(
+                                client, model, items[index], audio_format, sample_rate, long_audio_mode,
+                                chunk_seconds, overlap_seconds, chunk_workers, api_key,
+                                trim_silence, silence_threshold_db, min_silence_seconds
+                            )
+                        except Exception as e:
+                            if count == 1:
+                                raise
+                            raise ValueError(f"Batch item {index + 1}/{count}: {str(e)}") from e
+                        # Silent clips cost nothing to redo, so only real transcripts are stored
+                        if cache is not None and text:
+                            cache.put_text(cache_keys[index], text)
+                        return text, report
+                    
+                    if item_workers == 1:
+                        results = [transcribe(index) for index in pending]
+                    else:
+                        with ThreadPoolExecutor(max_workers=item_workers) as executor:
+                            results = list(executor.map(bind_context(transcribe), pending))
+                
+                for index, (text, report) in zip(pending, results):
+                    transcripts[index] = text
+                    if report is not None:
+                        reports[index].update(report)
             
-            transcribed_text = response.text.strip()
+            if count > 1:
+                print(f"Transcribed {count} clips ({count - len(pending)} from cache)")
             
-            return (transcribed_text,)
+            silence_report = "\n".join(json.dumps(report) for report in reports) if trim_silence else ""
+            return ("\n\n".join(text for text in transcripts if text), transcripts, silence_report)
             
         except Exception as e:
             error_msg = str(e)
@@ -134,6 +398,8 @@ class GeminiSpeechToText:
                 raise ValueError("Invalid API Key. Please check your API key.")
             elif "Unsupported content type" in error_msg or "audio format" in error_msg.lower():
                 raise ValueError(f"The audio format may not be supported by the Gemini model for transcription. Details: {error_msg}")
+            elif "RESOURCE_EXHAUSTED" in error_msg:
+                raise ValueError(f"Gemini API quota exceeded for '{model}' after retrying. Lower the request rate or try again later.")
             else:
                 raise ValueError(f"Gemini API transcription request failed: {error_msg}")
 
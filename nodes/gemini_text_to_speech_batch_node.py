@@ -0,0 +1,257 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .audio_utils import pad_waveforms
+from .gemini_client import get_client
+from .gemini_text_to_speech_node import VOICE_NAMES, GeminiTextToSpeech
+from .metrics import record_cache_hit, track_call
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .response_cache import get_response_cache, make_cache_key
+
+
+# Gemini's multi-speaker speech takes exactly this many speakers
+MULTI_SPEAKER_COUNT = 2
+
+
+def check_speaker_voices(voices, source="speaker_voices"):
+    """Raise ValueError unless ``voices`` maps exactly two speakers to prebuilt voices"""
+    if not isinstance(voices, dict) or any(voice not in VOICE_NAMES for voice in voices.values()):
+        raise ValueError(f"{source} must map speaker names to prebuilt voices")
+    if len(voices) != MULTI_SPEAKER_COUNT:
+        raise ValueError(f"{source} names {len(voices)} speaker(s); "
+                         f"Gemini multi-speaker speech needs exactly {MULTI_SPEAKER_COUNT}")
+    return voices
+
+
+def parse_speaker_voices(speaker_voices):
+    """Parse "Speaker=Voice" pairs, one per line or comma separated, into an ordered dict; empty input gives no speakers"""
+    voices = {}
+    for pair in speaker_voices.replace(",", "\n").splitlines():
+        if not pair.strip():
+            continue
+        speaker, separator, voice = pair.partition("=")
+        speaker, voice = speaker.strip(), voice.strip()
+        if not separator or not speaker or voice not in VOICE_NAMES:
+            raise ValueError(f"Invalid speaker voice \"{pair.strip()}\": expected Speaker=Voice with a prebuilt voice")
+        voices[speaker] = voice
+    return check_speaker_voices(voices) if voices else voices
+
+
+class GeminiTextToSpeechBatch(GeminiNodeExecution):
+    """
+    A ComfyUI node for synthesizing many lines of speech concurrently into one batched audio tensor
+    """
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "api_key": ("STRING", {
+                    "multiline": False,
+                    "default": "",
+                    "tooltip": "Your Gemini API key"
+                }),
+                "model": (["gemini-2.5-pro-preview-tts", "gemini-2.5-flash-preview-tts"], {
+                    "default": "gemini-2.5-flash-preview-tts",
+                    "tooltip": "Select the Gemini model to use for text-to-speech"
+                }),
+                "texts": ("STRING", {
+                    "multiline": True,
+                    "default": "Kore: Hello, this is the first line.\nPuck: And this is the second one.",
+                    "tooltip": "Texts to synthesize; every item becomes one clip of the batch"
+                }),
+                "input_format": (["lines", "paragraphs", "jsonl"], {
+                    "default": "lines",
+                    "tooltip": "lines: every non-empty line is an item, optionally prefixed with \"Voice:\". paragraphs: items are separated by blank lines. jsonl: every line is a JSON string or an object with \"text\" and optional \"voice\" or \"speakers\" fields"
+                }),
+                "voice_name": (VOICE_NAMES, {
+                    "default": "Zephyr",
+                    "tooltip": "Voice for items that do not name their own"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "tooltip": "Maximum number of items synthesized at the same time"
+                })
+            },
+            "optional": {
+                "speaker_voices": ("STRING", {
+                    "multiline": True,
+                    "default": "",
+                    "tooltip": "Multi-speaker dialogue: exactly two Speaker=Voice pairs, one per line. Items are then read as \"Speaker: line\" turns, each in its speaker's voice"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored audio per item; shared with the Gemini Text To Speech node"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("AUDIO", "INT", "STRING", "STRING")
+    RETURN_NAMES = ("audio", "lengths", "errors", "synthesis_report")
+    OUTPUT_IS_LIST = (False, True, True, False)
+    EXECUTE = "generate_speech_batch"
+    FUNCTION = NODE_FUNCTION
+    CATEGORY = "audio"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node
+        cls.prefetch(kwargs)
+
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return make_cache_key("GeminiTextToSpeechBatch", kwargs.get("model"), {
+            "texts": kwargs.get("texts", ""),
+            "input_format": kwargs.get("input_format", "lines"),
+            "voice_name": kwargs.get("voice_name"),
+            "speaker_voices": kwargs.get("speaker_voices") or "",
+        })
+
+    def parse_items(self, texts, input_format, voice_name, speaker_voices=None):
+        """Split the texts input into items with their text, voice and speaker voices"""
+        items = []
+        if input_format == "jsonl":
+            lines = [line.strip() for line in texts.splitlines() if line.strip()]
+            for line_number, line in enumerate(lines, start=1):
+                try:
+                    value = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Line {line_number} is not valid JSON: {str(e)}")
+                if isinstance(value, str):
+                    value = {"text": value}
+                if not isinstance(value, dict) or not isinstance(value.get("text"), str) or not value["text"].strip():
+                    raise ValueError(f"Line {line_number} must be a JSON string or an object with a \"text\" field")
+                voice = value.get("voice") or voice_name
+                if voice not in VOICE_NAMES:
+                    raise ValueError(f"Line {line_number} uses unknown voice \"{voice}\"")
+                speakers = value.get("speakers")
+                if speakers is not None:
+                    check_speaker_voices(speakers, f"Line {line_number}: \"speakers\"")
+                else:
+                    speakers = speaker_voices
+                items.append({"text": value["text"].strip(), "voice": voice, "speakers": speakers or None})
+            return items
+
+        if input_format == "paragraphs":
+            blocks = [block.strip() for block in texts.replace("\r\n", "\n").split("\n\n")]
+        else:
+            blocks = [line.strip() for line in texts.splitlines()]
+        for block in blocks:
+            if not block:
+                continue
+            voice = voice_name
+            # A leading "Voice:" picks the voice, unless the text is dialogue for named speakers
+            prefix, separator, rest = block.partition(":")
+            if not speaker_voices and separator and prefix.strip() in VOICE_NAMES and rest.strip():
+                voice, block = prefix.strip(), rest.strip()
+            items.append({"text": block, "voice": voice, "speakers": speaker_voices or None})
+        return items
+
+    def generate_speech_batch(self, api_key, model, texts, input_format, voice_name, max_concurrency,
+                              speaker_voices="", use_cache=True):
+        """Synthesize every item concurrently and return them as one zero-padded [B, 1, T] batch"""
+        import torch
+
+        items = self.parse_items(texts, input_format, voice_name, parse_speaker_voices(speaker_voices))
+        if not items:
+            raise ValueError("No text to synthesize")
+
+        tts = GeminiTextToSpeech()
+        results = [None] * len(items)
+        errors = [""] * len(items)
+        report_lines = [""] * len(items)
+
+        # Answer what we can from the response cache shared with Gemini Text To Speech
+        cache = get_response_cache() if use_cache else None
+        cache_keys = [
+            GeminiTextToSpeech.cache_key(model, item["text"], item["voice"], speaker_voices=item["speakers"])
+            for item in items
+        ]
+        pending = []
+        for index, cache_key in enumerate(cache_keys):
+            cached = cache.get_audio(cache_key) if cache is not None else None
+            if cached is not None:
+                record_cache_hit("GeminiTextToSpeechBatch", model)
+                results[index] = cached[:2]
+                report_lines[index] = "served from cache"
+            else:
+                pending.append(index)
+
+        client = get_client(api_key) if pending else None
+        t0 = time.perf_counter()
+        if pending:
+
+            def synthesize(index):
+                item = items[index]
+                started = time.perf_counter() - t0
+                try:
+                    # Each item is recorded as its own call when metrics are enabled
+                    with track_call("GeminiTextToSpeechBatch", model):
+                        get_preflight().check_text(model, [item["text"]], client, "text")
+                        waveform, sample_rate, timing = tts.synthesize_segment(
+                            client, model, item["text"], item["voice"], api_key=api_key,
+                            speaker_voices=item["speakers"]
+                        )
+                except Exception as e:
+                    # One failed item must not abort the rest of the batch
+                    return index, None, str(e), ""
+                timing["started"] = started
+                if cache is not None:
+                    report = tts.format_synthesis_report([timing], timing["total"])
+                    cache.put_audio(cache_keys[index], waveform, sample_rate, extra={"report": report})
+                summary = (
+                    f"started +{started:.2f}s, first audio {timing['first_audio']:.2f}s, "
+                    f"done {timing['total']:.2f}s, {timing['audio_seconds']:.1f}s audio"
+                )
+                return index, (waveform, sample_rate), "", summary
+
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(pending))) as executor:
+                for index, result, error, summary in executor.map(synthesize, pending):
+                    results[index] = result
+                    errors[index] = error
+                    report_lines[index] = summary or f"failed: {error}"
+
+        succeeded = [result for result in results if result is not None]
+        if not succeeded:
+            raise ValueError(f"Every item failed to synthesize: {errors[0]}")
+        sample_rates = {sample_rate for _, sample_rate in succeeded}
+        if len(sample_rates) > 1:
+            raise ValueError(f"Items came back at different sample rates: {sorted(sample_rates)}")
+        sample_rate = succeeded[0][1]
+
+        # Failed items stay in the batch as empty clips so indices line up with the input
+        waveform, lengths = pad_waveforms([
+            result[0] if result is not None else torch.zeros(1, 0) for result in results
+        ])
+
+        report = "\n".join(
+            f"Item {index + 1}/{len(items)}: {'dialogue' if item['speakers'] else item['voice']}, "
+            f"{len(item['text'])} chars, {line}"
+            for index, (item, line) in enumerate(zip(items, report_lines))
+        )
+        failed = sum(1 for error in errors if error)
+        report += (
+            f"\nTotal: {len(items)} item(s), {failed} failed, {time.perf_counter() - t0:.2f}s wall time, "
+            f"{max(lengths) / sample_rate:.1f}s padded length"
+        )
+        if failed:
+            print(f"Gemini Text To Speech Batch: {failed} of {len(items)} items failed")
+
+        # Return the batch in ComfyUI's expected format
+        audio_dict = {"waveform": waveform, "sample_rate": sample_rate}
+        return (audio_dict, lengths, errors, report)
+
+
+# Node class mappings for ComfyUI
+NODE_CLASS_MAPPINGS = {
+    "GeminiTextToSpeechBatch": GeminiTextToSpeechBatch
+}
+
+# Display name mappings
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "GeminiTextToSpeechBatch": "Gemini Text To Speech Batch"
+}
@@ -1,17 +1,62 @@
-import base64
-import mimetypes
+import json
 import os
-import re
-import struct
-import tempfile
-from google import genai
-from google.genai import types
-import folder_paths
-import torch
-import torchaudio
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .audio_utils import PCMChunkAssembler, build_wav_header, join_waveforms, parse_audio_mime_type
+from .gemini_client import get_client
+from .metrics import (
+    add_bytes, bind_context, mark_first_chunk, metrics_enabled, phase, record_cache_hit, record_usage, track_call
+)
+from .node_execution import NODE_FUNCTION, GeminiNodeExecution
+from .preflight import get_preflight
+from .rate_limiter import estimate_text_tokens, get_scheduler
+from .response_cache import get_response_cache, make_cache_key
+from .single_flight import get_single_flight, uncached_key
+from .text_segments import split_text
+from .wav_stream import WavStreamWriter, new_output_path, open_wav_memmap
 
 
-class GeminiTextToSpeech:
+# Prebuilt voices offered by the Gemini TTS models
+VOICE_NAMES = [
+    "Zephyr", "Puck", "Charon", "Kore", "Fenrir", "Leda", 
+    "Orus", "Aoede", "Callirrhoe", "Autonoe", "Enceladus", "Iapetus",
+    "Umbriel", "Algieba", "Despina", "Erinome", "Algenib", "Rasalgethi",
+    "Laomedeia", "Achernar", "Alnilam", "Schedar", "Gacrux", "Pulcherrima",
+    "Achird", "Zubenelgenubi", "Vindemiatrix", "Sadachbia", "Sadaltager", "Sulafat"
+]
+
+
+def build_speech_config(voice_name, speaker_voices=None):
+    """Speech config for one prebuilt voice, or one voice per speaker name for dialogue"""
+    from google.genai import types
+    
+    if speaker_voices:
+        # Multi-speaker synthesis reads "Speaker: line" turns from the text
+        return types.SpeechConfig(
+            multi_speaker_voice_config=types.MultiSpeakerVoiceConfig(
+                speaker_voice_configs=[
+                    types.SpeakerVoiceConfig(
+                        speaker=speaker,
+                        voice_config=types.VoiceConfig(
+                            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=voice)
+                        ),
+                    )
+                    for speaker, voice in speaker_voices.items()
+                ]
+            )
+        )
+    return types.SpeechConfig(
+        voice_config=types.VoiceConfig(
+            prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                voice_name=voice_name
+            )
+        )
+    )
+
+
+class GeminiTextToSpeech(GeminiNodeExecution):
     """
     A ComfyUI node for converting text to speech using Google's Gemini API
     """
@@ -34,24 +79,96 @@ class GeminiTextToSpeech:
                     "default": "Hello, this is a test of Gemini text to speech.",
                     "tooltip": "Text to be converted to speech"
                 }),
-                "voice_name": ([
-                    "Zephyr", "Puck", "Charon", "Kore", "Fenrir", "Leda", 
-                    "Orus", "Aoede", "Callirrhoe", "Autonoe", "Enceladus", "Iapetus",
-                    "Umbriel", "Algieba", "Despina", "Erinome", "Algenib", "Rasalgethi",
-                    "Laomedeia", "Achernar", "Alnilam", "Schedar", "Gacrux", "Pulcherrima",
-                    "Achird", "Zubenelgenubi", "Vindemiatrix", "Sadachbia", "Sadaltager", "Sulafat"
-                ], {
+                "voice_name": (VOICE_NAMES, {
                     "default": "Zephyr",
                     "tooltip": "Voice to use for speech synthesis"
                 })
+            },
+            "optional": {
+                "long_form_mode": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Split long text at sentence and paragraph boundaries and synthesize the segments in parallel"
+                }),
+                "segment_chars": ("INT", {
+                    "default": 1500,
+                    "min": 100,
+                    "max": 5000,
+                    "step": 100,
+                    "tooltip": "Maximum characters per segment in long-form mode"
+                }),
+                "max_concurrency": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 32,
+                    "tooltip": "Maximum number of segments synthesized at the same time"
+                }),
+                "segment_gap_seconds": ("FLOAT", {
+                    "default": 0.15,
+                    "min": 0.0,
+                    "max": 5.0,
+                    "step": 0.05,
+                    "tooltip": "Silence inserted between segments"
+                }),
+                "crossfade_seconds": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 1.0,
+                    "step": 0.01,
+                    "tooltip": "Blend neighbouring segments instead of inserting a gap"
+                }),
+                "use_cache": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Reuse stored audio for identical model/text/voice combinations"
+                }),
+                "stream_to_file": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Write segments to a WAV file in the output directory as they finish and return a memory-mapped waveform, so memory use stays bounded however long the text is"
+                }),
+                "filename_prefix": ("STRING", {
+                    "default": "gemini_tts",
+                    "tooltip": "File name prefix of streamed WAV files"
+                })
             }
         }
     
-    RETURN_TYPES = ("AUDIO",)
-    RETURN_NAMES = ("audio",)
-    FUNCTION = "generate_speech"
+    RETURN_TYPES = ("AUDIO", "STRING", "STRING")
+    RETURN_NAMES = ("audio", "synthesis_report", "file_path")
+    EXECUTE = "generate_speech"
+    FUNCTION = NODE_FUNCTION
     CATEGORY = "audio"
     
+    @classmethod
+    def cache_key(cls, model=None, text="", voice_name=None, long_form_mode=False, segment_chars=1500,
+                  segment_gap_seconds=0.15, crossfade_seconds=0.0, speaker_voices=None, stream_to_file=False,
+                  filename_prefix="gemini_tts", **kwargs):
+        """Hash of everything that determines the generated audio"""
+        inputs = {"text": text, "long_form_mode": bool(long_form_mode)}
+        if speaker_voices:
+            # Dialogue is read only in the speakers' voices
+            inputs["speaker_voices"] = dict(speaker_voices)
+        else:
+            inputs["voice_name"] = voice_name
+        if stream_to_file:
+            inputs.update({"stream_to_file": True, "filename_prefix": filename_prefix})
+        if long_form_mode or stream_to_file:
+            inputs.update({
+                "segment_chars": segment_chars,
+                "segment_gap_seconds": segment_gap_seconds,
+                "crossfade_seconds": crossfade_seconds,
+            })
+        return make_cache_key("GeminiTextToSpeech", model, inputs)
+    
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # Start the request now when no input depends on another node; streamed files are only written on a real run
+        if not kwargs.get("stream_to_file", False):
+            cls.prefetch(kwargs)
+    
+        # NaN never equals itself, so ComfyUI re-runs the node when caching is off
+        if not kwargs.get("use_cache", True):
+            return float("nan")
+        return cls.cache_key(**kwargs)
+    
     def save_binary_file(self, file_name, data):
         """Save binary data to file"""
         with open(file_name, "wb") as f:
@@ -61,130 +178,267 @@ class GeminiTextToSpeech:
     def convert_to_wav(self, audio_data: bytes, mime_type: str) -> bytes:
         """Generates a WAV file header for the given audio data and parameters."""
         parameters = self.parse_audio_mime_type(mime_type)
-        bits_per_sample = parameters["bits_per_sample"]
-        sample_rate = parameters["rate"]
-        num_channels = 1
-        data_size = len(audio_data)
-        bytes_per_sample = bits_per_sample // 8
-        block_align = num_channels * bytes_per_sample
-        byte_rate = sample_rate * block_align
-        chunk_size = 36 + data_size  # 36 bytes for header fields before data chunk size
-
-        # http://soundfile.sapp.org/doc/WaveFormat/
-        header = struct.pack(
-            "<4sI4s4sIHHIIHH4sI",
-            b"RIFF",          # ChunkID
-            chunk_size,       # ChunkSize (total file size - 8 bytes)
-            b"WAVE",          # Format
-            b"fmt ",          # Subchunk1ID
-            16,               # Subchunk1Size (16 for PCM)
-            1,                # AudioFormat (1 for PCM)
-            num_channels,     # NumChannels
-            sample_rate,      # SampleRate
-            byte_rate,        # ByteRate
-            block_align,      # BlockAlign
-            bits_per_sample,  # BitsPerSample
-            b"data",          # Subchunk2ID
-            data_size         # Subchunk2Size (size of audio data)
-        )
+        header = build_wav_header(len(audio_data), parameters["rate"], parameters["bits_per_sample"])
         return header + audio_data
 
-    def parse_audio_mime_type(self, mime_type: str) -> dict[str, int]:
+    def parse_audio_mime_type(self, mime_type: str) -> dict:
         """Parses bits per sample and rate from an audio MIME type string."""
-        bits_per_sample = 16
-        rate = 24000
-
-        # Extract rate from parameters
-        parts = mime_type.split(";")
-        for param in parts:
-            param = param.strip()
-            if param.lower().startswith("rate="):
-                try:
-                    rate_str = param.split("=", 1)[1]
-                    rate = int(rate_str)
-                except (ValueError, IndexError):
-                    pass  # Keep rate as default
-            elif param.startswith("audio/L"):
+        return parse_audio_mime_type(mime_type)
+    
+    def synthesize_segment(self, client, model, text, voice_name, seed=None, api_key="", speaker_voices=None):
+        """Synthesize one piece of text and return its waveform, sample rate and timings"""
+        from google.genai import types
+        
+        started = time.perf_counter()
+        
+        # Prepare the content for the API
+        contents = [
+            types.Content(
+                role="user",
+                parts=[
+                    types.Part.from_text(text=text),
+                ],
+            ),
+        ]
+        
+        # Configure the generation settings
+        generate_content_config = types.GenerateContentConfig(
+            temperature=1,
+            seed=seed,
+            response_modalities=["audio"],
+            speech_config=build_speech_config(voice_name, speaker_voices),
+        )
+        
+        def stream_audio():
+            """Stream one attempt; a retry starts over with a fresh assembler"""
+            assembler = PCMChunkAssembler()
+            first_audio = None
+            usage_metadata = None
+            request_started = time.perf_counter()
+            with phase("request"):
+                for chunk in client.models.generate_content_stream(
+                    model=model,
+                    contents=contents,
+                    config=generate_content_config,
+                ):
+                    # Token counts arrive with the stream; the last report covers the whole response
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if (
+                        chunk.candidates is None
+                        or chunk.candidates[0].content is None
+                        or chunk.candidates[0].content.parts is None
+                    ):
+                        continue
+                    
+                    if (chunk.candidates[0].content.parts[0].inline_data and 
+                        chunk.candidates[0].content.parts[0].inline_data.data):
+                        inline_data = chunk.candidates[0].content.parts[0].inline_data
+                        if first_audio is None:
+                            first_audio = time.perf_counter() - started
+                            mark_first_chunk(request_started)
+                        assembler.add(inline_data.data, inline_data.mime_type)
+            record_usage(usage_metadata)
+            add_bytes(received=len(assembler))
+            return assembler, first_audio
+        
+        # Generate the audio content within the shared rate limits
+        if metrics_enabled():
+            add_bytes(sent=len(text.encode("utf-8")))
+        assembler, first_audio = get_scheduler().call(
+            api_key, model, stream_audio, estimated_tokens=estimate_text_tokens(text)
+        )
+        
+        if not len(assembler):
+            raise ValueError("No audio data received from Gemini API")
+        
+        # Decode the assembled PCM in memory
+        with phase("decode"):
+            waveform = assembler.to_waveform()
+        timing = {
+            "chars": len(text),
+            "first_audio": first_audio,
+            "total": time.perf_counter() - started,
+            "audio_seconds": waveform.shape[-1] / assembler.sample_rate,
+        }
+        return waveform, assembler.sample_rate, timing
+    
+    def format_synthesis_report(self, timings, wall_time):
+        """Summarize per-segment timings for tuning segment size"""
+        lines = []
+        for index, timing in enumerate(timings):
+            lines.append(
+                f"Segment {index + 1}/{len(timings)}: {timing['chars']} chars, "
+                f"started +{timing['started']:.2f}s, first audio {timing['first_audio']:.2f}s, "
+                f"done {timing['total']:.2f}s, {timing['audio_seconds']:.1f}s audio"
+            )
+        first_audio = timings[0]["started"] + timings[0]["first_audio"]
+        total_audio = sum(timing["audio_seconds"] for timing in timings)
+        lines.append(
+            f"Total: {len(timings)} segment(s), {wall_time:.2f}s wall time, "
+            f"first audio after {first_audio:.2f}s, {total_audio:.1f}s audio"
+        )
+        return "\n".join(lines)
+    
+    def stream_speech_to_file(self, client, model, segments, voice_name, seed, api_key, max_concurrency,
+                              segment_gap_seconds, crossfade_seconds, path):
+        """
+        Synthesize segments and append them to a WAV file in text order as they finish
+        
+        At most ``max_concurrency`` segments are in flight or waiting to be
+        written, so memory use does not grow with the length of the text.
+        Returns the number of frames, the sample rate and the segment timings.
+        """
+        t0 = time.perf_counter()
+        
+        def synthesize(segment):
+            started = time.perf_counter() - t0
+            waveform, sample_rate, timing = self.synthesize_segment(
+                client, model, segment, voice_name, seed, api_key
+            )
+            timing["started"] = started
+            return waveform, sample_rate, timing
+        
+        writer = None
+        timings = []
+        
+        def write(result):
+            nonlocal writer
+            waveform, sample_rate, timing = result
+            if writer is None:
+                writer = WavStreamWriter(path, sample_rate, segment_gap_seconds, crossfade_seconds)
+            elif sample_rate != writer.sample_rate:
+                raise ValueError(f"Segments came back at different sample rates: {sorted({writer.sample_rate, sample_rate})}")
+            with phase("write"):
+                writer.append(waveform)
+            timings.append(timing)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(segments)))) as executor:
+                in_flight = deque()
                 try:
-                    bits_per_sample = int(param.split("L", 1)[1])
-                except (ValueError, IndexError):
-                    pass  # Keep bits_per_sample as default
-
-        return {"bits_per_sample": bits_per_sample, "rate": rate}
+                    for segment in segments:
+                        # Wait for the oldest segment before starting another, so finished audio never piles up
+                        if len(in_flight) >= max_concurrency:
+                            write(in_flight.popleft().result())
+                        in_flight.append(executor.submit(bind_context(synthesize), segment))
+                    while in_flight:
+                        write(in_flight.popleft().result())
+                except BaseException:
+                    for future in in_flight:
+                        future.cancel()
+                    raise
+        finally:
+            # Whatever was written so far stays a playable file
+            frames = writer.close() if writer is not None else 0
+        
+        return frames, writer.sample_rate, timings
     
-    def generate_speech(self, api_key, model, text, voice_name):
+    def generate_speech(self, api_key, model, text, voice_name, long_form_mode=False, segment_chars=1500,
+                        max_concurrency=4, segment_gap_seconds=0.15, crossfade_seconds=0.0, use_cache=True,
+                        stream_to_file=False, filename_prefix="gemini_tts"):
         """Generate speech from text using Gemini API"""
-        try:
-            # Initialize the Gemini client
-            client = genai.Client(api_key=api_key)
+        cache_key = self.cache_key(
+            model, text, voice_name, long_form_mode, segment_chars, segment_gap_seconds, crossfade_seconds,
+            stream_to_file=stream_to_file, filename_prefix=filename_prefix
+        )
+        if use_cache and not stream_to_file:
+            # Serve identical requests from the response cache
+            cache = get_response_cache()
+            cached = cache.get_audio(cache_key)
+            if cached is not None:
+                waveform, sample_rate, extra = cached
+                record_cache_hit("GeminiTextToSpeech", model)
+                audio_dict = {"waveform": waveform.unsqueeze(0), "sample_rate": sample_rate}
+                return (audio_dict, extra.get("report", "") + "\n(served from cache)", "")
             
-            # Prepare the content for the API
-            contents = [
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_text(text=text),
-                    ],
-                ),
-            ]
+            # Identical requests with the same API key already in flight share one API call;
+            # the caller that sends it stores the audio
+            def request():
+                result = self.synthesize_speech(
+                    api_key, model, text, voice_name, long_form_mode, segment_chars, max_concurrency,
+                    segment_gap_seconds, crossfade_seconds
+                )
+                audio_dict, report, _ = result
+                cache.put_audio(
+                    cache_key, audio_dict["waveform"][0], audio_dict["sample_rate"], extra={"report": report}
+                )
+                return result
             
-            # Configure the generation settings
-            generate_content_config = types.GenerateContentConfig(
-                temperature=1,
-                response_modalities=["audio"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name=voice_name
-                        )
-                    )
-                ),
+            return get_single_flight().run("GeminiTextToSpeech", model, api_key, cache_key, request)
+        
+        if stream_to_file:
+            try:
+                return self.generate_speech_file(
+                    api_key, model, text, voice_name, segment_chars, max_concurrency, segment_gap_seconds,
+                    crossfade_seconds, get_response_cache() if use_cache else None, cache_key, filename_prefix
+                )
+            except Exception as e:
+                print(f"Error generating speech: {str(e)}")
+                raise e
+        
+        # Without the cache, identical requests in flight are still shared, but their audio is not stored
+        return get_single_flight().run(
+            "GeminiTextToSpeech", model, api_key, uncached_key(cache_key), lambda: self.synthesize_speech(
+                api_key, model, text, voice_name, long_form_mode, segment_chars, max_concurrency,
+                segment_gap_seconds, crossfade_seconds
             )
-            
-            # Generate the audio content
-            audio_data = b""
-            for chunk in client.models.generate_content_stream(
-                model=model,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                if (
-                    chunk.candidates is None
-                    or chunk.candidates[0].content is None
-                    or chunk.candidates[0].content.parts is None
-                ):
-                    continue
+        )
+    
+    def synthesize_speech(self, api_key, model, text, voice_name, long_form_mode, segment_chars, max_concurrency,
+                          segment_gap_seconds, crossfade_seconds):
+        """Synthesize the text in memory, bypassing the response cache"""
+        try:
+            # Time each phase of the request when metrics are enabled
+            with track_call("GeminiTextToSpeech", model):
+                # Get the shared Gemini client for this API key
+                client = get_client(api_key)
                 
-                if (chunk.candidates[0].content.parts[0].inline_data and 
-                    chunk.candidates[0].content.parts[0].inline_data.data):
-                    inline_data = chunk.candidates[0].content.parts[0].inline_data
-                    data_buffer = inline_data.data
-                    
-                    # Convert to WAV if necessary
-                    file_extension = mimetypes.guess_extension(inline_data.mime_type)
-                    if file_extension is None or file_extension != ".wav":
-                        data_buffer = self.convert_to_wav(inline_data.data, inline_data.mime_type)
-                    
-                    audio_data += data_buffer
-            
-            if not audio_data:
-                raise ValueError("No audio data received from Gemini API")
-            
-            # Save to temporary file
-            temp_dir = folder_paths.get_temp_directory()
-            temp_file = tempfile.NamedTemporaryFile(
-                suffix=".wav", 
-                dir=temp_dir, 
-                delete=False
-            )
-            temp_file.write(audio_data)
-            temp_file.close()
-            
-            # Load the audio file using torchaudio
-            waveform, sample_rate = torchaudio.load(temp_file.name)
-            
-            # Clean up the temporary file
-            os.unlink(temp_file.name)
+                # Text too long for one request is split into segments that fit
+                long_form_mode, segment_chars = get_preflight().plan_text_segments(
+                    model, text, long_form_mode, segment_chars, client
+                )
+                segments = split_text(text, segment_chars) if long_form_mode else [text]
+                if not segments:
+                    raise ValueError("No text to synthesize")
+                
+                # Every segment shares one seed so the voice stays consistent across requests
+                seed = zlib.crc32(text.encode("utf-8")) & 0x7FFFFFFF if len(segments) > 1 else None
+                
+                t0 = time.perf_counter()
+                
+                def synthesize(segment):
+                    started = time.perf_counter() - t0
+                    waveform, sample_rate, timing = self.synthesize_segment(
+                        client, model, segment, voice_name, seed, api_key
+                    )
+                    timing["started"] = started
+                    return waveform, sample_rate, timing
+                
+                if len(segments) == 1 or max_concurrency <= 1:
+                    results = [synthesize(segment) for segment in segments]
+                else:
+                    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(segments))) as executor:
+                        results = list(executor.map(bind_context(synthesize), segments))
+                
+                sample_rates = {sample_rate for _, sample_rate, _ in results}
+                if len(sample_rates) > 1:
+                    raise ValueError(f"Segments came back at different sample rates: {sorted(sample_rates)}")
+                sample_rate = results[0][1]
+                
+                # Concatenate the segments in text order
+                with phase("join"):
+                    waveform = join_waveforms(
+                        [waveform for waveform, _, _ in results],
+                        sample_rate,
+                        gap_seconds=segment_gap_seconds,
+                        crossfade_seconds=crossfade_seconds,
+                    )
+                
+                report = self.format_synthesis_report(
+                    [timing for _, _, timing in results], time.perf_counter() - t0
+                )
+                if len(segments) > 1:
+                    print(report)
             
             # Return the audio in ComfyUI's expected format
             audio_dict = {
@@ -192,11 +446,79 @@ class GeminiTextToSpeech:
                 "sample_rate": sample_rate
             }
             
-            return (audio_dict,)
+            return (audio_dict, report, "")
             
         except Exception as e:
             print(f"Error generating speech: {str(e)}")
             raise e
+    
+    def generate_speech_file(self, api_key, model, text, voice_name, segment_chars, max_concurrency,
+                             segment_gap_seconds, crossfade_seconds, cache, cache_key, filename_prefix):
+        """Stream speech for the text into a WAV file and return it as a memory-mapped waveform"""
+        # The cache remembers where the file went; the audio itself stays on disk only
+        if cache is not None:
+            cached = cache.get_text(cache_key)
+            entry = json.loads(cached) if cached else None
+            if entry and os.path.exists(entry["path"]) and os.path.getsize(entry["path"]) == entry["size"]:
+                record_cache_hit("GeminiTextToSpeech", model)
+                audio_dict = {
+                    "waveform": open_wav_memmap(entry["path"], entry["frames"]),
+                    "sample_rate": entry["sample_rate"],
+                }
+                return (audio_dict, entry["report"] + "\n(served from cache)", entry["path"])
+            
+            # Identical requests with the same API key already in flight share one API call;
+            # the caller that sends it records the file
+            def request():
+                result = self.write_speech_file(
+                    api_key, model, text, voice_name, segment_chars, max_concurrency, segment_gap_seconds,
+                    crossfade_seconds, cache_key, filename_prefix
+                )
+                audio_dict, report, path = result
+                cache.put_text(cache_key, json.dumps({
+                    "path": path, "size": os.path.getsize(path), "frames": audio_dict["waveform"].shape[-1],
+                    "sample_rate": audio_dict["sample_rate"], "report": report,
+                }))
+                return result
+            
+            return get_single_flight().run("GeminiTextToSpeech", model, api_key, cache_key, request)
+        
+        # Without the cache, identical requests in flight still share one file, but it is not recorded
+        return get_single_flight().run(
+            "GeminiTextToSpeech", model, api_key, uncached_key(cache_key), lambda: self.write_speech_file(
+                api_key, model, text, voice_name, segment_chars, max_concurrency, segment_gap_seconds,
+                crossfade_seconds, cache_key, filename_prefix
+            )
+        )
+    
+    def write_speech_file(self, api_key, model, text, voice_name, segment_chars, max_concurrency,
+                          segment_gap_seconds, crossfade_seconds, cache_key, filename_prefix):
+        """Stream speech for the text into a new WAV file, bypassing the response cache"""
+        # Time each phase of the request when metrics are enabled
+        with track_call("GeminiTextToSpeech", model):
+            client = get_client(api_key)
+            
+            # Streaming always works in segments, so no single response has to hold the whole clip
+            _, segment_chars = get_preflight().plan_text_segments(model, text, True, segment_chars, client)
+            segments = split_text(text, segment_chars)
+            if not segments:
+                raise ValueError("No text to synthesize")
+            seed = zlib.crc32(text.encode("utf-8")) & 0x7FFFFFFF if len(segments) > 1 else None
+            
+            # A fresh name per run: waveforms of earlier runs may still map their files
+            path = new_output_path(filename_prefix, cache_key[:16])
+            t0 = time.perf_counter()
+            frames, sample_rate, timings = self.stream_speech_to_file(
+                client, model, segments, voice_name, seed, api_key, max_concurrency,
+                segment_gap_seconds, crossfade_seconds, path
+            )
+            report = self.format_synthesis_report(timings, time.perf_counter() - t0)
+            report += f"\nStreamed to {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)"
+            if len(segments) > 1:
+                print(report)
+        
+        audio_dict = {"waveform": open_wav_memmap(path, frames), "sample_rate": sample_rate}
+        return (audio_dict, report, path)
 
 
 # Node class mappings for ComfyUI
@@ -0,0 +1,126 @@
+"""
+Image helpers for multimodal Gemini requests
+
+ComfyUI passes images around as ``[B, H, W, C]`` float tensors in ``[0, 1]``;
+video loaders hand over their frames the same way, one batch item per frame.
+Before sending, the whole batch is converted to uint8 in one vectorized,
+cache-blocked pass. Each frame is then downscaled so its longest side fits
+``max_side`` and encoded to JPEG or WebP in memory. Pillow releases the GIL
+while resizing and encoding, so the frames of a batch are encoded on a small
+thread pool.
+
+Gemini bills images per 768 x 768 tile, so downscaling also caps the input
+tokens of every frame. torch and Pillow are imported inside the functions
+that use them, so importing this module stays cheap.
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from .rate_limiter import estimate_image_tokens
+
+
+# Upload formats offered by the Chat node: Pillow format name and MIME type
+IMAGE_UPLOAD_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# Longest side images are downscaled to by default; larger frames only cost more tiles
+DEFAULT_MAX_SIDE = 1024
+
+# Encoder quality, 1-100
+DEFAULT_IMAGE_QUALITY = 85
+
+# Frames encoded at once
+ENCODE_WORKERS = 4
+
+# Pixel values converted per block; 4 MB of float32 stays in cache
+CONVERT_BLOCK_ELEMENTS = 1 << 20
+
+
+def fit_size(height, width, max_side):
+    """Return the ``(height, width)`` that fits ``max_side`` without upscaling or changing the aspect ratio"""
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return height, width
+    scale = max_side / longest
+    return max(1, int(round(height * scale))), max(1, int(round(width * scale)))
+
+
+def estimate_batch_tokens(images, max_side=DEFAULT_MAX_SIDE):
+    """Input tokens of every frame in an image batch after downscaling, from its shape alone"""
+    if images is None:
+        return 0
+    height, width = fit_size(images.shape[-3], images.shape[-2], max_side)
+    frames = images.shape[0] if images.dim() > 3 else 1
+    return estimate_image_tokens(width, height) * frames
+
+
+def images_to_uint8(images):
+    """
+    Convert a ``[B, H, W, C]`` float batch in ``[0, 1]`` to a ``[B, H, W, 3]`` RGB uint8 numpy array.
+
+    The batch is scaled, rounded and clamped in one pass over blocks small
+    enough to stay in cache, reusing one float buffer instead of allocating a
+    float copy of the whole batch. Blocks are converted on the tensor's
+    device, so only uint8 pixels are copied to the CPU.
+    """
+    import torch
+
+    if images.dim() == 3:
+        images = images.unsqueeze(0)
+    channels = images.shape[-1]
+    if channels > 3:
+        # Gemini has no use for alpha
+        images = images[..., :3]
+
+    flat = images.reshape(-1)
+    pixels = torch.empty(flat.shape, dtype=torch.uint8)
+    buffer = torch.empty(min(CONVERT_BLOCK_ELEMENTS, flat.numel()), dtype=torch.float32, device=flat.device)
+    for start in range(0, flat.numel(), CONVERT_BLOCK_ELEMENTS):
+        block = flat[start:start + CONVERT_BLOCK_ELEMENTS]
+        scaled = buffer[:block.numel()]
+        torch.mul(block, 255.0, out=scaled)
+        scaled.add_(0.5).clamp_(0.0, 255.0)
+        pixels[start:start + block.numel()].copy_(scaled)
+    pixels = pixels.view(images.shape)
+    if channels == 1:
+        pixels = pixels.expand(-1, -1, -1, 3).contiguous()
+    return pixels.numpy()
+
+
+def encode_image(pixels, max_side=DEFAULT_MAX_SIDE, image_format="jpeg", quality=DEFAULT_IMAGE_QUALITY):
+    """Downscale one ``[H, W, 3]`` uint8 array to fit ``max_side`` and encode it into in-memory image bytes"""
+    from PIL import Image
+
+    pil_format, _ = IMAGE_UPLOAD_FORMATS[image_format]
+    image = Image.fromarray(pixels)
+    height, width = fit_size(image.height, image.width, max_side)
+    if (height, width) != (image.height, image.width):
+        # Box filtering averages every source pixel, the fastest Pillow filter that does not alias
+        image = image.resize((width, height), Image.Resampling.BOX)
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_images(images, max_side=DEFAULT_MAX_SIDE, image_format="jpeg", quality=DEFAULT_IMAGE_QUALITY):
+    """
+    Encode every frame of a ComfyUI image batch for upload.
+
+    Returns ``(encoded, mime_type)``, with one bytes object per frame in batch
+    order.
+    """
+    if image_format not in IMAGE_UPLOAD_FORMATS:
+        raise ValueError(f"Unsupported image format '{image_format}'")
+    _, mime_type = IMAGE_UPLOAD_FORMATS[image_format]
+
+    pixels = images_to_uint8(images)
+    if len(pixels) == 1:
+        return [encode_image(pixels[0], max_side, image_format, quality)], mime_type
+
+    # Pillow releases the GIL while resizing and encoding, so frames are encoded side by side
+    with ThreadPoolExecutor(max_workers=min(ENCODE_WORKERS, len(pixels))) as executor:
+        encoded = list(executor.map(lambda frame: encode_image(frame, max_side, image_format, quality), pixels))
+    return encoded, mime_type
@@ -0,0 +1,178 @@
+"""
+Long-audio helpers for the Speech To Text node
+
+Long recordings are split into overlapping windows whose boundaries are moved
+to the quietest nearby frame, transcribed concurrently, and the partial
+transcripts are stitched back together with the words repeated in the overlap
+removed. Nothing here talks to the API directly, so splitting and stitching
+can be exercised offline with any transcription callable.
+"""
+
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Length of the analysis frames used to find quiet split points
+FRAME_SECONDS = 0.02
+
+# How far before the nominal boundary to look for a quiet split point
+SILENCE_SEARCH_SECONDS = 3.0
+
+# Number of words at each seam compared when removing duplicated text
+STITCH_WINDOW_WORDS = 40
+
+# Shortest run of matching words treated as a genuine overlap
+MIN_STITCH_MATCH_WORDS = 2
+
+# Words at either side of a seam that may be clipped by the cut and are left out of the match
+SEAM_SLACK_WORDS = 1
+
+
+AudioWindow = namedtuple("AudioWindow", ["index", "start", "end", "waveform"])
+
+
+def frame_energy(waveform, frame_size):
+    """Return the mean energy of consecutive non-overlapping frames of a ``[1, T]`` waveform."""
+    samples = waveform.reshape(-1)
+    num_frames = samples.shape[0] // frame_size
+    if num_frames == 0:
+        return samples.new_zeros(0)
+    frames = samples[: num_frames * frame_size].view(num_frames, frame_size)
+    return frames.pow(2).mean(dim=1)
+
+
+def find_split_points(waveform, sample_rate, chunk_seconds, search_seconds=SILENCE_SEARCH_SECONDS):
+    """
+    Choose cut points roughly ``chunk_seconds`` apart, snapped to silence.
+
+    Each nominal boundary is moved to the lowest-energy frame within
+    ``search_seconds`` before it. Returns sample offsets including 0 and the
+    total length.
+    """
+    total = waveform.shape[-1]
+    chunk_size = int(chunk_seconds * sample_rate)
+    if chunk_size <= 0 or total <= chunk_size:
+        return [0, total]
+
+    frame_size = max(1, int(FRAME_SECONDS * sample_rate))
+    energy = frame_energy(waveform, frame_size)
+    search_frames = max(1, int(search_seconds * sample_rate) // frame_size)
+
+    cuts = [0]
+    while total - cuts[-1] > chunk_size:
+        nominal_frame = (cuts[-1] + chunk_size) // frame_size
+        # Never search back past the previous cut, so every window makes progress
+        lowest_frame = max(cuts[-1] // frame_size + 1, nominal_frame - search_frames)
+        window = energy[lowest_frame:nominal_frame + 1]
+        if window.numel() == 0:
+            cut = cuts[-1] + chunk_size
+        else:
+            cut = (lowest_frame + int(window.argmin())) * frame_size
+        cuts.append(min(cut, total))
+    cuts.append(total)
+    return cuts
+
+
+def split_waveform(waveform, sample_rate, chunk_seconds, overlap_seconds):
+    """
+    Split a ``[channels, samples]`` waveform into overlapping windows.
+
+    Each window after the first starts ``overlap_seconds`` before its cut
+    point so words straddling a cut are heard in full by at least one
+    request. Window waveforms are views, not copies.
+    """
+    cuts = find_split_points(waveform, sample_rate, chunk_seconds)
+    overlap = int(overlap_seconds * sample_rate)
+
+    windows = []
+    for index, (cut_start, cut_end) in enumerate(zip(cuts[:-1], cuts[1:])):
+        start = max(0, cut_start - overlap) if index > 0 else 0
+        windows.append(AudioWindow(index, start, cut_end, waveform[..., start:cut_end]))
+    return windows
+
+
+def _normalize_word(word):
+    """Lowercase a word and strip punctuation so seams match across chunks."""
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _seam_overlap(previous, following, window_words, min_match, slack_words):
+    """
+    Find the words shared by the end of one chunk and the start of the next.
+
+    Only a run that ends within ``slack_words`` of the end of ``previous``
+    and starts within ``slack_words`` of the start of ``following`` counts,
+    so a phrase that merely recurs elsewhere in either chunk never matches.
+    The slack absorbs a word clipped at a cut, heard in part by one request
+    and in full by the other. Returns ``(kept, skipped)``: how many words of
+    ``previous`` to keep and how many of ``following`` to drop, or None when
+    the chunks do not overlap.
+    """
+    tail = [_normalize_word(w) for w in previous[-window_words:]]
+    head = [_normalize_word(w) for w in following[:window_words]]
+
+    best = None
+    for trim in range(min(slack_words, len(tail)) + 1):
+        for skip in range(min(slack_words, len(head)) + 1):
+            longest = min(len(tail) - trim, len(head) - skip)
+            # The longest run found so far wins; fewer slack words break ties
+            for size in range(longest, min_match - 1, -1):
+                if best is not None and (size < best[0] or (size == best[0] and trim + skip >= best[1])):
+                    break
+                if tail[len(tail) - trim - size:len(tail) - trim] == head[skip:skip + size]:
+                    best = (size, trim + skip, trim, skip)
+                    break
+    if best is None:
+        return None
+    size, _, trim, skip = best
+    return len(previous) - trim, skip + size
+
+
+def stitch_transcripts(transcripts, window_words=STITCH_WINDOW_WORDS, min_match=MIN_STITCH_MATCH_WORDS,
+                       slack_words=SEAM_SLACK_WORDS):
+    """
+    Join ordered chunk transcripts, dropping words repeated across overlaps.
+
+    A suffix of the text so far, within the last ``window_words`` words, is
+    aligned with a prefix of the next chunk. When at least ``min_match``
+    words line up, the shared words are kept once and the next chunk
+    continues after them. Otherwise the chunks are simply joined with a
+    space, so no words are lost. An empty transcript breaks the seam: the
+    chunk after it shares no audio with the text so far and is appended
+    whole.
+    """
+    words = []
+    seam_open = False
+    for transcript in transcripts:
+        next_words = (transcript or "").split()
+        if not next_words:
+            seam_open = False
+            continue
+        if not seam_open:
+            words = words + next_words
+            seam_open = True
+            continue
+
+        seam = _seam_overlap(words, next_words, window_words, min_match, slack_words)
+        if seam is None:
+            words = words + next_words
+        else:
+            kept, skipped = seam
+            words = words[:kept] + next_words[skipped:]
+
+    return " ".join(words)
+
+
+def transcribe_windows(windows, transcribe_fn, max_workers=4):
+    """
+    Transcribe windows concurrently with a bounded pool.
+
+    ``transcribe_fn`` receives one ``AudioWindow`` and returns its text.
+    Results are returned in window order regardless of completion order.
+    """
+    if len(windows) <= 1 or max_workers <= 1:
+        return [transcribe_fn(window) for window in windows]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as executor:
+        return list(executor.map(transcribe_fn, windows))
@@ -0,0 +1,346 @@
+"""
+In-process performance metrics for the Gemini nodes
+
+When enabled (``GEMINI_HUB_METRICS=1``), every node execution that reaches the
+API is recorded as one call. A call holds the time spent in each phase
+(encode, upload, request, decode, ...), the time to the first streamed
+chunk, payload sizes and the ``usage_metadata`` token counts. Calls feed
+per-node, per-model counters and histograms that can be exported in
+Prometheus text format, and the most recent calls can be exported as JSON
+lines (and optionally appended to ``GEMINI_HUB_METRICS_LOG``).
+
+When disabled, ``track_call`` records nothing and ``phase`` returns a shared
+null context, so instrumented code pays one context variable lookup per
+phase.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Upper bounds of the duration histogram buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Number of finished calls kept for the JSON lines export
+RECENT_CALLS = 500
+
+# usage_metadata fields summed into the token counters
+USAGE_FIELDS = {
+    "prompt_token_count": "prompt",
+    "candidates_token_count": "candidates",
+    "cached_content_token_count": "cached",
+    "thoughts_token_count": "thoughts",
+    "total_token_count": "total",
+}
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_current_call = contextvars.ContextVar("gemini_hub_call", default=None)
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+_enabled = _env_flag("GEMINI_HUB_METRICS")
+
+
+def metrics_enabled():
+    """True when calls are being recorded."""
+    return _enabled
+
+
+def set_metrics_enabled(enabled):
+    """Turn recording on or off at runtime."""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+class _Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters, histograms and recent call records.
+
+    Series are keyed by metric name plus a sorted tuple of label pairs.
+    """
+
+    def __init__(self, recent_calls=RECENT_CALLS, log_path=None):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._recent = deque(maxlen=recent_calls)
+        self.log_path = log_path if log_path is not None else os.environ.get("GEMINI_HUB_METRICS_LOG")
+
+    def inc(self, name, amount=1, **labels):
+        """Add ``amount`` to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        """Record one value in a duration histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def record_call(self, record):
+        """Fold a finished call record into the counters and histograms."""
+        labels = {"node": record["node"], "model": record["model"]}
+        self.inc("gemini_hub_calls_total", status=record["status"], **labels)
+        self.observe("gemini_hub_call_duration_seconds", record["duration"], **labels)
+        if record["first_chunk"] is not None:
+            self.observe("gemini_hub_time_to_first_chunk_seconds", record["first_chunk"], **labels)
+        for phase_name, seconds in record["phases"].items():
+            self.observe("gemini_hub_phase_duration_seconds", seconds, phase=phase_name, **labels)
+        for direction in ("sent", "received"):
+            if record[f"bytes_{direction}"]:
+                self.inc("gemini_hub_payload_bytes_total", record[f"bytes_{direction}"],
+                         direction=direction, **labels)
+        for kind, tokens in record["tokens"].items():
+            self.inc("gemini_hub_tokens_total", tokens, kind=kind, **labels)
+
+        with self._lock:
+            self._recent.append(record)
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                print(f"Could not append Gemini Hub metrics log: {str(e)}")
+
+    def to_prometheus(self):
+        """Render every series in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), counts, total, count in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(DURATION_BUCKETS + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_jsonl(self):
+        """Return the most recent call records as JSON lines."""
+        with self._lock:
+            records = list(self._recent)
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def recent_calls(self):
+        """Return a copy of the most recent call records, oldest first."""
+        with self._lock:
+            return list(self._recent)
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._recent.clear()
+
+
+class CallMetrics:
+    """Measurements for one node execution; safe to update from worker threads"""
+
+    def __init__(self, node, model):
+        self.node = node
+        self.model = model
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._wall_started = time.time()
+        self.phases = {}
+        self.first_chunk = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tokens = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def mark_first_chunk(self, request_started):
+        if self.first_chunk is None:
+            with self._lock:
+                if self.first_chunk is None:
+                    self.first_chunk = time.perf_counter() - request_started
+
+    def add_bytes(self, sent=0, received=0):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+    def record_usage(self, usage_metadata):
+        if usage_metadata is None:
+            return
+        with self._lock:
+            for field, kind in USAGE_FIELDS.items():
+                value = getattr(usage_metadata, field, None)
+                if value:
+                    self.tokens[kind] = self.tokens.get(kind, 0) + value
+
+    def finish(self, status):
+        """Return the finished call as a JSON-serializable record."""
+        with self._lock:
+            return {
+                "timestamp": self._wall_started,
+                "node": self.node,
+                "model": self.model,
+                "status": status,
+                "duration": time.perf_counter() - self._started,
+                "first_chunk": self.first_chunk,
+                "phases": dict(self.phases),
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "tokens": dict(self.tokens),
+            }
+
+
+# Registry shared by all nodes in this package
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry():
+    """Return the process-wide metrics registry."""
+    return _registry
+
+
+@contextlib.contextmanager
+def track_call(node, model):
+    """Record everything inside the block as one call of ``node`` with ``model``."""
+    if not _enabled:
+        yield None
+        return
+    call = CallMetrics(node, model)
+    token = _current_call.set(call)
+    status = "error"
+    try:
+        yield call
+        status = "ok"
+    finally:
+        _current_call.reset(token)
+        _registry.record_call(call.finish(status))
+
+
+def phase(name):
+    """Time a block as phase ``name`` of the current call, if any."""
+    call = _current_call.get()
+    return call.phase(name) if call is not None else _NULL_CONTEXT
+
+
+def mark_first_chunk(request_started):
+    """Note that the first streamed chunk arrived, ``request_started`` being a ``perf_counter`` value."""
+    call = _current_call.get()
+    if call is not None:
+        call.mark_first_chunk(request_started)
+
+
+def add_bytes(sent=0, received=0):
+    """Add payload sizes to the current call."""
+    call = _current_call.get()
+    if call is not None:
+        call.add_bytes(sent, received)
+
+
+def record_usage(usage_metadata):
+    """Add a response's ``usage_metadata`` token counts to the current call."""
+    call = _current_call.get()
+    if call is not None:
+        call.record_usage(usage_metadata)
+
+
+def record_cache_hit(node, model):
+    """Count a request answered from the response cache."""
+    if _enabled:
+        _registry.inc("gemini_hub_cache_hits_total", node=node, model=model)
+
+
+def record_deduplicated(node, model):
+    """Count a request that joined an identical one already in flight."""
+    if _enabled:
+        _registry.inc("gemini_hub_deduplicated_total", node=node, model=model)
+
+
+def bind_context(fn):
+    """Wrap ``fn`` so worker threads record into the caller's current call."""
+    if _current_call.get() is None:
+        return fn
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        # Each worker needs its own copy: one Context cannot be entered twice at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return bound
+
+
+def register_metrics_route():
+    """Serve the metrics at ``/gemini_hub/metrics`` when running inside ComfyUI with metrics on."""
+    if not _enabled:
+        return False
+    try:
+        from aiohttp import web
+        from server import PromptServer
+        routes = PromptServer.instance.routes
+    except (ImportError, AttributeError):
+        return False
+
+    @routes.get("/gemini_hub/metrics")
+    async def gemini_hub_metrics(request):
+        if request.rel_url.query.get("format") == "jsonl":
+            return web.Response(text=_registry.to_jsonl(), content_type="application/x-ndjson")
+        return web.Response(text=_registry.to_prometheus(), content_type="text/plain")
+
+    return True
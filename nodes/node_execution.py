@@ -0,0 +1,217 @@
+"""
+Concurrent execution of independent Gemini nodes in one workflow
+
+Node functions block on network I/O, so a graph with several Gemini nodes
+would otherwise spend their request times back to back.
+
+ComfyUI builds with async node support (those shipping
+``comfy_execution.utils``) await coroutine node functions and run
+independent ones concurrently. On those builds every Gemini node's FUNCTION
+is ``run_async``, which awaits the blocking implementation on a worker
+thread; the Chat node streams through ``client.aio`` instead.
+
+Older builds execute nodes one at a time, but call ``IS_CHANGED`` for every
+node before executing any. With ``GEMINI_HUB_PREFETCH=1`` set, ``IS_CHANGED``
+there hands nodes whose inputs are all known, none of them linked to a node
+that has not run yet, to a background dispatcher, which starts the request
+right away; FUNCTION is ``run_dispatched``, which joins the prefetched result
+when ComfyUI reaches the node, or runs the node inline when nothing was
+prefetched for the same inputs.
+
+Prefetching is off by default: ComfyUI also calls ``IS_CHANGED`` for nodes
+it then serves from its own output cache or never runs, and a request
+started for those is paid for and thrown away. Even when enabled, inputs
+that already ran in this process are not prefetched again unless the node
+re-runs every time (``use_cache`` off), and nodes with ``PREFETCH = False``
+(long-running jobs, index searches, file output) are never prefetched.
+"""
+
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import bind_context
+
+
+# Worker threads shared by async node functions and prefetched requests
+MAX_WORKERS = 16
+
+# Prefetched results nobody claimed within this many seconds are dropped
+PREFETCH_TTL_SECONDS = 600.0
+
+# Inputs of executed nodes remembered, so ComfyUI's cached nodes are not prefetched again
+MAX_EXECUTED_KEYS = 4096
+
+
+def _comfy_supports_async_nodes():
+    """True inside a ComfyUI build that awaits coroutine node functions."""
+    try:
+        return importlib.util.find_spec("comfy_execution.utils") is not None
+    except (ImportError, ValueError):
+        return False
+
+
+COMFY_ASYNC_NODES = _comfy_supports_async_nodes()
+
+
+def prefetch_enabled():
+    """True when IS_CHANGED may start requests ahead of execution; opt-in with GEMINI_HUB_PREFETCH=1."""
+    return os.environ.get("GEMINI_HUB_PREFETCH", "0").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _dispatch_key(node_class, kwargs):
+    """Hash of a node class and its inputs, or None when an input is not a plain widget value."""
+    try:
+        payload = json.dumps([node_class.__name__, kwargs], sort_keys=True, allow_nan=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RequestDispatcher:
+    """
+    Runs blocking node work on a shared thread pool, ahead of time when possible.
+
+    Prefetched results are keyed by node class and inputs; each one is handed
+    out at most once. The inputs of every execution are remembered, so a node
+    ComfyUI is about to serve from its own cache is not prefetched again.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, ttl=PREFETCH_TTL_SECONDS, clock=time.monotonic):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._executor = None
+        self._prefetched = {}
+        self._executed = OrderedDict()
+        self._stats = {"prefetched": 0, "joined": 0, "expired": 0, "skipped": 0}
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gemini-hub")
+            return self._executor
+
+    def _expire(self, now):
+        """Drop prefetched results older than the TTL. Caller holds the lock."""
+        expired = [key for key, (_, started) in self._prefetched.items() if now - started > self.ttl]
+        for key in expired:
+            self._prefetched.pop(key)[0].cancel()
+        self._stats["expired"] += len(expired)
+
+    def prefetch(self, node_class, kwargs, rerun=False):
+        """
+        Start ``node_class``'s blocking function with ``kwargs`` unless it is already running.
+
+        Inputs that already executed are skipped, as ComfyUI serves those from
+        its output cache, unless ``rerun`` says the node runs every time.
+        """
+        key = _dispatch_key(node_class, kwargs)
+        if key is None:
+            return False
+        executor = self.executor
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            if key in self._prefetched:
+                return False
+            if not rerun and key in self._executed:
+                self._stats["skipped"] += 1
+                return False
+            function = getattr(node_class(), node_class.EXECUTE)
+            self._prefetched[key] = (executor.submit(functools.partial(function, **kwargs)), now)
+            self._stats["prefetched"] += 1
+        return True
+
+    def take(self, node_class, kwargs):
+        """Return the future of a prefetched call with exactly these inputs, or None."""
+        key = _dispatch_key(node_class, kwargs)
+        if key is None:
+            return None
+        with self._lock:
+            # ComfyUI runs a node for these inputs now, so it caches the outputs for them
+            self._executed[key] = True
+            self._executed.move_to_end(key)
+            while len(self._executed) > MAX_EXECUTED_KEYS:
+                self._executed.popitem(last=False)
+            entry = self._prefetched.pop(key, None)
+            if entry is not None:
+                self._stats["joined"] += 1
+        return entry[0] if entry is not None else None
+
+    def stats(self):
+        """Return how many calls were prefetched, joined, dropped unclaimed and skipped as already executed."""
+        with self._lock:
+            return dict(self._stats, pending=len(self._prefetched))
+
+
+# Dispatcher shared by all nodes in this package
+_dispatcher = RequestDispatcher()
+
+
+def get_dispatcher():
+    """Return the shared request dispatcher."""
+    return _dispatcher
+
+
+def prefetchable(input_types, kwargs):
+    """
+    True when ``kwargs`` holds a value for every input, so the node can run from them as they are.
+
+    ComfyUI passes a linked input to IS_CHANGED as None before the node
+    feeding it has run, so any None rules prefetching out. Optional inputs
+    left unconnected are absent both here and at execution and do not count.
+    """
+    for name in input_types.get("required", {}):
+        if kwargs.get(name) is None:
+            return False
+    return all(kwargs[name] is not None for name in input_types.get("optional", {}) if name in kwargs)
+
+
+class GeminiNodeExecution:
+    """
+    Mixin for Gemini nodes: async execution where ComfyUI supports it, prefetching otherwise.
+
+    Subclasses name their blocking implementation in ``EXECUTE``, set
+    ``FUNCTION = NODE_FUNCTION`` and call ``prefetch`` from ``IS_CHANGED``.
+    Nodes whose work must only happen when ComfyUI really runs them set
+    ``PREFETCH = False``.
+    """
+
+    EXECUTE = None
+    PREFETCH = True
+
+    @classmethod
+    def prefetch(cls, kwargs):
+        """Start the request from IS_CHANGED when prefetching is on and every input's value is already known."""
+        if COMFY_ASYNC_NODES or not cls.PREFETCH or not prefetch_enabled():
+            return False
+        if not prefetchable(cls.INPUT_TYPES(), kwargs):
+            return False
+        # With caching off IS_CHANGED returns NaN, so ComfyUI runs the node again every time
+        return get_dispatcher().prefetch(cls, kwargs, rerun=not kwargs.get("use_cache", True))
+
+    def run_dispatched(self, **kwargs):
+        """Join the prefetched result for these inputs, or run the node now"""
+        future = get_dispatcher().take(type(self), kwargs)
+        if future is not None:
+            return future.result()
+        return getattr(self, self.EXECUTE)(**kwargs)
+
+    async def run_async(self, **kwargs):
+        """Run the blocking implementation on a worker thread so other nodes can proceed"""
+        function = bind_context(functools.partial(getattr(self, self.EXECUTE), **kwargs))
+        return await asyncio.get_running_loop().run_in_executor(get_dispatcher().executor, function)
+
+
+# FUNCTION of every Gemini node on this ComfyUI build
+NODE_FUNCTION = "run_async" if COMFY_ASYNC_NODES else "run_dispatched"
@@ -0,0 +1,226 @@
+"""
+Pre-flight size and token checks for Gemini requests
+
+Before a node encodes or uploads anything, the payload size and input tokens
+of the request are estimated from what is already known: text length, audio
+duration and upload format. A request over the model's limits either fails
+fast with an actionable message or is routed to a path that can carry it:
+sentence segments for Text To Speech, the Files API or overlapping chunks
+for Speech To Text.
+
+Estimates are local by default. With ``GEMINI_HUB_PREFLIGHT=count_tokens``,
+text requests that come close to a limit are counted exactly through the
+``count_tokens`` endpoint, and model limits are read from the models
+endpoint; both are cached per model. ``GEMINI_HUB_PREFLIGHT=off`` disables
+the checks. Audio is always estimated locally, since counting it exactly
+would mean uploading it.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from .audio_utils import OPUS_BIT_RATE
+from .metrics import phase
+from .rate_limiter import AUDIO_TOKENS_PER_SECOND, CHARS_PER_TOKEN, estimate_audio_tokens, estimate_text_tokens
+
+
+# local, count_tokens or off
+PREFLIGHT_ENV = "GEMINI_HUB_PREFLIGHT"
+
+# Input token limits of the offered models; anything else gets the default
+DEFAULT_INPUT_TOKEN_LIMIT = 1048576
+MODEL_INPUT_TOKEN_LIMITS = {
+    "gemini-2.5-flash-preview-tts": 8192,
+    "gemini-2.5-pro-preview-tts": 8192,
+}
+
+# Largest file the Files API accepts
+FILES_API_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Share of a limit that routed requests aim for, leaving room for estimation error
+TARGET_FRACTION = 0.9
+
+# Local estimates above this share of the limit are confirmed with count_tokens
+EXACT_COUNT_FRACTION = 0.5
+
+# Exact counts remembered per model
+MAX_CACHED_COUNTS = 1024
+
+
+def estimate_encoded_bytes(seconds, sample_rate, audio_format):
+    """Upper bound of the encoded size of mono speech audio, without encoding it"""
+    if audio_format == "ogg_opus":
+        return int(seconds * OPUS_BIT_RATE / 8) + 4096
+    # FLAC never grows past 16-bit PCM by more than its framing, and falls back to WAV anyway
+    return int(seconds * sample_rate) * 2 + 4096
+
+
+class PreflightChecker:
+    """Estimates request sizes and routes or rejects oversize requests; thread-safe"""
+
+    def __init__(self, mode=None, max_cached_counts=MAX_CACHED_COUNTS):
+        self.mode = (mode if mode is not None else os.environ.get(PREFLIGHT_ENV, "local")).strip().lower()
+        self.max_cached_counts = max_cached_counts
+        self._lock = threading.Lock()
+        self._limits = {}
+        self._counts = OrderedDict()
+        self._stats = {"local": 0, "counted": 0, "cached": 0}
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def exact(self):
+        return self.mode == "count_tokens"
+
+    def input_token_limit(self, model, client=None):
+        """Return the model's input token limit, asking the API once per model in count_tokens mode."""
+        with self._lock:
+            if model in self._limits:
+                return self._limits[model]
+        limit = MODEL_INPUT_TOKEN_LIMITS.get(model, DEFAULT_INPUT_TOKEN_LIMIT)
+        if self.exact and client is not None:
+            try:
+                limit = client.models.get(model=model).input_token_limit or limit
+            except Exception as e:
+                print(f"Could not read the input token limit of '{model}', assuming {limit}: {str(e)}")
+        with self._lock:
+            self._limits[model] = limit
+        return limit
+
+    def count_text_tokens(self, model, texts, client=None, limit=None):
+        """Input tokens of some text: a local estimate, confirmed with count_tokens when close to the limit."""
+        texts = [text for text in texts if text]
+        tokens = estimate_text_tokens(*texts)
+        if not (self.exact and client is not None and limit and tokens >= limit * EXACT_COUNT_FRACTION):
+            with self._lock:
+                self._stats["local"] += 1
+            return tokens
+
+        digest = hashlib.sha256()
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+        key = (model, digest.hexdigest())
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                self._stats["cached"] += 1
+                return self._counts[key]
+
+        try:
+            with phase("preflight"):
+                tokens = client.models.count_tokens(model=model, contents="\n\n".join(texts)).total_tokens or tokens
+        except Exception as e:
+            print(f"count_tokens failed for '{model}', using the local estimate: {str(e)}")
+            return tokens
+        with self._lock:
+            self._counts[key] = tokens
+            self._stats["counted"] += 1
+            while len(self._counts) > self.max_cached_counts:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def check_text(self, model, texts, client=None, what="request", media_tokens=0):
+        """
+        Raise ValueError when text will not fit the model's input; return the token count.
+
+        ``media_tokens`` are added for images or other media sent with the text.
+        """
+        if not self.enabled:
+            return 0
+        limit = self.input_token_limit(model, client)
+        tokens = self.count_text_tokens(model, texts, client, limit) + media_tokens
+        if tokens > limit:
+            if media_tokens >= tokens - limit:
+                advice = f"Send fewer or smaller images; they take about {media_tokens:,} tokens."
+            else:
+                advice = f"Shorten it by about {(tokens - limit) * CHARS_PER_TOKEN:,} characters before sending."
+            raise ValueError(
+                f"The {what} is about {tokens:,} tokens but '{model}' accepts {limit:,} input tokens. {advice}"
+            )
+        return tokens
+
+    def plan_text_segments(self, model, text, long_form_mode, segment_chars, client=None):
+        """
+        Decide whether text needs to be split into segments to fit the model's input.
+
+        Returns ``(long_form_mode, segment_chars)``, switching long-form mode
+        on and shrinking segments when the text or a segment is too large.
+        """
+        if not self.enabled:
+            return long_form_mode, segment_chars
+        limit = self.input_token_limit(model, client)
+        max_chars = max(1, int(limit * TARGET_FRACTION) * CHARS_PER_TOKEN)
+        if not long_form_mode:
+            tokens = self.count_text_tokens(model, [text], client, limit)
+            if tokens <= limit:
+                return long_form_mode, segment_chars
+            print(f"Pre-flight: text is about {tokens:,} tokens, over the {limit:,} accepted by '{model}'; "
+                  f"splitting it into segments of up to {min(segment_chars, max_chars):,} characters")
+            return True, min(segment_chars, max_chars)
+        return long_form_mode, min(segment_chars, max_chars)
+
+    def plan_audio_upload(self, model, seconds, sample_rate, audio_format, long_audio_mode, chunk_seconds,
+                          overlap_seconds=0.0, instruction="", client=None):
+        """
+        Decide how a clip must be sent before it is encoded.
+
+        Returns ``(long_audio_mode, chunk_seconds)``. A clip whose tokens or
+        encoded size cannot fit one request is switched to chunks that fit.
+        Clips that fit but are over the inline limit still go through the
+        Files API, decided by their actual encoded size.
+        """
+        if not self.enabled:
+            return long_audio_mode, chunk_seconds
+        limit = self.input_token_limit(model, client)
+        instruction_tokens = estimate_text_tokens(instruction)
+        bytes_per_second = max(1, estimate_encoded_bytes(1.0, sample_rate, audio_format) - 4096)
+
+        # Longest chunk (with its overlap) that fits both the token limit and the Files API
+        max_seconds = min(
+            (limit * TARGET_FRACTION - instruction_tokens) / AUDIO_TOKENS_PER_SECOND,
+            FILES_API_MAX_BYTES * TARGET_FRACTION / bytes_per_second,
+        )
+        if max_seconds <= overlap_seconds + 1:
+            raise ValueError(
+                f"'{model}' accepts at most {max_seconds:.0f}s of audio per request, "
+                f"less than the {overlap_seconds}s chunk overlap. Lower overlap_seconds."
+            )
+
+        if not long_audio_mode:
+            tokens = estimate_audio_tokens(seconds) + instruction_tokens
+            size = estimate_encoded_bytes(seconds, sample_rate, audio_format)
+            if tokens <= limit and size <= FILES_API_MAX_BYTES:
+                return False, chunk_seconds
+            print(f"Pre-flight: {seconds:.0f}s of audio is about {tokens:,} tokens and {size / 2 ** 20:,.0f} MB, "
+                  f"over what one '{model}' request accepts; transcribing it in chunks")
+            long_audio_mode = True
+
+        fitting = int(max_seconds - overlap_seconds)
+        if chunk_seconds > fitting:
+            print(f"Pre-flight: shortening chunks from {chunk_seconds}s to {fitting}s to fit '{model}'")
+            chunk_seconds = fitting
+        return long_audio_mode, chunk_seconds
+
+    def stats(self):
+        """Return how many token counts were local, counted through the API, or cached."""
+        with self._lock:
+            return dict(self._stats, models=len(self._limits))
+
+
+# Checker shared by all nodes in this package
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def get_preflight():
+    """Return the shared pre-flight checker, created on first use."""
+    global _checker
+    with _checker_lock:
+        if _checker is None:
+            _checker = PreflightChecker()
+        return _checker
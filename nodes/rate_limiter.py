@@ -0,0 +1,332 @@
+"""
+Shared rate limiting and retry scheduling for Gemini requests
+
+Every node sends its API calls through one ``RequestScheduler``. It keeps a
+requests-per-minute and a tokens-per-minute token bucket for each
+(API key, model) pair, so concurrent ComfyUI executions share the quota
+smoothly. Quota (429) and overload (500/503) responses are retried with
+jittered exponential backoff, never sooner than the server's retry-after
+hint. A 429 also starts a cooldown for its (API key, model) pair, limits
+configured or not, so every caller sharing the quota pauses, not just the
+one that was refused.
+
+Clock, sleep and randomness are injectable so the behavior can be tested
+with a fake clock and a stub client.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from .metrics import phase
+
+
+# HTTP status codes worth retrying: quota, internal error, overload, gateway timeouts
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Default limits; 0 means unlimited. Override with GEMINI_HUB_RPM / GEMINI_HUB_TPM
+# or per model with GEMINI_HUB_RATE_LIMITS='{"model": {"rpm": 10, "tpm": 250000}}'
+DEFAULT_REQUESTS_PER_MINUTE = 0
+DEFAULT_TOKENS_PER_MINUTE = 0
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+# Rough characters-per-token ratio used for local estimates
+CHARS_PER_TOKEN = 4
+
+# Gemini bills audio input at a fixed rate per second
+AUDIO_TOKENS_PER_SECOND = 32
+
+# Images are billed per 768 x 768 tile; images with both sides up to 384 pixels are one tile
+IMAGE_TOKENS_PER_TILE = 258
+IMAGE_TILE_SIDE = 768
+IMAGE_SMALL_SIDE = 384
+
+
+def estimate_text_tokens(*texts):
+    """Cheap local estimate of the input tokens for some text."""
+    return sum(len(text or "") for text in texts) // CHARS_PER_TOKEN + 1
+
+
+def estimate_audio_tokens(seconds):
+    """Input tokens for an audio clip of the given length."""
+    return int(seconds * AUDIO_TOKENS_PER_SECOND)
+
+
+def estimate_image_tokens(width, height):
+    """Input tokens for one image: small images are one tile, larger ones are billed per tile."""
+    if width <= IMAGE_SMALL_SIDE and height <= IMAGE_SMALL_SIDE:
+        return IMAGE_TOKENS_PER_TILE
+    return -(-width // IMAGE_TILE_SIDE) * -(-height // IMAGE_TILE_SIDE) * IMAGE_TOKENS_PER_TILE
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``rate_per_minute``.
+
+    ``reserve`` always deducts immediately and returns how long the caller has
+    to wait for the deducted tokens to exist. Callers are therefore served in
+    reservation order, and both threads and coroutines can use the same
+    bucket.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take ``amount`` tokens and return the seconds to wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reported the quota exhausted."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = self._clock()
+
+
+def _status_code(error):
+    """Return the HTTP status of an API error, if it carries one."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable_error(error):
+    """True for quota, overload and transient network errors."""
+    import httpx
+
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS_CODES
+
+
+def _parse_seconds(value):
+    """Parse durations such as ``"37s"``, ``"1.5s"`` or ``"12"``."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*s?\s*", str(value))
+    return float(match.group(1)) if match else None
+
+
+def retry_after_hint(error):
+    """Return the server-suggested delay in seconds, or None."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        try:
+            delay = _parse_seconds(headers.get("retry-after", ""))
+        except AttributeError:
+            delay = None
+        if delay is not None:
+            return delay
+
+    # google.rpc.RetryInfo carries a "retryDelay" such as "37s" in the error details
+    details = getattr(error, "details", None)
+    match = re.search(r'"retryDelay"\s*:\s*"([^"]+)"', json.dumps(details, default=str)) if details else None
+    if match is None:
+        match = re.search(r"retry(?:Delay| in)[\"':\s]+(\d+(?:\.\d+)?)s", str(error), re.IGNORECASE)
+    return _parse_seconds(match.group(1)) if match else None
+
+
+def _load_model_limits():
+    """Read per-model limits from GEMINI_HUB_RATE_LIMITS."""
+    try:
+        return json.loads(os.environ.get("GEMINI_HUB_RATE_LIMITS", "") or "{}")
+    except ValueError:
+        print("Ignoring GEMINI_HUB_RATE_LIMITS: not valid JSON")
+        return {}
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+class RequestScheduler:
+    """
+    Rate limiter and retry loop shared by every Gemini request.
+
+    ``call`` runs a blocking function and ``call_async`` awaits a coroutine
+    factory; both wait for their share of the (API key, model) budget before
+    every attempt and retry retryable failures.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, model_limits=None,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 clock=time.monotonic, sleep=time.sleep, async_sleep=asyncio.sleep, rand=random.random):
+        self.requests_per_minute = (
+            requests_per_minute if requests_per_minute is not None
+            else _env_int("GEMINI_HUB_RPM", DEFAULT_REQUESTS_PER_MINUTE)
+        )
+        self.tokens_per_minute = (
+            tokens_per_minute if tokens_per_minute is not None
+            else _env_int("GEMINI_HUB_TPM", DEFAULT_TOKENS_PER_MINUTE)
+        )
+        self.model_limits = dict(model_limits if model_limits is not None else _load_model_limits())
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        self._rand = rand
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._cooldowns = {}
+        self._stats = {"calls": 0, "retries": 0, "throttled_seconds": 0.0, "failures": 0}
+
+    def configure(self, model, requests_per_minute=None, tokens_per_minute=None):
+        """Set limits for one model; buckets created afterwards use them."""
+        with self._lock:
+            limits = self.model_limits.setdefault(model, {})
+            if requests_per_minute is not None:
+                limits["rpm"] = requests_per_minute
+            if tokens_per_minute is not None:
+                limits["tpm"] = tokens_per_minute
+            self._buckets = {key: value for key, value in self._buckets.items() if key[1] != model}
+
+    @staticmethod
+    def _limit_key(api_key, model):
+        return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest(), model
+
+    def _get_buckets(self, api_key, model):
+        """Return the (requests, tokens) buckets for an API key and model."""
+        key = self._limit_key(api_key, model)
+        with self._lock:
+            buckets = self._buckets.get(key)
+            if buckets is None:
+                limits = self.model_limits.get(model, {})
+                rpm = limits.get("rpm", self.requests_per_minute)
+                tpm = limits.get("tpm", self.tokens_per_minute)
+                buckets = (
+                    TokenBucket(rpm, clock=self._clock) if rpm else None,
+                    TokenBucket(tpm, clock=self._clock) if tpm else None,
+                )
+                self._buckets[key] = buckets
+            return buckets
+
+    def _reserve(self, api_key, model, estimated_tokens):
+        """Reserve budget for one attempt and return the seconds to wait."""
+        request_bucket, token_bucket = self._get_buckets(api_key, model)
+        with self._lock:
+            cooldown_until = self._cooldowns.get(self._limit_key(api_key, model), 0.0)
+        wait = max(0.0, cooldown_until - self._clock())
+        if request_bucket is not None:
+            wait = max(wait, request_bucket.reserve(1))
+        if token_bucket is not None and estimated_tokens:
+            wait = max(wait, token_bucket.reserve(estimated_tokens))
+        if wait:
+            with self._lock:
+                self._stats["throttled_seconds"] += wait
+        return wait
+
+    def retry_delay(self, error, attempt):
+        """Delay before retry number ``attempt + 1``: the server hint or jittered exponential backoff."""
+        hint = retry_after_hint(error)
+        if hint is not None:
+            # Never retry before the server asked us to, even past max_delay; jitter spreads out the callers it paused
+            return hint + self._rand() * self.base_delay
+        backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return backoff * (0.5 + self._rand() / 2)
+
+    def _cool_down(self, api_key, model, seconds):
+        """Hold back every request for an API key and model for ``seconds``."""
+        key = self._limit_key(api_key, model)
+        until = self._clock() + seconds
+        with self._lock:
+            self._cooldowns[key] = max(self._cooldowns.get(key, 0.0), until)
+        request_bucket, _ = self._get_buckets(api_key, model)
+        if request_bucket is not None:
+            request_bucket.drain()
+
+    def _on_failure(self, api_key, model, error, attempt):
+        """Decide whether to retry; returns the delay or re-raises."""
+        retryable = is_retryable_error(error)
+        delay = self.retry_delay(error, attempt) if retryable else None
+        if _status_code(error) == 429:
+            # Pause every caller sharing this quota, not just this one
+            self._cool_down(api_key, model, delay)
+        if not retryable or attempt >= self.max_retries:
+            with self._lock:
+                self._stats["failures"] += 1
+            raise error
+        with self._lock:
+            self._stats["retries"] += 1
+        print(f"Gemini API busy ({_status_code(error) or type(error).__name__}), "
+              f"retrying in {delay:.1f}s (attempt {attempt + 2}/{self.max_retries + 1})")
+        return delay
+
+    def call(self, api_key, model, fn, estimated_tokens=0):
+        """Run ``fn()`` within the rate limits, retrying retryable errors."""
+        with self._lock:
+            self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            wait = self._reserve(api_key, model, estimated_tokens)
+            if wait:
+                with phase("rate_limit_wait"):
+                    self._sleep(wait)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._on_failure(api_key, model, e, attempt)
+                with phase("retry_wait"):
+                    self._sleep(delay)
+                attempt += 1
+
+    async def call_async(self, api_key, model, fn, estimated_tokens=0):
+        """Await ``fn()`` within the rate limits, retrying retryable errors."""
+        with self._lock:
+            self._stats["calls"] += 1
+        attempt = 0
+        while True:
+            wait = self._reserve(api_key, model, estimated_tokens)
+            if wait:
+                with phase("rate_limit_wait"):
+                    await self._async_sleep(wait)
+            try:
+                return await fn()
+            except Exception as e:
+                delay = self._on_failure(api_key, model, e, attempt)
+                with phase("retry_wait"):
+                    await self._async_sleep(delay)
+                attempt += 1
+
+    def stats(self):
+        """Return call, retry, failure and throttling counters."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# Scheduler shared by all nodes in this package
+_scheduler = RequestScheduler()
+
+
+def get_scheduler():
+    """Return the process-wide request scheduler."""
+    return _scheduler
@@ -0,0 +1,298 @@
+"""
+Content-addressed response cache shared by the Gemini nodes
+
+Responses are stored on disk under a SHA-256 key built from the node, model,
+inputs and generation settings (including the raw bytes of any input
+tensors). Text is stored as UTF-8 and audio as 16-bit PCM next to a small JSON
+metadata file. The cache is bounded by total size and evicts the least
+recently used entries first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .audio_utils import pcm_to_waveform, waveform_to_pcm16
+
+
+# Default size limit of the on-disk cache
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Bumped whenever the key layout or stored format changes
+CACHE_FORMAT_VERSION = 1
+
+
+def default_cache_dir():
+    """Keep the cache in ComfyUI's user directory when available."""
+    override = os.environ.get("GEMINI_HUB_CACHE_DIR")
+    if override:
+        return override
+    try:
+        import folder_paths
+        return os.path.join(folder_paths.get_user_directory(), "gemini_hub_cache")
+    except (ImportError, AttributeError):
+        return os.path.join(os.path.expanduser("~"), ".cache", "comfyui-gemini-hub")
+
+
+def _default_max_bytes():
+    """Read the size limit from GEMINI_HUB_CACHE_MAX_MB, if set."""
+    try:
+        return int(float(os.environ["GEMINI_HUB_CACHE_MAX_MB"]) * 1024 * 1024)
+    except (KeyError, ValueError):
+        return DEFAULT_MAX_BYTES
+
+
+def _update_with_tensor(digest, tensor):
+    """Feed a tensor's shape, dtype and raw bytes into a hash."""
+    import torch
+
+    tensor = tensor.detach().to("cpu").contiguous()
+    digest.update(f"{tuple(tensor.shape)}|{tensor.dtype}".encode("utf-8"))
+    if tensor.numel():
+        digest.update(tensor.reshape(-1).view(torch.uint8).numpy())
+
+
+def make_cache_key(node, model, inputs, tensors=None):
+    """
+    Build a stable cache key for one request.
+
+    ``inputs`` holds the JSON-serializable settings that influence the
+    response; ``tensors`` maps names to tensors whose contents are hashed.
+    API keys must not be passed in: they do not change the response.
+    """
+    digest = hashlib.sha256()
+    header = {"version": CACHE_FORMAT_VERSION, "node": node, "model": model, "inputs": inputs}
+    digest.update(json.dumps(header, sort_keys=True, default=str).encode("utf-8"))
+    for name in sorted(tensors or {}):
+        digest.update(f"|{name}|".encode("utf-8"))
+        _update_with_tensor(digest, tensors[name])
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Size-bounded, least-recently-used cache of Gemini responses on disk.
+
+    Each entry is a ``<key>.bin`` payload plus a ``<key>.json`` metadata
+    file. Recency is tracked in memory and mirrored to file modification
+    times, so the LRU order survives restarts. The lock guards only the
+    in-memory index and counters; files are read and written outside it.
+    Dropped entries' files are unlinked under the lock, and only when no
+    write of the same key has started since, so a rewrite never loses its
+    files to an earlier eviction.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes if max_bytes is not None else _default_max_bytes()
+        self._lock = threading.Lock()
+        self._entries = None  # key -> payload + metadata size, oldest first
+        self._total_bytes = 0
+        self._writing = {}  # key -> number of writes in progress
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".bin", base + ".json"
+
+    def _scan(self):
+        """Return ``(key, size)`` for every entry on disk, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            payload_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(payload_path) + os.path.getsize(meta_path)
+                found.append((os.path.getmtime(meta_path), key, size))
+            except OSError:
+                continue
+        return [(key, size) for _, key, size in sorted(found)]
+
+    def _load_index(self):
+        """Build the in-memory index from a directory scan the first time the cache is used."""
+        with self._lock:
+            if self._entries is not None:
+                return
+        # Scanned without the lock; if two threads race, the first index installed wins
+        found = self._scan()
+        with self._lock:
+            if self._entries is None:
+                self._entries = OrderedDict(found)
+                self._total_bytes = sum(size for _, size in found)
+
+    def _delete_files(self, key):
+        """Delete one entry's files."""
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _delete_dropped(self, keys):
+        """
+        Delete the files of entries dropped from the index.
+
+        A key indexed again, or being written, since it was dropped is left
+        alone. The check and the unlinks share the lock, which writers take
+        before replacing a key's files, so no write can slip in between.
+        """
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                if key not in self._entries and key not in self._writing:
+                    self._delete_files(key)
+
+    def _forget(self, key):
+        """Drop one entry from the index. Caller holds the lock."""
+        self._total_bytes -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        """
+        Drop least recently used entries from the index until the cache fits and return their keys.
+
+        Caller holds the lock and passes the returned keys to ``_delete_dropped`` after releasing it.
+        """
+        evicted = []
+        while self._total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._forget(oldest)
+            evicted.append(oldest)
+        self._stats["evictions"] += len(evicted)
+        return evicted
+
+    def _read(self, key):
+        """
+        Return ``(metadata, payload)`` for a key, or None on a miss.
+
+        The lock only guards the index; the files are read without it, so a
+        large entry never holds up lookups by other nodes.
+        """
+        self._load_index()
+        with self._lock:
+            if key not in self._entries:
+                self._stats["misses"] += 1
+                return None
+
+        payload_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            with open(payload_path, "rb") as f:
+                payload = f.read()
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            # Entry was evicted meanwhile, or removed or damaged outside of this process
+            with self._lock:
+                self._forget(key)
+                self._stats["misses"] += 1
+            self._delete_dropped([key])
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return metadata, payload
+
+    def _write(self, key, metadata, payload):
+        """Store an entry atomically and evict older entries if needed."""
+        meta_bytes = json.dumps(metadata).encode("utf-8")
+        size = len(payload) + len(meta_bytes)
+        if size > self.max_bytes:
+            return
+
+        self._load_index()
+        payload_path, meta_path = self._paths(key)
+        # Mark the write in progress so a pending eviction of this key leaves the new files alone
+        with self._lock:
+            self._writing[key] = self._writing.get(key, 0) + 1
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Payload first: an entry only counts once its metadata exists
+            for path, data in ((payload_path, payload), (meta_path, meta_bytes)):
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not write Gemini response cache entry: {str(e)}")
+            with self._lock:
+                self._done_writing(key)
+            return
+
+        with self._lock:
+            self._done_writing(key)
+            self._forget(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            self._stats["writes"] += 1
+            evicted = self._evict()
+        self._delete_dropped(evicted)
+
+    def _done_writing(self, key):
+        """Close one write of ``key``. Caller holds the lock."""
+        if self._writing[key] > 1:
+            self._writing[key] -= 1
+        else:
+            del self._writing[key]
+
+    def get_text(self, key):
+        """Return a cached text response, or None."""
+        entry = self._read(key)
+        if entry is None or entry[0].get("kind") != "text":
+            return None
+        return entry[1].decode("utf-8")
+
+    def put_text(self, key, text, extra=None):
+        """Cache a text response."""
+        self._write(key, {"kind": "text", "extra": extra or {}}, text.encode("utf-8"))
+
+    def get_audio(self, key):
+        """Return a cached ``(waveform, sample_rate, extra)`` tuple, or None."""
+        entry = self._read(key)
+        if entry is None or entry[0].get("kind") != "audio":
+            return None
+        metadata, payload = entry
+        waveform = pcm_to_waveform(payload, 16, metadata["channels"])
+        return waveform, metadata["sample_rate"], metadata.get("extra", {})
+
+    def put_audio(self, key, waveform, sample_rate, extra=None):
+        """Cache a ``[channels, samples]`` waveform as 16-bit PCM."""
+        channels = waveform.shape[0]
+        # Interleave channels so the payload is plain PCM
+        pcm = waveform_to_pcm16(waveform.detach().to("cpu")).t().contiguous().numpy()
+        metadata = {
+            "kind": "audio",
+            "sample_rate": int(sample_rate),
+            "channels": int(channels),
+            "bits_per_sample": 16,
+            "extra": extra or {},
+        }
+        self._write(key, metadata, pcm.tobytes())
+
+    def stats(self):
+        """Return hit/miss/write/eviction counters and the current size."""
+        self._load_index()
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._total_bytes)
+
+
+# Default cache shared by all nodes in this package
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache, creating it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
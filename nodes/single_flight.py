@@ -0,0 +1,151 @@
+"""
+Single-flight coalescing of identical in-flight Gemini requests
+
+Queued workflows, or branches of one workflow, often ask for the same chat
+prompt or speech line at nearly the same moment. The response cache only
+helps once the first answer has landed; until then every caller would send
+its own request. ``SingleFlight`` lets the first caller for a key (the
+leader) make the request while later callers with the same key wait for it
+and all receive its result, or its error.
+
+Flights are keyed by the nodes' response cache key (a hash of the model,
+the normalized inputs and the generation settings) together with a hash of
+the API key. Callers with different keys never share a flight: each key pays
+for its own request and sees only its own quota or authentication errors.
+Sync and async callers of one key share the same flight. Callers with the
+response cache turned off coalesce too, under ``uncached_key``: they never
+join a flight whose leader stores the response, nor lead one that a cached
+caller waits on. A waiter that is cancelled leaves the flight running for
+the others. When the leader itself is cancelled or interrupted, its waiters
+do not inherit the cancellation; one of them becomes the new leader and
+sends the request.
+"""
+
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from .metrics import record_deduplicated
+
+
+def flight_key(api_key, key):
+    """Key of the flight for a request key sent with ``api_key``; the API key itself is never kept"""
+    digest = hashlib.sha256()
+    digest.update(hashlib.sha256((api_key or "").encode("utf-8")).digest())
+    digest.update(key.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def uncached_key(key):
+    """Key for callers that skip the response cache; they share flights only with each other"""
+    return f"uncached|{key}"
+
+
+class _LeaderAbandoned(Exception):
+    """The leader stopped without a result or an error; waiters try again."""
+
+
+class SingleFlight:
+    """Shares one in-flight call among concurrent callers with the same key; thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats = {"leaders": 0, "deduplicated": 0, "errors": 0, "abandoned": 0}
+
+    def _join(self, key):
+        """Return the flight for ``key`` and whether the caller leads it."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._stats["deduplicated"] += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self._stats["leaders"] += 1
+            return future, True
+
+    def _land(self, key, future, result=None, error=None, abandoned=False):
+        """Hand the leader's outcome to every waiter and close the flight."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            if abandoned:
+                self._stats["abandoned"] += 1
+            elif error is not None:
+                self._stats["errors"] += 1
+        if abandoned:
+            future.set_exception(_LeaderAbandoned())
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, node, model, api_key, key, fn):
+        """Return ``fn()``, or the result of the identical call with the same API key already in flight."""
+        key = flight_key(api_key, key)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            record_deduplicated(node, model)
+            try:
+                return future.result()
+            except _LeaderAbandoned:
+                continue
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._land(key, future, error=e)
+            raise
+        except BaseException:
+            # Interrupted or cancelled: the waiters still want an answer
+            self._land(key, future, abandoned=True)
+            raise
+        self._land(key, future, result=result)
+        return result
+
+    async def run_async(self, node, model, api_key, key, coro_fn):
+        """Return ``await coro_fn()``, or the result of the identical call with the same API key already in flight."""
+        key = flight_key(api_key, key)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            record_deduplicated(node, model)
+            waiter = asyncio.wrap_future(future)
+            try:
+                # Shielded, so a cancelled waiter does not cancel the shared flight
+                return await asyncio.shield(waiter)
+            except _LeaderAbandoned:
+                continue
+            except asyncio.CancelledError:
+                waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+                raise
+
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            self._land(key, future, error=e)
+            raise
+        except BaseException:
+            self._land(key, future, abandoned=True)
+            raise
+        self._land(key, future, result=result)
+        return result
+
+    def stats(self):
+        """Return how many calls led a flight, joined one, failed or were abandoned."""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
+
+# Flights shared by all nodes in this package
+_single_flight = SingleFlight()
+
+
+def get_single_flight():
+    """Return the shared single-flight registry."""
+    return _single_flight
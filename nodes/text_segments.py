@@ -0,0 +1,86 @@
+"""
+Text segmentation for long-form speech synthesis
+
+Long scripts are cut at paragraph and sentence boundaries into segments no
+longer than a character budget, so each segment can be synthesized as its own
+request. Only sentences that are longer than the budget on their own are cut
+further, at clause breaks or whitespace.
+"""
+
+import re
+
+
+# Whitespace after terminal punctuation, optionally followed by a closing quote/bracket
+SENTENCE_END = re.compile(r"(?<=[.!?…。！？][\"'”’)\]])\s+|(?<=[.!?…。！？])\s+")
+
+# Paragraphs are separated by one or more blank lines
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# Preferred places to cut a sentence that does not fit the budget
+CLAUSE_BREAK = re.compile(r"(?<=[,;:—–])\s+")
+
+
+def _split_oversize(sentence, max_chars):
+    """Cut a single sentence longer than ``max_chars`` at clause breaks, then whitespace."""
+    pieces = []
+    for clause in CLAUSE_BREAK.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+
+def _pack(pieces, max_chars, separator=" "):
+    """Greedily join pieces into segments that stay within ``max_chars``."""
+    segments = []
+    current = ""
+    for piece in pieces:
+        if not current:
+            current = piece
+        elif len(current) + len(separator) + len(piece) <= max_chars:
+            current = f"{current}{separator}{piece}"
+        else:
+            segments.append(current)
+            current = piece
+    if current:
+        segments.append(current)
+    return segments
+
+
+def split_text(text, max_chars):
+    """
+    Split ``text`` into ordered segments of at most ``max_chars`` characters.
+
+    Paragraphs that fit are kept whole, and neighbouring paragraphs share a
+    segment while the budget allows. Longer paragraphs are split into
+    sentences, which are packed greedily.
+    """
+    if max_chars <= 0:
+        raise ValueError("max_chars must be positive")
+
+    paragraphs = [p.strip() for p in PARAGRAPH_BREAK.split(text or "") if p.strip()]
+
+    paragraph_segments = []
+    for paragraph in paragraphs:
+        if len(paragraph) <= max_chars:
+            paragraph_segments.append(paragraph)
+            continue
+
+        sentences = []
+        for sentence in SENTENCE_END.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) > max_chars:
+                sentences.extend(_split_oversize(sentence, max_chars))
+            else:
+                sentences.append(sentence)
+        paragraph_segments.extend(_pack(sentences, max_chars))
+
+    # Short neighbouring paragraphs may share a request
+    return _pack(paragraph_segments, max_chars, separator="\n\n")
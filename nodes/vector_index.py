@@ -0,0 +1,291 @@
+"""
+On-disk embedding stores with top-k cosine search
+
+Embeddings cost an API call to compute and almost nothing to keep.
+``VectorStore`` keeps unit-length float32 vectors of one dimensionality in a
+directory: ``vectors.f32`` holds the rows back to back, ``rows.jsonl`` has
+one line per row with its key and text, and ``meta.json`` records the model
+and dimensionality. Rows are only ever appended. What an interrupted append
+leaves behind is cut off the next time the store is loaded.
+
+The same class serves two purposes. The embedding cache keeps one store per
+model and dimensionality, keyed by a hash of the task type and text, so a
+text is embedded once. Named indexes are stores the Embeddings node adds
+texts to and the Embedding Search node searches.
+
+Searching maps ``vectors.f32`` read-only with ``numpy.memmap``, so the OS
+pages rows in on demand instead of the whole file being read up front.
+Queries are scored against blocks of rows with one matrix product per block
+while a running top k is kept with ``argpartition``. Tens of thousands of
+rows take milliseconds.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+
+from .response_cache import default_cache_dir
+
+
+# Rows scored per matrix product; 65536 x 768 float32 rows are 192 MB of the mapped file
+SEARCH_BLOCK_ROWS = 65536
+
+# Index names become directory names
+INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+
+
+def default_embeddings_dir():
+    """Keep embedding stores next to the response cache."""
+    return os.path.join(default_cache_dir(), "embeddings")
+
+
+def text_key(*parts):
+    """Stable key of a text and whatever else determines its vector"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def normalize_rows(vectors):
+    """Scale every row to unit length so a dot product is the cosine similarity"""
+    import numpy as np
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, np.float32(1e-12))
+
+
+class VectorStore:
+    """
+    Append-only store of unit-length vectors with text and key per row; thread-safe.
+
+    The directory is created on the first ``add``. A store that already
+    exists keeps the dimensionality and model it was created with.
+    """
+
+    def __init__(self, directory, model=None, dim=None):
+        self.directory = directory
+        self.model = model
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._rows = {}
+        self._texts = []
+        self._matrix = None
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        """Read the row index from disk once. Caller holds the lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if self.dim is not None and meta.get("dim") != self.dim:
+            raise ValueError(
+                f"The embedding store in {self.directory} holds {meta.get('dim')}-dimensional vectors, "
+                f"not {self.dim}"
+            )
+        self.dim = meta.get("dim")
+        self.model = meta.get("model") or self.model
+
+        # Only rows whose vector was written completely count
+        try:
+            complete = os.path.getsize(self._path("vectors.f32")) // (4 * self.dim)
+        except OSError:
+            complete = 0
+        end = 0
+        try:
+            with open(self._path("rows.jsonl"), "rb") as f:
+                for line in f:
+                    if len(self._texts) >= complete or not line.endswith(b"\n"):
+                        break
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        break
+                    self._rows.setdefault(row["key"], len(self._texts))
+                    self._texts.append(row.get("text", ""))
+                    end += len(line)
+        except OSError:
+            pass
+        self._truncate(end)
+
+    def _truncate(self, rows_end):
+        """Cut off what an interrupted append left behind, so later rows line up. Caller holds the lock."""
+        for name, size in (("rows.jsonl", rows_end), ("vectors.f32", len(self._texts) * 4 * self.dim)):
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _vectors(self):
+        """Read-only memory map of every row. Caller holds the lock."""
+        import numpy as np
+
+        if not self._texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._matrix is None or len(self._matrix) != len(self._texts):
+            self._matrix = np.memmap(
+                self._path("vectors.f32"), dtype="<f4", mode="r", shape=(len(self._texts), self.dim)
+            )
+        return self._matrix
+
+    def __len__(self):
+        with self._lock:
+            self._load()
+            return len(self._texts)
+
+    def describe(self):
+        """Return the store's model, dimensionality and row count."""
+        with self._lock:
+            self._load()
+            return self.model, self.dim, len(self._texts)
+
+    def get(self, keys):
+        """Return the stored vector for every key, or None where the key is unknown."""
+        with self._lock:
+            self._load()
+            rows = [self._rows.get(key) for key in keys]
+            if all(row is None for row in rows):
+                return [None] * len(keys)
+            vectors = self._vectors()
+            return [None if row is None else vectors[row].copy() for row in rows]
+
+    def add(self, keys, texts, vectors, model=None):
+        """Append rows for keys not stored yet; return how many were added."""
+        import numpy as np
+
+        vectors = normalize_rows(vectors)
+        with self._lock:
+            self._load()
+            self.model = self.model or model
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            fresh = {}
+            for index, key in enumerate(keys):
+                if key not in self._rows and key not in fresh:
+                    fresh[key] = index
+            if not fresh:
+                return 0
+            fresh = list(fresh.values())
+
+            os.makedirs(self.directory, exist_ok=True)
+            if not self._texts:
+                self._write_meta()
+            with open(self._path("rows.jsonl"), "a", encoding="utf-8") as f:
+                for index in fresh:
+                    f.write(json.dumps({"key": keys[index], "text": texts[index]}, ensure_ascii=False))
+                    f.write("\n")
+            # Vectors go last: a row only counts once its vector is complete
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors[fresh], dtype="<f4").tobytes())
+            for index in fresh:
+                self._rows[keys[index]] = len(self._texts)
+                self._texts.append(texts[index])
+            self._matrix = None
+            return len(fresh)
+
+    def _write_meta(self):
+        """Record the model and dimensionality. Caller holds the lock."""
+        path = self._path("meta.json")
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "dim": self.dim}, f)
+        os.replace(temp_path, path)
+
+    def search(self, queries, top_k=5):
+        """
+        Return the ``top_k`` most similar rows for every query vector.
+
+        Each result is a list of ``(row, score, text)`` sorted by descending
+        cosine similarity.
+        """
+        with self._lock:
+            self._load()
+            vectors = self._vectors()
+            texts = self._texts
+        rows, scores = top_k_cosine(queries, vectors, top_k)
+        return [
+            [(int(row), float(score), texts[row]) for row, score in zip(query_rows, query_scores)]
+            for query_rows, query_scores in zip(rows, scores)
+        ]
+
+
+def top_k_cosine(queries, vectors, top_k=5):
+    """
+    Find the ``top_k`` rows of ``vectors`` most similar to every query.
+
+    ``vectors`` must hold unit-length rows; it may be a memory map. Returns
+    ``(rows, scores)`` arrays of shape ``[queries, k]``, best match first.
+    """
+    import numpy as np
+
+    queries = normalize_rows(np.atleast_2d(queries))
+    count = len(vectors)
+    if count and queries.shape[1] != vectors.shape[1]:
+        raise ValueError(f"Query vectors have {queries.shape[1]} dimensions but the index has {vectors.shape[1]}")
+    top_k = max(0, min(top_k, count))
+    best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+    best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+    if not top_k:
+        return best_rows, best_scores
+
+    for start in range(0, count, SEARCH_BLOCK_ROWS):
+        block = vectors[start:start + SEARCH_BLOCK_ROWS]
+        scores = queries @ block.T
+        if scores.shape[1] > top_k:
+            candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        else:
+            candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        # Merge this block's best with the best so far and keep the top k
+        best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+        best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+        if best_scores.shape[1] > top_k:
+            keep = np.argpartition(-best_scores, top_k - 1, axis=1)[:, :top_k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+# Stores shared by all nodes in this package, by directory
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _get_store(directory, model=None, dim=None):
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            store = VectorStore(directory, model, dim)
+            _stores[directory] = store
+        return store
+
+
+def get_embedding_cache(model, dim):
+    """Return the shared embedding cache for one model and dimensionality."""
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{model}-{dim}")
+    return _get_store(os.path.join(default_embeddings_dir(), "cache", name), model, dim)
+
+
+def get_vector_index(name, model=None, dim=None):
+    """Return the shared vector index called ``name``."""
+    if not INDEX_NAME_PATTERN.match(name or ""):
+        raise ValueError(
+            f"Invalid index name '{name}'. Use letters, digits, '_', '-' and '.', starting with a letter or digit"
+        )
+    return _get_store(os.path.join(default_embeddings_dir(), "indexes", name), model, dim)
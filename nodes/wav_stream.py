@@ -0,0 +1,167 @@
+"""
+Streaming Text To Speech output to disk
+
+Audiobook-length speech does not fit comfortably in memory as one float32
+tensor. ``WavStreamWriter`` appends synthesized segments to a 32-bit float
+WAV file in order, so only the segments not yet written are held in memory.
+Each segment is received and decoded whole before it is appended; the audio
+is not written chunk by chunk as the API streams it. Neighbouring segments
+are joined like ``join_waveforms``: separated by a gap or blended with a
+crossfade, for which only the last crossfade samples are held back.
+
+The samples go to a temporary ``.partial`` file next to the output path.
+Its header is rewritten after every append, so the partial file plays up to
+the last segment written, without the held-back crossfade tail. The output
+path itself only appears once ``close`` has written the tail and the final
+header and renamed the temporary file into place.
+
+Float samples are stored as-is, so the finished file is handed back to
+ComfyUI as a memory-mapped waveform: pages are read from disk when a
+downstream node touches them instead of being loaded up front. The price is
+a file twice the size of 16-bit PCM; int16 samples would have to be
+converted, and so read in full, before ComfyUI could use them.
+
+Every run writes to a file name of its own, and the rename replaces only the
+directory entry, so a file that an earlier run's waveform still maps is
+never truncated underneath it.
+"""
+
+import os
+import struct
+import uuid
+
+from .audio_utils import WAV_HEADER_BYTES, WAVE_FORMAT_IEEE_FLOAT, build_wav_header
+
+
+# Silence is written in blocks of at most this many samples
+SILENCE_BLOCK_SAMPLES = 65536
+
+
+def default_output_dir():
+    """ComfyUI's output directory when available."""
+    try:
+        import folder_paths
+        return folder_paths.get_output_directory()
+    except (ImportError, AttributeError):
+        return os.path.join(os.path.expanduser("~"), "comfyui-gemini-hub-output")
+
+
+def new_output_path(filename_prefix, tag=""):
+    """A WAV path in the output directory that no other run uses"""
+    parts = [filename_prefix, tag, uuid.uuid4().hex[:12]]
+    return os.path.join(default_output_dir(), "_".join(part for part in parts if part) + ".wav")
+
+
+class WavStreamWriter:
+    """
+    Appends mono audio to a 32-bit float WAV file, one segment at a time.
+
+    Segments are downmixed to mono and written to ``<path>.<id>.partial``.
+    Use as a context manager, or call ``close`` to write the held-back
+    crossfade tail and the final header and move the file to ``path``.
+    """
+
+    def __init__(self, path, sample_rate, gap_seconds=0.0, crossfade_seconds=0.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.fade = max(0, int(round(crossfade_seconds * sample_rate)))
+        self.gap = 0 if self.fade else max(0, int(round(gap_seconds * sample_rate)))
+        self.frames = 0
+        self.segments = 0
+        self._tail = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.partial_path = f"{path}.{uuid.uuid4().hex[:8]}.partial"
+        self._file = open(self.partial_path, "wb")
+        self._file.write(self._header())
+
+    def _header(self):
+        return build_wav_header(self.frames * 4, self.sample_rate, 32, 1, WAVE_FORMAT_IEEE_FLOAT)
+
+    def _write(self, samples):
+        """Append float32 samples to the data chunk."""
+        if samples.numel():
+            self._file.write(samples.contiguous().numpy().astype("<f4", copy=False).data)
+            self.frames += samples.numel()
+
+    def _write_silence(self, count):
+        import torch
+
+        while count > 0:
+            block = min(count, SILENCE_BLOCK_SAMPLES)
+            self._write(torch.zeros(block))
+            count -= block
+
+    def _update_header(self):
+        """Rewrite the RIFF and data sizes so the file on disk is complete as it stands."""
+        data_size = self.frames * 4
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", 36 + data_size))
+        self._file.seek(WAV_HEADER_BYTES - 4)
+        self._file.write(struct.pack("<I", data_size))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def append(self, waveform):
+        """Append one ``[channels, samples]`` segment after a gap or crossfade."""
+        import torch
+
+        samples = waveform.detach().to("cpu", torch.float32).reshape(-1, waveform.shape[-1]).mean(dim=0)
+        if self.segments and self.gap:
+            self._write_silence(self.gap)
+
+        if self._tail is not None:
+            # Blend the held-back end of the previous segment into the head of this one
+            overlap = min(self._tail.numel(), samples.numel())
+            self._write(self._tail[:self._tail.numel() - overlap])
+            if overlap:
+                ramp = torch.linspace(0.0, 1.0, overlap + 2)[1:-1]
+                samples = torch.cat([self._tail[-overlap:] * (1.0 - ramp) + samples[:overlap] * ramp,
+                                     samples[overlap:]])
+            self._tail = None
+
+        # Hold back the end of this segment until the next one arrives
+        if self.fade:
+            keep = min(self.fade, samples.numel())
+            self._tail = samples[samples.numel() - keep:].clone()
+            samples = samples[:samples.numel() - keep]
+        self._write(samples)
+        self.segments += 1
+        self._update_header()
+
+    def close(self):
+        """Write the held-back tail and the final header, move the file into place and return the number of frames."""
+        if self._file.closed:
+            return self.frames
+        try:
+            if self._tail is not None:
+                self._write(self._tail)
+                self._tail = None
+            self._update_header()
+        finally:
+            self._file.close()
+        # Renaming replaces the directory entry only; mappings of an older file at this path stay valid
+        os.replace(self.partial_path, self.path)
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_wav_memmap(path, frames):
+    """
+    Map the samples of a file written by ``WavStreamWriter`` as a ``[1, 1, frames]`` tensor.
+
+    The mapping is copy-on-write: pages are read lazily and writes to the
+    tensor never reach the file.
+    """
+    import numpy as np
+    import torch
+
+    if not frames:
+        return torch.zeros((1, 1, 0), dtype=torch.float32)
+    samples = np.memmap(path, dtype="<f4", mode="c", offset=WAV_HEADER_BYTES, shape=(frames,))
+    return torch.from_numpy(samples).view(1, 1, frames)
@@ -15,27 +15,47 @@ def validate_nodes():
     try:
         # Test TTS Node
         print("📢 Testing Text-to-Speech Node...")
-        from nodes.gemini_text_to_speech_node import GeminiTextToSpeechNode
+        from nodes.gemini_text_to_speech_node import GeminiTextToSpeech
         print("✅ TTS Node imported successfully")
         
         # Test STT Node  
         print("🎤 Testing Speech-to-Text Node...")
-        from nodes.gemini_speech_to_text_node import GeminiSpeechToTextNode
+        from nodes.gemini_speech_to_text_node import GeminiSpeechToText
         print("✅ STT Node imported successfully")
         
         # Test Chat Node
         print("💬 Testing Chat Node...")
-        from nodes.gemini_chat_node import GeminiChatNode
+        from nodes.gemini_chat_node import GeminiChat
         print("✅ Chat Node imported successfully")
         
+        # Test Chat Batch Node
+        print("📚 Testing Chat Batch Node...")
+        from nodes.gemini_chat_batch_node import GeminiChatBatch
+        print("✅ Chat Batch Node imported successfully")
+        
+        # Test TTS Batch Node
+        print("🗣️ Testing Text-to-Speech Batch Node...")
+        from nodes.gemini_text_to_speech_batch_node import GeminiTextToSpeechBatch
+        print("✅ TTS Batch Node imported successfully")
+        
+        # Test Batch Job Nodes
+        print("📦 Testing Batch Job Nodes...")
+        from nodes.gemini_batch_job_node import GeminiChatBatchJob, GeminiTextToSpeechBatchJob
+        print("✅ Batch Job Nodes imported successfully")
+        
+        # Test Embedding Nodes
+        print("🧭 Testing Embedding Nodes...")
+        from nodes.gemini_embeddings_node import GeminiEmbeddings, GeminiEmbeddingSearch
+        print("✅ Embedding Nodes imported successfully")
+        
         # Test main module
         print("📦 Testing main module...")
-        import __init__
-        print(f"✅ Main module imported with {len(__init__.NODE_CLASS_MAPPINGS)} nodes")
+        import nodes
+        print(f"✅ Main module imported with {len(nodes.NODE_CLASS_MAPPINGS)} nodes")
         
         print("\n🎉 All nodes validated successfully!")
         print("📋 Available nodes:")
-        for node_name in __init__.NODE_CLASS_MAPPINGS.keys():
+        for node_name in nodes.NODE_CLASS_MAPPINGS.keys():
             print(f"   - {node_name}")
             
         return True